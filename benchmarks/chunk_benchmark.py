@@ -0,0 +1,60 @@
+"""Benchmark the markdown chunker used between web_docs and add_context.
+
+Converts the pages in benchmarks/corpus to markdown with the scraper's
+extractor, repeats them up to the requested input size and reports the
+chunker throughput in MB per second and the chunks produced per MB.
+
+Usage:
+    python -m benchmarks.chunk_benchmark [--megabytes 20] [--max-tokens 200]
+"""
+
+import argparse
+import io
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.extract_benchmark import load_corpus
+from sherlock.utilities.chunker import chunk_lines
+from sherlock.utilities.extract import extract_page
+
+
+def build_document(megabytes: float) -> str:
+    """Build a markdown document of roughly the given size from the corpus."""
+    pages = [
+        extract_page(BeautifulSoup(html, "html.parser"))[0]
+        for html in load_corpus().values()
+    ]
+    page_block = "\n\n".join(pages) + "\n\n"
+    repeats = max(1, int(megabytes * 1024 * 1024 / len(page_block.encode("utf-8"))))
+    return page_block * repeats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--megabytes", type=float, default=20)
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--overlap-tokens", type=int, default=40)
+    args = parser.parse_args()
+
+    document = build_document(args.megabytes)
+    size = len(document.encode("utf-8")) / 1024 / 1024
+
+    start_time = time.perf_counter()
+    chunks, tokens = 0, 0
+    for chunk in chunk_lines(
+        io.StringIO(document, newline=""),
+        max_tokens=args.max_tokens,
+        overlap_tokens=args.overlap_tokens,
+    ):
+        chunks += 1
+        tokens += chunk.tokens
+    elapsed = time.perf_counter() - start_time
+
+    print(
+        f"Input: {size:.2f} MB, max {args.max_tokens} tokens, {args.overlap_tokens} overlap",
+    )
+    print(
+        f"Chunks: {chunks} ({chunks / size:.0f} per MB, {tokens / max(chunks, 1):.0f} tokens avg)",
+    )
+    print(f"Throughput: {size / elapsed:.2f} MB/sec")
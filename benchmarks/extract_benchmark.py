@@ -0,0 +1,98 @@
+"""Benchmark the single pass extractor against the html2text pipeline.
+
+Runs both extraction paths over the fixed pages in benchmarks/corpus and
+reports pages per second and output size. Both paths start from the raw
+HTML, so the BeautifulSoup parse is included in each.
+
+Usage:
+    python -m benchmarks.extract_benchmark [--rounds 20]
+"""
+
+import argparse
+import os
+import time
+from collections.abc import Callable
+
+import html2text
+from bs4 import BeautifulSoup
+
+from sherlock.utilities.extract import extract_page
+
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "corpus")
+
+
+def html2text_pipeline(html: str) -> tuple[str, list[str]]:
+    """The previous scraper pipeline: parse, re-serialize, html2text, trim."""
+    converter = html2text.HTML2Text()
+    converter.ignore_links = True
+
+    page = BeautifulSoup(html, "html.parser")
+    page_text = converter.handle(str(page))
+    page_text = "\n".join([line for line in page_text.split("\n") if line.strip()])
+    links = [link.get("href") for link in page.find_all("a") if link.get("href")]
+
+    return page_text, links
+
+
+def single_pass_pipeline(html: str) -> tuple[str, list[str]]:
+    """The single pass extractor used by the scraper."""
+    return extract_page(BeautifulSoup(html, "html.parser"))
+
+
+def load_corpus() -> dict[str, str]:
+    """Load every page in the benchmark corpus."""
+    corpus = {}
+    for name in sorted(os.listdir(CORPUS_PATH)):
+        if name.endswith(".html"):
+            with open(os.path.join(CORPUS_PATH, name), encoding="utf-8") as f:
+                corpus[name] = f.read()
+    return corpus
+
+
+def run(
+    pipeline: Callable[[str], tuple[str, list[str]]],
+    corpus: dict[str, str],
+    rounds: int,
+) -> tuple[float, int, int]:
+    """Time a pipeline over the corpus.
+
+    Returns:
+    tuple: Pages per second, characters of output and links found per round.
+    """
+    characters, links = 0, 0
+    for html in corpus.values():
+        text, hrefs = pipeline(html)
+        characters += len(text)
+        links += len(hrefs)
+
+    start_time = time.perf_counter()
+    for _ in range(rounds):
+        for html in corpus.values():
+            pipeline(html)
+    elapsed = time.perf_counter() - start_time
+
+    return rounds * len(corpus) / elapsed, characters, links
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    input_size = sum(len(html) for html in corpus.values())
+    print(f"Corpus: {len(corpus)} pages, {input_size} characters, {args.rounds} rounds")
+    print(f"{'pipeline':<14}{'pages/sec':>12}{'output chars':>15}{'links':>8}")
+
+    results = {}
+    for name, pipeline in [
+        ("html2text", html2text_pipeline),
+        ("single-pass", single_pass_pipeline),
+    ]:
+        results[name] = run(pipeline, corpus=corpus, rounds=args.rounds)
+        pages_per_second, characters, links = results[name]
+        print(f"{name:<14}{pages_per_second:>12.1f}{characters:>15}{links:>8}")
+
+    speedup = results["single-pass"][0] / results["html2text"][0]
+    print(f"Speedup: {speedup:.2f}x")
@@ -4,12 +4,69 @@ It will be a FastAPI application that will be used to serve the web interface,
 and allow users to ask questions of the generative AI chat bot.
 """
 
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Any
+from typing import Union
+
+import uvicorn
+from fastapi import Depends
 from fastapi import FastAPI
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from sherlock.utilities.jobs import ENDED_STATUSES
+from sherlock.utilities.jobs import CrawlJob
+from sherlock.utilities.jobs import CrawlRequest
+from sherlock.utilities.jobs import JobManager
+from sherlock.utilities.jobs import JobProgress
+from sherlock.utilities.query_service import QueryService
 
 
 app = FastAPI()
 
 
+class QueryRequest(BaseModel):
+    """Body of a query request."""
+
+    prompt: str
+    collection_name: Union[str, list[str]] = "default"
+
+
+@lru_cache
+def get_query_service() -> QueryService:
+    """Get the query service shared by all requests."""
+    return QueryService()
+
+
+@lru_cache
+def get_job_manager() -> JobManager:
+    """Get the manager running the crawl jobs of all requests."""
+    return JobManager(max_workers=2, service_factory=get_query_service)
+
+
+def get_job(
+    job_id: str,
+    jobs: JobManager = Depends(get_job_manager),
+) -> CrawlJob:
+    """Get a job by id, or respond with 404."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+def server_sent_event(data: Mapping[str, Any], event: str = "") -> str:
+    """Format a message as a server-sent event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, default=str)}\n\n"
+
+
 # Define a route for the default URL
 @app.get("/")
 def home():
@@ -17,7 +74,107 @@ def home():
     return "Hello, World!"
 
 
-# Start Flask App
+@app.post("/query")
+async def query(
+    request: QueryRequest,
+    service: QueryService = Depends(get_query_service),
+) -> StreamingResponse:
+    """Stream the answer to a prompt as server-sent events.
+
+    The first token is awaited before responding, so the time to first
+    token can be reported in the X-Time-To-First-Token header. The total
+    latency follows in a final "done" event once the answer is complete.
+    Requests to Ollama are made on the async client, so a slow answer
+    holds no worker thread.
+    """
+    start_time = time.perf_counter()
+
+    stream = service.query_async(
+        prompt=request.prompt,
+        collection_name=request.collection_name,
+    )
+    first = await anext(stream, None)
+    time_to_first_token = time.perf_counter() - start_time
+
+    async def events() -> AsyncIterator[str]:
+        if first is not None:
+            yield server_sent_event(first)
+        async for chunk in stream:
+            yield server_sent_event(chunk)
+        yield server_sent_event(
+            {
+                "time_to_first_token": time_to_first_token,
+                "total_latency": time.perf_counter() - start_time,
+            },
+            event="done",
+        )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Time-To-First-Token": f"{time_to_first_token:.4f}",
+            "Server-Timing": f"ttft;dur={time_to_first_token * 1000:.1f}",
+        },
+    )
+
+
+@app.post("/jobs", status_code=202)
+def submit_job(
+    request: CrawlRequest,
+    jobs: JobManager = Depends(get_job_manager),
+) -> JobProgress:
+    """Queue a crawl of a site whose pages are ingested as they are written."""
+    return jobs.submit(request).progress()
+
+
+@app.get("/jobs")
+def list_jobs(jobs: JobManager = Depends(get_job_manager)) -> list[JobProgress]:
+    """List the progress of every job."""
+    return [job.progress() for job in jobs.jobs.values()]
+
+
+@app.get("/jobs/{job_id}")
+def job_progress(job: CrawlJob = Depends(get_job)) -> JobProgress:
+    """Poll the progress of a job."""
+    return job.progress()
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(
+    job: CrawlJob = Depends(get_job),
+    interval: float = 1.0,
+) -> StreamingResponse:
+    """Stream the progress of a job as server-sent events until it ends."""
+
+    async def events() -> AsyncIterator[str]:
+        while True:
+            progress = job.progress()
+            ended = progress.status in ENDED_STATUSES
+            yield server_sent_event(
+                progress.model_dump(mode="json"),
+                event="done" if ended else "",
+            )
+            if ended:
+                return
+            await asyncio.sleep(interval)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.post("/jobs/{job_id}/cancel", status_code=202)
+def cancel_job(job: CrawlJob = Depends(get_job)) -> JobProgress:
+    """Cancel a job, the pages it already wrote are still ingested."""
+    job.cancel()
+    return job.progress()
+
+
+# Start FastAPI App
 if __name__ == "__main__":
     # Run the app on localhost port 5000
-    app.run(port=5000, debug=True)
+    uvicorn.run("sherlock.app:app", host="127.0.0.1", port=5000, reload=True)
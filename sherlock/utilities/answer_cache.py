@@ -0,0 +1,205 @@
+"""In-memory LRU cache of answers to prompts about a collection.
+
+Answers are keyed by collection and normalized prompt, expire after a TTL
+and are dropped once the collection changes. With a similarity threshold
+a prompt whose embedding is close enough to a cached one reuses its
+answer as well."""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from collections.abc import Iterator
+from collections.abc import Mapping
+from typing import Any
+from typing import Optional
+
+from pydantic import BaseModel
+
+from sherlock.utilities.retrieval import cosine_similarity
+
+
+class CachedAnswer(BaseModel):
+    """An answer and what it depends on."""
+
+    response: str
+    version: int
+    created: float
+    embedding: Optional[list[float]] = None
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize case and whitespace so trivially different prompts match."""
+    return " ".join(prompt.lower().split())
+
+
+class AnswerCache:
+    """LRU/TTL cache of answers keyed by collection and prompt."""
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 3600.0,
+        similarity_threshold: Optional[float] = None,
+    ):
+        """Initialize the AnswerCache class.
+
+        Args:
+            max_entries (int): The most answers to keep.
+            ttl (float): Seconds an answer stays valid.
+            similarity_threshold (float): Optional cosine similarity above
+                which a cached answer is reused for a different prompt.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: OrderedDict[tuple[str, str], CachedAnswer] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _valid(self, entry: CachedAnswer, version: int) -> bool:
+        """Check that an answer is fresh and its collection is unchanged."""
+        return entry.version == version and time.time() - entry.created < self.ttl
+
+    def get(
+        self,
+        collection: str,
+        prompt: str,
+        version: int,
+        embedding: Optional[list[float]] = None,
+    ) -> Optional[str]:
+        """Look up the answer to a prompt.
+
+        Args:
+            collection (str): The collection the prompt is about.
+            prompt (str): The prompt.
+            version (int): The current version of the collection.
+            embedding (list[float]): The prompt embedding, for similarity lookups.
+
+        Returns:
+            str: The cached answer, or None.
+        """
+        key = (collection, normalize_prompt(prompt))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._valid(entry, version):
+                del self._entries[key]
+                entry = None
+
+            if (
+                entry is None
+                and embedding is not None
+                and self.similarity_threshold is not None
+            ):
+                best = self.similarity_threshold
+                for (other_collection, other_prompt), other in self._entries.items():
+                    if other_collection != collection or other.embedding is None:
+                        continue
+                    if not self._valid(other, version):
+                        continue
+                    similarity = cosine_similarity(embedding, other.embedding)
+                    if similarity >= best:
+                        key = (other_collection, other_prompt)
+                        entry, best = other, similarity
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.response
+
+    def put(
+        self,
+        collection: str,
+        prompt: str,
+        response: str,
+        version: int,
+        embedding: Optional[list[float]] = None,
+    ):
+        """Store the answer to a prompt, evicting the least recently used."""
+        key = (collection, normalize_prompt(prompt))
+
+        with self._lock:
+            self._entries[key] = CachedAnswer(
+                response=response,
+                version=version,
+                created=time.time(),
+                embedding=embedding,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collection: Optional[str] = None):
+        """Drop the answers about a collection, or every answer."""
+        with self._lock:
+            if collection is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == collection]:
+                del self._entries[key]
+
+    @staticmethod
+    def replay(response: str) -> Iterator[Mapping[str, Any]]:
+        """Replay a cached answer in the shape of an Ollama generate stream."""
+        yield {"response": response, "done": True}
+
+    def record(
+        self,
+        stream: Iterator[Mapping[str, Any]],
+        collection: str,
+        prompt: str,
+        version: int,
+        embedding: Optional[list[float]] = None,
+    ) -> Iterator[Mapping[str, Any]]:
+        """Pass a generate stream through, caching the answer once it completes.
+
+        Args:
+            stream (Iterator): The stream of the generate call.
+            collection (str): The collection the prompt is about.
+            prompt (str): The prompt.
+            version (int): The version of the collection the answer is based on.
+            embedding (list[float]): The prompt embedding, for similarity lookups.
+
+        Returns:
+            Iterator: The same chunks as the stream.
+        """
+        parts = []
+        for chunk in stream:
+            parts.append(chunk.get("response", ""))
+            yield chunk
+
+        self.put(
+            collection=collection,
+            prompt=prompt,
+            response="".join(parts),
+            version=version,
+            embedding=embedding,
+        )
+
+    async def record_async(
+        self,
+        stream: AsyncIterator[Mapping[str, Any]],
+        collection: str,
+        prompt: str,
+        version: int,
+        embedding: Optional[list[float]] = None,
+    ) -> AsyncIterator[Mapping[str, Any]]:
+        """Pass an async generate stream through, like record."""
+        parts = []
+        async for chunk in stream:
+            parts.append(chunk.get("response", ""))
+            yield chunk
+
+        self.put(
+            collection=collection,
+            prompt=prompt,
+            response="".join(parts),
+            version=version,
+            embedding=embedding,
+        )
@@ -0,0 +1,160 @@
+"""Async counterpart of OllamaClient for serving concurrent requests.
+
+Requests to Ollama go through one shared, pooled HTTP connection and are
+fanned out concurrently up to a semaphore limit. The vector index, the
+embedding cache and the collection bookkeeping are shared with the
+synchronous OllamaClient. Their blocking calls, SQLite and Chroma, run
+in worker threads so they never stall the event loop."""
+
+import asyncio
+from collections.abc import AsyncIterator
+from collections.abc import Mapping
+from typing import Any
+from typing import Union
+
+import httpx
+import ollama as ollm
+
+from sherlock.utilities.llm import ALL_COLLECTIONS
+from sherlock.utilities.llm import OllamaClient
+from sherlock.utilities.retrieval import Candidate
+from sherlock.utilities.retrieval import pack_context
+
+
+class AsyncOllamaClient:
+    """Async client for the Ollama LLM server sharing the OllamaClient index."""
+
+    def __init__(self, max_concurrency: int = 8):
+        """Initialize the AsyncOllamaClient class.
+
+        Args:
+            max_concurrency (int): The most requests in flight to Ollama.
+        """
+        self.client = OllamaClient()
+        self.max_concurrency = max_concurrency
+        self.ollama = ollm.AsyncClient(
+            host=f"{self.client.host}:{self.client.port}",
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def embeddings(
+        self,
+        prompt: str,
+        model_name: str = "all-minilm",
+    ) -> list[float]:
+        """Embed the text using the model, reusing a cached embedding if any."""
+        return (await self.embed_batch(prompts=[prompt], model_name=model_name))[0]
+
+    async def embed_batch(
+        self,
+        prompts: list[str],
+        model_name: str = "all-minilm",
+    ) -> list[list[float]]:
+        """Embed many texts, reusing cached embeddings.
+
+        The texts missing from the cache are sent embed_max_batch_size at a
+        time, those requests running concurrently. Like OllamaClient, every
+        embedding goes through the batch embed endpoint.
+
+        Args:
+            prompts (list[str]): The texts to embed.
+            model_name (str): The embedding model.
+
+        Returns:
+            list[list[float]]: One embedding per text, in order.
+        """
+        cache = self.client.embedding_cache
+        embeddings = await asyncio.to_thread(
+            cache.get_many,
+            model=model_name,
+            texts=prompts,
+        )
+        missing = [
+            prompt
+            for prompt, embedding in zip(prompts, embeddings)
+            if embedding is None
+        ]
+        if not missing:
+            return embeddings
+
+        async def embed(batch: list[str]) -> list[list[float]]:
+            async with self.semaphore:
+                response = await self.ollama.embed(model=model_name, input=batch)
+            return response["embeddings"]
+
+        requests = []
+        for start in range(0, len(missing), self.client.embed_max_batch_size):
+            end = start + self.client.embed_max_batch_size
+            requests.append(embed(missing[start:end]))
+        batches = await asyncio.gather(*requests)
+        computed = [embedding for batch in batches for embedding in batch]
+        await asyncio.to_thread(
+            cache.put_many,
+            model=model_name,
+            texts=missing,
+            embeddings=computed,
+        )
+
+        computed_iter = iter(computed)
+        return [
+            embedding if embedding is not None else next(computed_iter)
+            for embedding in embeddings
+        ]
+
+    async def retrieve(
+        self,
+        prompt: str,
+        collection_name: Union[str, list[str]] = ALL_COLLECTIONS,
+        top_k: int = 4,
+        use_mmr: bool = False,
+        model_name: str = "all-minilm",
+    ) -> list[Candidate]:
+        """Retrieve the top_k most relevant distinct chunks for a prompt."""
+        embedding = await self.embeddings(prompt=prompt, model_name=model_name)
+        return await asyncio.to_thread(
+            self.client.search,
+            embedding=embedding,
+            collection_name=collection_name,
+            top_k=top_k,
+            use_mmr=use_mmr,
+        )
+
+    async def prompt_from_context(
+        self,
+        prompt: str,
+        model_name: str = "llama3",
+        collection_name: Union[str, list[str]] = ALL_COLLECTIONS,
+        top_k: int = 4,
+        token_budget: int = 1024,
+        use_mmr: bool = False,
+    ) -> AsyncIterator[Mapping[str, Any]]:
+        """Prompt with context, streaming the answer as it is generated."""
+        candidates = await self.retrieve(
+            prompt=prompt,
+            collection_name=collection_name,
+            top_k=top_k,
+            use_mmr=use_mmr,
+        )
+
+        context_prompt = OllamaClient.context_prompt(
+            prompt=prompt,
+            data=pack_context(candidates, token_budget=token_budget),
+        )
+
+        # The slot is held until the answer has been streamed
+        async with self.semaphore:
+            async for chunk in await self.ollama.generate(
+                model=model_name,
+                prompt=context_prompt,
+                stream=True,
+            ):
+                yield chunk
+
+    async def close(self):
+        """Close the pooled HTTP connection."""
+        # The ollama client does not expose its httpx client's close
+        await self.ollama._client.aclose()
@@ -0,0 +1,122 @@
+"""Coalesce concurrent single requests into batched calls.
+
+Callers submit items from any thread and wait on a future. A worker
+collects the items arriving within max_wait of the first one, up to
+max_batch_size, runs them through the batch function in one call and
+hands each caller its own result."""
+
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Any
+from typing import Optional
+
+
+class MicroBatcher:
+    """Collects items submitted concurrently and processes them in batches."""
+
+    def __init__(
+        self,
+        batch_fn: Callable[[list[Any]], list[Any]],
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+    ):
+        """Initialize the MicroBatcher class.
+
+        Args:
+            batch_fn (Callable): Processes a list of items, returning one result each.
+            max_batch_size (int): The most items in one batch.
+            max_wait (float): Seconds to wait for more items after the first.
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+
+        self._queue: queue.Queue[Optional[tuple[Any, Future]]] = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, item: Any) -> Future:
+        """Queue an item, returning a future for its result."""
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        """Process an item as part of a batch and wait for its result."""
+        return self.submit(item).result()
+
+    def _collect(
+        self,
+        first: tuple[Any, Future],
+    ) -> tuple[list[tuple[Any, Future]], bool]:
+        """Collect the items arriving shortly after the first one.
+
+        Returns:
+            tuple: The batch, and whether the batcher was closed meanwhile.
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                # Take whatever is already queued even once the deadline passed
+                if timeout > 0:
+                    request = self._queue.get(timeout=timeout)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+
+        return batch, False
+
+    def _run(self):
+        """Process batches until the batcher is closed."""
+        closed = False
+        while not closed:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, closed = self._collect(first)
+
+            # Skip the items whose caller gave up waiting
+            batch = [
+                (item, future)
+                for item, future in batch
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def close(self):
+        """Stop the worker once the queued items are processed."""
+        with self._lock:
+            if self._worker is not None:
+                self._queue.put(None)
+                self._worker.join()
+                self._worker = None
@@ -0,0 +1,176 @@
+"""Headless browser helpers for rendering Javascript heavy pages.
+
+Browsers are expensive, so pages are only rendered when the static HTML
+looks like a Javascript shell, and the drivers are shared through a
+bounded pool instead of a single global driver."""
+
+import queue
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from enum import Enum
+from typing import Optional
+from typing import Union
+
+from bs4 import BeautifulSoup
+from fake_useragent import UserAgent
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+
+# Element ids used as the mount point of common single page app frameworks
+SPA_ROOT_IDS = ["root", "app", "__next", "__nuxt", "___gatsby", "svelte"]
+
+# Attributes which mark the mount point of common single page app frameworks
+SPA_ROOT_ATTRIBUTES = ["ng-app", "data-reactroot", "data-server-rendered"]
+
+
+class RenderMode(Enum):
+    """When to render HTML pages with the headless browser."""
+
+    ALWAYS = "always"
+    AUTO = "auto"
+    NEVER = "never"
+
+    def __str__(self):
+        return self.value
+
+
+def chrome_options() -> Options:
+    """Build the Chrome options used for every pooled browser.
+
+    Returns:
+    Options: Headless Chrome options that mimic a regular browser visit.
+    """
+    options = Options()
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--headless=old")
+    options.add_argument(f"user-agent={UserAgent().chrome}")
+    options.add_argument("--disable-blink-features")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--profile-directory=Default")
+    options.add_argument("--incognito")
+    options.add_argument("--disable-plugins-discovery")
+    options.add_argument("--start-maximized")
+    return options
+
+
+def needs_render(
+    page: BeautifulSoup,
+    html: Union[str, bytes],
+    min_text_ratio: float = 0.02,
+) -> bool:
+    """Decide whether a statically fetched page is a Javascript shell.
+
+    Args:
+    page (BeautifulSoup): The parsed static HTML.
+    html (Union[str, bytes]): The raw static HTML.
+    min_text_ratio (float): The minimum ratio of visible text to markup.
+
+    Returns:
+    bool: True if the page should be rendered in the browser.
+    """
+    body = page.body
+    if body is None:
+        return True
+
+    text = body.get_text(" ", strip=True)
+    if not text:
+        return True
+
+    # An empty mount point means the content is built client side
+    for root_id in SPA_ROOT_IDS:
+        root = page.find(id=root_id)
+        if root is not None and not root.get_text(strip=True):
+            return True
+
+    for attribute in SPA_ROOT_ATTRIBUTES:
+        root = page.find(attrs={attribute: True})
+        if root is not None and not root.get_text(strip=True):
+            return True
+
+    for noscript in page.find_all("noscript"):
+        if "enable javascript" in noscript.get_text().lower():
+            return True
+
+    return len(text) / max(len(html), 1) < min_text_ratio
+
+
+class BrowserPool:
+    """Bounded pool of headless Chrome drivers.
+
+    Drivers are started lazily, up to size, and handed to one caller at a
+    time. Callers wait for an idle driver once the pool is exhausted.
+    """
+
+    def __init__(self, size: int = 2, wait: int = 10):
+        """Initialize the BrowserPool class.
+
+        Args:
+        size (int): The maximum number of drivers to start.
+        wait (int): The implicit wait in seconds for elements to load.
+        """
+        self.size = size
+        self.wait = wait
+        self._idle: queue.Queue = queue.Queue()
+        self._drivers: list[webdriver.Chrome] = []
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> webdriver.Chrome:
+        """Take an idle driver, starting a new one if the pool is not full."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            start_driver = len(self._drivers) < self.size
+            if start_driver:
+                driver = webdriver.Chrome(options=chrome_options())
+                self._drivers.append(driver)
+
+        if start_driver:
+            return driver
+
+        return self._idle.get()
+
+    @contextmanager
+    def driver(self) -> Iterator[webdriver.Chrome]:
+        """Borrow a driver from the pool for the duration of the block."""
+        driver = self._acquire()
+        try:
+            yield driver
+        finally:
+            self._idle.put(driver)
+
+    def render(self, url: str) -> str:
+        """Render a URL in the browser and return the resulting HTML.
+
+        Args:
+        url (str): The URL to render.
+
+        Returns:
+        str: The page source after Javascript has run.
+        """
+        with self.driver() as driver:
+            # Visit the target website with Chrome web driver
+            driver.get(url)
+            # Wait for elements to load
+            driver.implicitly_wait(self.wait)
+            return driver.page_source
+
+    def close(self, timeout: Optional[float] = None):
+        """Quit every driver started by the pool.
+
+        Args:
+        timeout (float): Seconds to wait for borrowed drivers to be returned.
+        """
+        with self._lock:
+            for _ in self._drivers:
+                try:
+                    self._idle.get(timeout=timeout).quit()
+                except queue.Empty:
+                    break
+            self._drivers = []
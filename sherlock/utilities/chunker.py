@@ -0,0 +1,244 @@
+"""Split markdown documents into overlapping, token bounded chunks.
+
+Documents are read line by line, grouped into blocks at headings and
+paragraph breaks, and the blocks are packed into windows of at most
+max_tokens. Each window starts with the last overlap_tokens tokens of the
+one before, cut mid block when needed, unless it opens a new section.
+Each chunk keeps the character offsets of its text within the source
+file."""
+
+import re
+from collections.abc import Iterable
+from collections.abc import Iterator
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+HEADING = re.compile(r"^#{1,6}\s")
+
+# Words and single punctuation marks, a close estimate of subword tokens
+TOKEN = re.compile(r"\w+|[^\w\s]")
+
+METADATA_START = "# Metadata for this file:"
+METADATA_END = "** END OF METADATA **"
+
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text."""
+    return len(TOKEN.findall(text))
+
+
+class Block(BaseModel):
+    """A heading or paragraph of a document and its offset in the source."""
+
+    text: str
+    start: int
+    tokens: int
+    heading: Optional[str] = None
+
+
+class Chunk(BaseModel):
+    """A window of a document, ready to be embedded."""
+
+    text: str
+    source: str
+    path: str
+    start: int
+    end: int
+    tokens: int
+    heading: Optional[str] = None
+
+
+def read_blocks(lines: Iterable[str], metadata: dict[str, str]) -> Iterator[Block]:
+    """Group lines into heading and paragraph blocks.
+
+    Blank lines stay attached to the block before them, so consecutive
+    blocks cover a contiguous range of the source. A leading metadata
+    header is parsed into metadata instead of being returned as text.
+
+    Args:
+    lines (Iterable[str]): The lines of the document, line endings included.
+    metadata (dict): Filled with the key/values of the metadata header.
+
+    Returns:
+    Iterator: The blocks of the document in order.
+    """
+    offset, lines_read = 0, 0
+    in_metadata = False
+    heading: Optional[str] = None
+    text, start, blank = "", 0, False
+
+    for line in lines:
+        stripped = line.strip()
+        lines_read += 1
+
+        if lines_read == 1 and stripped == METADATA_START:
+            in_metadata = True
+        if in_metadata:
+            offset += len(line)
+            if stripped.startswith("- ") and ": " in stripped:
+                key, value = stripped[2:].split(": ", 1)
+                metadata[key] = value
+            elif stripped == METADATA_END:
+                in_metadata = False
+                start = offset
+            continue
+
+        is_heading = HEADING.match(line) is not None
+        if text and (is_heading or (blank and stripped)):
+            yield Block(
+                text=text,
+                start=start,
+                tokens=count_tokens(text),
+                heading=heading,
+            )
+            text, start, blank = "", offset, False
+
+        if is_heading:
+            heading = stripped.lstrip("#").strip()
+        if text or stripped:
+            text += line
+        else:
+            start += len(line)
+        blank = blank or not stripped
+        offset += len(line)
+
+    if text:
+        yield Block(text=text, start=start, tokens=count_tokens(text), heading=heading)
+
+
+def split_block(
+    block: Block,
+    max_tokens: int,
+    overlap_tokens: int = 0,
+) -> Iterator[Block]:
+    """Split a block with more than max_tokens into smaller blocks.
+
+    The pieces hold max_tokens - overlap_tokens tokens, leaving room for
+    the overlap carried in front of each of them.
+    """
+    if block.tokens <= max_tokens:
+        yield block
+        return
+
+    size = max_tokens - overlap_tokens
+    matches = list(TOKEN.finditer(block.text))
+    for first in range(0, len(matches), size):
+        last = min(first + size, len(matches))
+        begin = matches[first].start() if first else 0
+        finish = matches[last].start() if last < len(matches) else len(block.text)
+        yield Block(
+            text=block.text[begin:finish],
+            start=block.start + begin,
+            tokens=last - first,
+            heading=block.heading,
+        )
+
+
+def tail_block(block: Block, tokens: int) -> Block:
+    """Keep the last tokens of a block, up to its end."""
+    if tokens >= block.tokens:
+        return block
+
+    begin = list(TOKEN.finditer(block.text))[block.tokens - tokens].start()
+    return Block(
+        text=block.text[begin:],
+        start=block.start + begin,
+        tokens=tokens,
+        heading=block.heading,
+    )
+
+
+def chunk_lines(
+    lines: Iterable[str],
+    path: str = "",
+    max_tokens: int = 200,
+    overlap_tokens: int = 40,
+) -> Iterator[Chunk]:
+    """Split the lines of a markdown document into overlapping chunks.
+
+    Args:
+    lines (Iterable[str]): The lines of the document, line endings included.
+    path (str): The path of the document, stored with each chunk.
+    max_tokens (int): The most tokens a chunk may hold.
+    overlap_tokens (int): The tokens repeated from the previous chunk, less
+        than max_tokens.
+
+    Returns:
+    Iterator: The chunks of the document in order.
+    """
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("overlap_tokens must be between 0 and max_tokens - 1.")
+
+    metadata: dict[str, str] = {}
+    window: list[Block] = []
+    tokens = 0
+
+    def make_chunk() -> Chunk:
+        text = "".join(block.text for block in window)
+        leading = len(text) - len(text.lstrip())
+        start = window[0].start + leading
+        text = text.strip()
+        return Chunk(
+            text=text,
+            source=metadata.get("source", path),
+            path=path,
+            start=start,
+            end=start + len(text),
+            tokens=tokens,
+            heading=window[0].heading,
+        )
+
+    for large_block in read_blocks(lines, metadata=metadata):
+        for block in split_block(
+            large_block,
+            max_tokens=max_tokens,
+            overlap_tokens=overlap_tokens,
+        ):
+            if window and tokens + block.tokens > max_tokens:
+                yield make_chunk()
+
+                # Carry the last tokens of the window, whole blocks first,
+                # unless the next block starts another section
+                overlap = min(overlap_tokens, max_tokens - block.tokens)
+                kept: list[Block] = []
+                kept_tokens = 0
+                for previous in reversed(window):
+                    if kept_tokens == overlap or previous.heading != block.heading:
+                        break
+                    previous = tail_block(previous, overlap - kept_tokens)
+                    kept.insert(0, previous)
+                    kept_tokens += previous.tokens
+                window, tokens = kept, kept_tokens
+
+            window.append(block)
+            tokens += block.tokens
+
+    if window:
+        yield make_chunk()
+
+
+def chunk_file(
+    path: str,
+    max_tokens: int = 200,
+    overlap_tokens: int = 40,
+) -> Iterator[Chunk]:
+    """Stream the chunks of a markdown file without reading it whole.
+
+    Args:
+    path (str): The path of the file.
+    max_tokens (int): The most tokens a chunk may hold.
+    overlap_tokens (int): The most tokens repeated from the previous chunk.
+
+    Returns:
+    Iterator: The chunks of the file in order.
+    """
+    # newline="" keeps line endings intact so offsets match the file
+    with open(path, encoding="utf-8", newline="") as f:
+        yield from chunk_lines(
+            f,
+            path=path,
+            max_tokens=max_tokens,
+            overlap_tokens=overlap_tokens,
+        )
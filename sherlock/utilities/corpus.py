@@ -0,0 +1,320 @@
+"""Sharded, compressed storage for the pages of a collection.
+
+Writing one file per page creates hundreds of thousands of small files on
+large crawls. Instead, each page can be appended as a record (URL,
+metadata, content) to size capped shard files. Every record is its own
+gzip member, so a shard reads as one gzip stream and any record can be
+decompressed alone from the offset kept in a SQLite index.
+
+Records are keyed by the path the page would be written to, so the crawl
+manifest, removals and the per-page export work the same as with files."""
+
+import mmap
+import os
+import sqlite3
+import threading
+import zlib
+from collections.abc import Iterator
+from typing import Optional
+
+from pydantic import BaseModel
+
+from sherlock.utilities.metadata import Metadata
+from sherlock.utilities.writer import ROOT_PATH
+from sherlock.utilities.writer import path_to_valid_name
+from sherlock.utilities.writer import remove_prefix
+
+
+CORPUS_PATH = "corpus"
+
+SHARD_EXTENSION = ".jsonl.gz"
+
+# zlib window bits for a gzip header and trailer around each record
+GZIP_WBITS = 31
+
+
+class CorpusRecord(BaseModel):
+    """A page stored in the corpus."""
+
+    url: str
+    path: str
+    metadata: Metadata
+    content: str
+
+    def to_markdown(self) -> str:
+        """Get the page as it is written to a file, metadata header included."""
+        return self.metadata.to_markdown() + self.content
+
+
+def shard_name(number: int) -> str:
+    """Get the file name of a shard."""
+    return f"shard-{number:05d}{SHARD_EXTENSION}"
+
+
+class ShardedCorpus:
+    """Append only shards of compressed pages with an offset index."""
+
+    def __init__(
+        self,
+        collection_name: str,
+        max_shard_bytes: int = 64 * 1024 * 1024,
+        compression_level: int = 6,
+    ):
+        """Initialize the ShardedCorpus class.
+
+        Args:
+        collection_name (str): The name of the collection.
+        max_shard_bytes (int): The compressed size at which a new shard is started.
+        compression_level (int): The zlib compression level, from 1 to 9.
+        """
+        name = path_to_valid_name(remove_prefix(collection_name))
+        self.directory = f"{CORPUS_PATH}{os.sep}{name}"
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.max_shard_bytes = max_shard_bytes
+        self.compression_level = compression_level
+
+        # Pages are appended from the crawl worker threads
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            f"{self.directory}{os.sep}index.sqlite",
+            check_same_thread=False,
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # Skip the sync on every commit, WAL keeps the index consistent
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                path TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                shard INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            )
+            """,
+        )
+        self._connection.commit()
+
+        # Continue the last shard, records are only ever appended
+        shards = self.shards()
+        self._shard = shards[-1] if shards else 0
+        self._file = open(self.shard_path(self._shard), "ab")
+
+    def shard_path(self, number: int) -> str:
+        """Get the path of a shard."""
+        return f"{self.directory}{os.sep}{shard_name(number)}"
+
+    def shards(self) -> list[int]:
+        """List the numbers of the shards on disk."""
+        return sorted(
+            int(name.removeprefix("shard-").removesuffix(SHARD_EXTENSION))
+            for name in os.listdir(self.directory)
+            if name.startswith("shard-") and name.endswith(SHARD_EXTENSION)
+        )
+
+    def _compress(self, record: CorpusRecord) -> bytes:
+        """Compress a record into a gzip member of its own."""
+        compressor = zlib.compressobj(self.compression_level, zlib.DEFLATED, GZIP_WBITS)
+        data = (record.model_dump_json() + "\n").encode("utf-8")
+        return compressor.compress(data) + compressor.flush()
+
+    @staticmethod
+    def _decompress(data: bytes) -> CorpusRecord:
+        """Read a record from its gzip member."""
+        return CorpusRecord.model_validate_json(zlib.decompress(data, GZIP_WBITS))
+
+    def _write(self, record: CorpusRecord) -> tuple[int, int, int]:
+        """Append a compressed record to the current shard.
+
+        Returns:
+        tuple: The shard, offset and length of the record.
+        """
+        data = self._compress(record)
+        offset = self._file.tell()
+        if offset and offset + len(data) > self.max_shard_bytes:
+            self._file.close()
+            self._shard += 1
+            self._file = open(self.shard_path(self._shard), "ab")
+            offset = 0
+        self._file.write(data)
+        return self._shard, offset, len(data)
+
+    def append(self, url: str, path: str, metadata: Metadata, content: str) -> int:
+        """Append a page, replacing any previous record for its path.
+
+        Args:
+        url (str): The URL of the page.
+        path (str): The path the page would be written to.
+        metadata (Metadata): The metadata of the page.
+        content (str): The markdown of the page.
+
+        Returns:
+        int: The number of characters of the page, metadata header included.
+        """
+        record = CorpusRecord(url=url, path=path, metadata=metadata, content=content)
+        with self._lock:
+            shard, offset, length = self._write(record)
+            self._file.flush()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)",
+                (path, url, shard, offset, length),
+            )
+            self._connection.commit()
+
+        return len(record.to_markdown())
+
+    def get(self, path: str) -> Optional[CorpusRecord]:
+        """Read the record of a path, if any."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT shard, offset, length FROM records WHERE path = ?",
+                (path,),
+            ).fetchone()
+            if row is None:
+                return None
+            shard, offset, length = row
+            with open(self.shard_path(shard), "rb") as f:
+                f.seek(offset)
+                return ShardedCorpus._decompress(f.read(length))
+
+    def remove(self, path: str) -> bool:
+        """Forget the record of a path, its bytes are dropped on compaction.
+
+        Returns:
+        bool: Whether the path had a record.
+        """
+        with self._lock:
+            removed = self._connection.execute(
+                "DELETE FROM records WHERE path = ?",
+                (path,),
+            ).rowcount
+            self._connection.commit()
+        return removed > 0
+
+    def __len__(self) -> int:
+        """The number of records."""
+        with self._lock:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM records",
+            ).fetchone()
+        return count
+
+    def _rows(self) -> list[tuple[str, int, int, int]]:
+        """Get the location of every record, in the order they were written."""
+        self._file.flush()
+        return self._connection.execute(
+            "SELECT path, shard, offset, length FROM records ORDER BY shard, offset",
+        ).fetchall()
+
+    def _read(
+        self,
+        rows: list[tuple[str, int, int, int]],
+    ) -> Iterator[tuple[str, CorpusRecord]]:
+        """Read records shard by shard through a memory map of each shard."""
+        current, view = None, None
+        try:
+            for path, shard, offset, length in rows:
+                if shard != current:
+                    if view is not None:
+                        view.close()
+                    with open(self.shard_path(shard), "rb") as f:
+                        view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    current = shard
+                end = offset + length
+                yield path, ShardedCorpus._decompress(view[offset:end])
+        finally:
+            if view is not None:
+                view.close()
+
+    def records(self) -> Iterator[CorpusRecord]:
+        """Read the current records sequentially, in the order they were written.
+
+        Shards are memory mapped, so reading never copies a whole shard.
+        Records replaced or removed since they were written are skipped.
+        """
+        with self._lock:
+            rows = self._rows()
+
+        for _, record in self._read(rows):
+            yield record
+
+    def garbage_ratio(self) -> float:
+        """The share of shard bytes held by replaced or removed records."""
+        with self._lock:
+            self._file.flush()
+            live = self._connection.execute(
+                "SELECT COALESCE(SUM(length), 0) FROM records",
+            ).fetchone()[0]
+            total = sum(
+                os.path.getsize(self.shard_path(shard)) for shard in self.shards()
+            )
+        return 1 - live / total if total else 0.0
+
+    def compact(self):
+        """Rewrite the current records into new shards and delete the old ones.
+
+        Worth running once garbage_ratio shows replaced and removed records
+        take a large share of the shards, such as after incremental crawls.
+        """
+        with self._lock:
+            rows = self._rows()
+            old_shards = self.shards()
+            self._file.close()
+            self._shard = (old_shards[-1] + 1) if old_shards else 0
+            self._file = open(self.shard_path(self._shard), "ab")
+
+            locations = [
+                (*self._write(record), path) for path, record in self._read(rows)
+            ]
+            self._file.flush()
+
+            self._connection.executemany(
+                "UPDATE records SET shard = ?, offset = ?, length = ? WHERE path = ?",
+                locations,
+            )
+            self._connection.commit()
+
+            for shard in old_shards:
+                os.remove(self.shard_path(shard))
+
+    def export(self, directory: str = ROOT_PATH) -> int:
+        """Write every record to its own file, as the file output would.
+
+        Used to feed tools which read a directory of pages, such as the
+        Open WebUI documents volume.
+
+        Args:
+        directory (str): The root the record paths are written under.
+
+        Returns:
+        int: The number of files written.
+        """
+        written = 0
+        for record in self.records():
+            path = os.path.join(
+                directory,
+                os.path.relpath(record.path, ROOT_PATH),
+            )
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(record.to_markdown())
+            written += 1
+        return written
+
+    def clear(self):
+        """Forget every record and delete the shards."""
+        with self._lock:
+            self._file.close()
+            for shard in self.shards():
+                os.remove(self.shard_path(shard))
+            self._connection.execute("DELETE FROM records")
+            self._connection.commit()
+            self._shard = 0
+            self._file = open(self.shard_path(self._shard), "ab")
+
+    def close(self):
+        """Close the current shard and the index."""
+        with self._lock:
+            self._file.close()
+            self._connection.close()
@@ -0,0 +1,330 @@
+"""Persisted crawl state used to re-crawl a collection incrementally.
+
+Every page fetched for a collection is recorded in a small SQLite database
+together with its validators (ETag / Last-Modified), a hash of the body
+and where it was written. A later crawl can then ask the server whether
+the page changed and skip converting and writing pages that did not.
+
+Pages are committed as soon as they are written, so the database also
+acts as a checkpoint: an interrupted crawl can be resumed from the pages
+it already recorded, along with the sub-links found on them."""
+
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from pydantic import BaseModel
+
+from sherlock.utilities.writer import path_to_valid_name
+from sherlock.utilities.writer import remove_prefix
+
+
+STATE_PATH = "crawl_state"
+
+ENTRY_COLUMNS = (
+    "url, etag, last_modified, content_hash, depth, output_path, size, sublinks, "
+    "lastmod, duplicate_of, text_hash, fingerprint"
+)
+
+
+def content_hash(content: bytes) -> str:
+    """Hash the raw body of a page.
+
+    Args:
+    content (bytes): The body of the page.
+
+    Returns:
+    str: The hex digest of the body.
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+def read_sources() -> dict[str, str]:
+    """Map the output path of every recorded page to its URL.
+
+    The manifests of all collections are read without starting a run, so
+    the files of a crawl can be traced back to their URLs after it is done.
+
+    Returns:
+    dict: The URLs by normalized output path.
+    """
+    sources = {}
+    for path in glob.glob(os.path.join(STATE_PATH, "*.sqlite")):
+        connection = sqlite3.connect(path)
+        try:
+            rows = connection.execute(
+                "SELECT output_path, url FROM pages WHERE output_path IS NOT NULL",
+            ).fetchall()
+        except sqlite3.Error:
+            continue
+        finally:
+            connection.close()
+        sources.update((os.path.normpath(output), url) for output, url in rows)
+    return sources
+
+
+class ManifestEntry(BaseModel):
+    """A page recorded in the crawl manifest."""
+
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: str
+    depth: int
+    output_path: Optional[str]
+    size: int
+    sublinks: list[str]
+    lastmod: Optional[str] = None
+    duplicate_of: Optional[str] = None
+    # Hash and SimHash fingerprint of the extracted text, to find copies of
+    # the page in later crawls without fetching it again
+    text_hash: Optional[str] = None
+    fingerprint: Optional[int] = None
+
+    def conditional_headers(self) -> dict[str, str]:
+        """Build the headers for a conditional request of this page."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class CrawlManifest:
+    """Per collection record of every page fetched by the scraper."""
+
+    def __init__(self, collection_name: str, resume: bool = False):
+        """Initialize the CrawlManifest class.
+
+        Args:
+        collection_name (str): The name of the collection.
+        resume (bool): Continue the previous run if it did not finish.
+        """
+        if not os.path.exists(STATE_PATH):
+            os.makedirs(STATE_PATH)
+
+        name = path_to_valid_name(remove_prefix(collection_name))
+        self.path = f"{STATE_PATH}{os.sep}{name}.sqlite"
+        self.run_id = time.time_ns()
+        self.summary = {"new": 0, "changed": 0, "unchanged": 0, "deleted": 0}
+
+        # Pages are recorded from the crawl worker threads
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                output_path TEXT,
+                size INTEGER NOT NULL,
+                sublinks TEXT NOT NULL,
+                run_id INTEGER NOT NULL,
+                lastmod TEXT,
+                duplicate_of TEXT,
+                text_hash TEXT,
+                fingerprint TEXT
+            )
+            """,
+        )
+
+        # Manifests written before sitemap support lack the lastmod column
+        columns = [
+            row[1] for row in self._connection.execute("PRAGMA table_info(pages)")
+        ]
+        if "lastmod" not in columns:
+            self._connection.execute("ALTER TABLE pages ADD COLUMN lastmod TEXT")
+        # And manifests written before duplicate detection lack duplicate_of
+        if "duplicate_of" not in columns:
+            self._connection.execute("ALTER TABLE pages ADD COLUMN duplicate_of TEXT")
+        if "text_hash" not in columns:
+            self._connection.execute("ALTER TABLE pages ADD COLUMN text_hash TEXT")
+            # Fingerprints are unsigned 64 bit, stored as hex text
+            self._connection.execute("ALTER TABLE pages ADD COLUMN fingerprint TEXT")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS crawl (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+        )
+
+        # Adopt the identifier of an unfinished run so its pages count as seen
+        state = dict(
+            self._connection.execute("SELECT key, value FROM crawl").fetchall(),
+        )
+        self.resumed = resume and state.get("status") == "running"
+        if self.resumed:
+            self.run_id = int(state["run_id"])
+
+        self._set_state(status="running")
+
+    def _set_state(self, status: str):
+        """Persist the identifier and status of the current run."""
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO crawl VALUES (?, ?)",
+                [("run_id", str(self.run_id)), ("status", status)],
+            )
+            self._connection.commit()
+
+    def get(self, url: str) -> Optional[ManifestEntry]:
+        """Get the recorded entry for a URL, if any."""
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT {ENTRY_COLUMNS} FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return CrawlManifest._to_entry(row)
+
+    @staticmethod
+    def _to_entry(row: tuple) -> ManifestEntry:
+        """Convert a row of the pages table to an entry."""
+        return ManifestEntry(
+            url=row[0],
+            etag=row[1],
+            last_modified=row[2],
+            content_hash=row[3],
+            depth=row[4],
+            output_path=row[5],
+            size=row[6],
+            sublinks=json.loads(row[7]),
+            lastmod=row[8],
+            duplicate_of=row[9],
+            text_hash=row[10],
+            fingerprint=int(row[11], 16) if row[11] is not None else None,
+        )
+
+    def record(self, entry: ManifestEntry) -> str:
+        """Record a page which was fetched and written during this run.
+
+        Args:
+        entry (ManifestEntry): The page to record.
+
+        Returns:
+        str: Whether the page was "new" or "changed".
+        """
+        with self._lock:
+            exists = self._connection.execute(
+                "SELECT 1 FROM pages WHERE url = ?",
+                (entry.url,),
+            ).fetchone()
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO pages ({ENTRY_COLUMNS}, run_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.url,
+                    entry.etag,
+                    entry.last_modified,
+                    entry.content_hash,
+                    entry.depth,
+                    entry.output_path,
+                    entry.size,
+                    json.dumps(entry.sublinks),
+                    entry.lastmod,
+                    entry.duplicate_of,
+                    entry.text_hash,
+                    (
+                        format(entry.fingerprint, "x")
+                        if entry.fingerprint is not None
+                        else None
+                    ),
+                    self.run_id,
+                ),
+            )
+            self._connection.commit()
+
+            status = "changed" if exists else "new"
+            self.summary[status] += 1
+
+        return status
+
+    def visited(self) -> list[ManifestEntry]:
+        """Get the pages already seen during this run."""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {ENTRY_COLUMNS} FROM pages WHERE run_id = ?",
+                (self.run_id,),
+            ).fetchall()
+
+        return [CrawlManifest._to_entry(row) for row in rows]
+
+    def links(self) -> dict[str, Optional[str]]:
+        """Map the pages seen during this run to where their text is.
+
+        Returns:
+        dict: The output path of each page, or the URL it copies for aliases.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT url, COALESCE(duplicate_of, output_path) FROM pages "
+                "WHERE run_id = ?",
+                (self.run_id,),
+            ).fetchall()
+
+        return dict(rows)
+
+    def mark_unchanged(self, url: str, depth: int, lastmod: Optional[str] = None):
+        """Mark a recorded page as seen during this run without changes.
+
+        Args:
+        url (str): The URL of the page.
+        depth (int): The depth the page was reached at during this run.
+        lastmod (str): Optional sitemap lastmod to remember for the page.
+        """
+        with self._lock:
+            self._connection.execute(
+                "UPDATE pages SET run_id = ?, depth = MIN(depth, ?), "
+                "lastmod = COALESCE(?, lastmod) WHERE url = ?",
+                (self.run_id, depth, lastmod, url),
+            )
+            self._connection.commit()
+            self.summary["unchanged"] += 1
+
+    def remove_unseen(self) -> list[str]:
+        """Forget pages which were not seen during this run.
+
+        Returns:
+        list: The output paths which no remaining page writes to.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT DISTINCT output_path FROM pages WHERE run_id != ? "
+                "AND output_path IS NOT NULL AND output_path NOT IN "
+                "(SELECT output_path FROM pages WHERE run_id = ? "
+                "AND output_path IS NOT NULL)",
+                (self.run_id, self.run_id),
+            ).fetchall()
+            deleted = self._connection.execute(
+                "DELETE FROM pages WHERE run_id != ?",
+                (self.run_id,),
+            ).rowcount
+            self._connection.commit()
+            self.summary["deleted"] += deleted
+
+        return [row[0] for row in rows]
+
+    def finish(self):
+        """Mark the current run as complete so it is not resumed."""
+        self._set_state(status="complete")
+
+    def clear(self):
+        """Forget every recorded page."""
+        with self._lock:
+            self._connection.execute("DELETE FROM pages")
+            self._connection.commit()
+
+    def close(self):
+        """Close the underlying database."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,200 @@
+"""Detect pages whose content was already scraped under another URL.
+
+Sites often serve the same content as print views, paginated copies or
+locale mirrors. Exact copies are found by hashing the normalized text.
+Near copies are found with SimHash: 64 bit fingerprints of the word
+shingles of a page, which differ in only a few bits for similar texts.
+
+Fingerprints are split into max_distance + 1 bands. Two fingerprints
+within max_distance bits of each other agree on at least one band, so a
+page is only compared to the few pages sharing a band with it."""
+
+import hashlib
+import re
+import threading
+from typing import Optional
+
+
+WORD = re.compile(r"\w+")
+
+FINGERPRINT_BITS = 64
+
+# Each bit of a fingerprint is counted in a field of this many bits of one
+# large integer, so counting is additions rather than a loop over bits
+FIELD_BITS = 16
+
+MAX_FEATURES = 2**FIELD_BITS - 1
+
+# The counters of every byte value, for each byte of a 64 bit hash
+BYTE_COUNTERS = [
+    [
+        sum(((byte >> bit) & 1) << ((index * 8 + bit) * FIELD_BITS) for bit in range(8))
+        for byte in range(256)
+    ]
+    for index in range(FINGERPRINT_BITS // 8)
+]
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase a text and collapse its whitespace."""
+    return " ".join(text.lower().split())
+
+
+def text_hash(text: str) -> str:
+    """Hash the normalized text of a page."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def simhash(words: list[str], shingle_size: int = 3) -> int:
+    """Compute the SimHash fingerprint of a text from its word shingles.
+
+    Args:
+    words (list[str]): The lowercase words of the text.
+    shingle_size (int): The number of words in each shingle.
+
+    Returns:
+    int: The 64 bit fingerprint.
+    """
+    shingles = {
+        " ".join(shingle)
+        for shingle in zip(*(words[start:] for start in range(shingle_size)))
+    }
+
+    counters, features = 0, 0
+    for shingle in shingles:
+        digest = hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+        for index, byte in enumerate(digest):
+            counters += BYTE_COUNTERS[index][byte]
+        features += 1
+        if features == MAX_FEATURES:
+            break
+
+    # A bit is set when most shingle hashes have it set
+    mask = MAX_FEATURES
+    fingerprint = 0
+    for bit in range(FINGERPRINT_BITS):
+        if ((counters >> (bit * FIELD_BITS)) & mask) * 2 > features:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Count the bits which differ between two fingerprints."""
+    return (a ^ b).bit_count()
+
+
+class DuplicateIndex:
+    """Remembers the content of scraped pages to spot copies of them."""
+
+    def __init__(self, max_distance: int = 3, min_words: int = 50):
+        """Initialize the DuplicateIndex class.
+
+        Args:
+        max_distance (int): The most differing fingerprint bits for near copies.
+            The default of 3 catches pages differing by a few words.
+        min_words (int): Shorter pages are only compared exactly, their
+            fingerprints are too unstable.
+        """
+        if not 0 <= max_distance < FINGERPRINT_BITS // 4:
+            raise ValueError(
+                f"max_distance must be between 0 and {FINGERPRINT_BITS // 4 - 1}.",
+            )
+
+        self.max_distance = max_distance
+        self.min_words = min_words
+
+        # Checks run on the crawl worker threads
+        self._lock = threading.Lock()
+        self._hashes: dict[str, str] = {}
+        self._bands: list[dict[int, list[tuple[int, str]]]] = [
+            {} for _ in range(max_distance + 1)
+        ]
+
+    def _band_keys(self, fingerprint: int) -> list[int]:
+        """Split a fingerprint into its bands, the last one takes the spare bits."""
+        width = FINGERPRINT_BITS // len(self._bands)
+        keys = [
+            (fingerprint >> (band * width)) & ((1 << width) - 1)
+            for band in range(len(self._bands) - 1)
+        ]
+        return keys + [fingerprint >> ((len(self._bands) - 1) * width)]
+
+    def check_hash(self, url: str, digest: str) -> Optional[str]:
+        """Find the URL first seen with the same content hash, or remember this one.
+
+        Args:
+        url (str): The URL of the content.
+        digest (str): The hash of the content.
+
+        Returns:
+        str: The URL the content was first seen at, or None if it is new.
+        """
+        with self._lock:
+            original = self._hashes.get(digest)
+            if original is None:
+                self._hashes[digest] = url
+        return original
+
+    def fingerprint(self, text: str) -> tuple[str, Optional[int]]:
+        """Hash a text and compute its fingerprint, None for short texts.
+
+        Args:
+        text (str): The text extracted from a page.
+
+        Returns:
+        tuple: The hash of the normalized text and its SimHash fingerprint.
+        """
+        words = WORD.findall(text.lower())
+        return (
+            text_hash(text),
+            simhash(words) if len(words) >= self.min_words else None,
+        )
+
+    def check(self, url: str, text: str) -> Optional[str]:
+        """Find a page with the same or nearly the same text, or remember this one.
+
+        Args:
+        url (str): The URL of the page.
+        text (str): The text extracted from the page.
+
+        Returns:
+        str: The URL of the page this one copies, or None if it is new.
+        """
+        digest, fingerprint = self.fingerprint(text)
+        return self.check_fingerprint(url, digest=digest, fingerprint=fingerprint)
+
+    def check_fingerprint(
+        self,
+        url: str,
+        digest: str,
+        fingerprint: Optional[int],
+    ) -> Optional[str]:
+        """Like check, from the hash and fingerprint of a text.
+
+        Pages recorded by an earlier crawl are remembered this way without
+        their text being fetched again.
+
+        Args:
+        url (str): The URL of the page.
+        digest (str): The hash of the normalized text.
+        fingerprint (int): The SimHash fingerprint, None for short texts.
+
+        Returns:
+        str: The URL of the page this one copies, or None if it is new.
+        """
+        with self._lock:
+            if digest in self._hashes:
+                return self._hashes[digest]
+
+            if fingerprint is not None:
+                keys = self._band_keys(fingerprint)
+                for band, key in zip(self._bands, keys):
+                    for other, other_url in band.get(key, []):
+                        if hamming_distance(fingerprint, other) <= self.max_distance:
+                            return other_url
+                for band, key in zip(self._bands, keys):
+                    band.setdefault(key, []).append((fingerprint, url))
+
+            self._hashes[digest] = url
+
+        return None
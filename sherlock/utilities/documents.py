@@ -0,0 +1,427 @@
+"""Convert scraped documents, spreadsheets and slides to markdown for ingestion.
+
+The scraper writes documents to disk as raw bytes. Each one is converted
+to a markdown file next to it, starting with the same metadata header as
+scraped web pages. Text is written page by page (or paragraph by
+paragraph) as it is extracted, so a large PDF never sits in memory.
+Spreadsheets are read row by row and written as markdown tables of a few
+rows each, so a large workbook is never loaded as a whole.
+
+Parsing is CPU bound, so conversions run on a pool of processes."""
+
+import csv
+import datetime
+import multiprocessing
+import os
+import zipfile
+from collections.abc import Iterable
+from collections.abc import Iterator
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from typing import Optional
+
+import docx
+import openpyxl
+import pptx
+import pypdf
+import xlrd
+from docx.table import Table
+
+from sherlock.utilities.chunker import count_tokens
+from sherlock.utilities.chunker import read_blocks
+from sherlock.utilities.file_type import FileType
+from sherlock.utilities.metadata import Metadata
+
+
+DOCUMENT_TYPES = {
+    ".pdf": FileType.PDF,
+    ".docx": FileType.DOCX,
+    ".xlsx": FileType.XLSX,
+    ".xls": FileType.XLSX,
+    ".csv": FileType.CSV,
+    ".pptx": FileType.PPTX,
+}
+
+# Tokens in each markdown table of a spreadsheet, heading included, so
+# every table fits in one chunk of the default QueryService.max_tokens
+TABLE_MAX_TOKENS = 180
+
+MARKDOWN_EXTENSION = ".md"
+
+
+def markdown_path(path: str) -> str:
+    """Get the path a document is converted to.
+
+    The document extension is kept, so report.pdf and report.docx never
+    overwrite each other or the page scraped from a report URL.
+    """
+    return path + MARKDOWN_EXTENSION
+
+
+def clean_cells(row: Iterable) -> list[str]:
+    """Turn the values of a row into single line strings without trailing blanks."""
+    cells = ["" if value is None else " ".join(str(value).split()) for value in row]
+    while cells and not cells[-1]:
+        cells.pop()
+    return cells
+
+
+def table_row(cells: list[str]) -> str:
+    """Render a row of a markdown table, without padding the cells."""
+    return "| " + " | ".join(cell.replace("|", "\\|") for cell in cells) + " |"
+
+
+def markdown_table(header: list[str], rows: list[list[str]]) -> str:
+    """Render rows as a markdown table."""
+    lines = [header, ["---"] * len(header)] + rows
+    return "\n".join(table_row(line) for line in lines)
+
+
+def table_blocks(
+    name: str,
+    rows: Iterable[Iterable],
+    max_tokens: int = TABLE_MAX_TOKENS,
+) -> Iterator[str]:
+    """Split the rows of a table into markdown tables of a few rows each.
+
+    The first row with values is the header. It is repeated in every table,
+    and each table is headed by the row range it covers, so every chunk can
+    be understood on its own.
+
+    Args:
+    name (str): The name of the sheet.
+    rows (Iterable): The values of each row, read lazily.
+    max_tokens (int): The most tokens in one table, heading included.
+
+    Returns:
+    Iterator[str]: The markdown of each range of rows.
+    """
+    header: Optional[list[str]] = None
+    block: list[list[str]] = []
+    first, last, tokens, header_tokens = 0, 0, 0, 0
+
+    def flush() -> str:
+        table = markdown_table(header, block)
+        return f"## {name} (rows {first}-{last})\n\n{table}\n\n"
+
+    for number, row in enumerate(rows, start=1):
+        cells = clean_cells(row)
+        if not cells:
+            continue
+        if header is None:
+            header = cells
+            # The heading, header and separator lines repeated in every table
+            header_tokens = count_tokens(f"## {name} (rows 0-0)") + count_tokens(
+                markdown_table(header, []),
+            )
+            continue
+
+        row_tokens = count_tokens(table_row(cells))
+        if block and tokens + row_tokens > max_tokens:
+            yield flush()
+            block = []
+        if not block:
+            first, tokens = number, header_tokens
+        block.append(cells)
+        last, tokens = number, tokens + row_tokens
+
+    if block:
+        yield flush()
+
+
+def spreadsheet_blocks(path: str) -> Iterator[str]:
+    """Extract every sheet of a workbook as markdown tables.
+
+    XLSX workbooks are streamed in read-only mode. Legacy XLS workbooks,
+    served with the same content type, load one sheet at a time.
+
+    Args:
+    path (str): The path of the workbook.
+
+    Returns:
+    Iterator[str]: The markdown of each range of rows.
+    """
+    if not zipfile.is_zipfile(path):
+        book = xlrd.open_workbook(path, on_demand=True)
+        try:
+            for name in book.sheet_names():
+                sheet = book.sheet_by_name(name)
+                yield from table_blocks(
+                    name,
+                    ([cell.value for cell in row] for row in sheet.get_rows()),
+                )
+                book.unload_sheet(name)
+        finally:
+            book.release_resources()
+        return
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            # The recorded dimensions can be wrong, read every row instead
+            sheet.reset_dimensions()
+            yield from table_blocks(sheet.title, sheet.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def csv_blocks(path: str) -> Iterator[str]:
+    """Extract a CSV file as markdown tables.
+
+    Args:
+    path (str): The path of the CSV file.
+
+    Returns:
+    Iterator[str]: The markdown of each range of rows.
+    """
+    with open(path, encoding="utf-8-sig", errors="replace", newline="") as f:
+        yield from table_blocks(os.path.basename(path), csv.reader(f))
+
+
+def pptx_slides(path: str) -> Iterator[str]:
+    """Extract the text, tables and notes of a presentation one slide at a time.
+
+    Args:
+    path (str): The path of the presentation.
+
+    Returns:
+    Iterator[str]: The markdown of each slide with text.
+    """
+    presentation = pptx.Presentation(path)
+    for number, slide in enumerate(presentation.slides, start=1):
+        parts = []
+        for shape in slide.shapes:
+            if shape.has_text_frame:
+                text = shape.text_frame.text.strip()
+                if text:
+                    parts.append(text)
+            elif shape.has_table:
+                rows = [
+                    clean_cells(cell.text for cell in row.cells)
+                    for row in shape.table.rows
+                ]
+                rows = [row for row in rows if row]
+                if rows:
+                    parts.append(markdown_table(rows[0], rows[1:]))
+
+        if slide.has_notes_slide:
+            notes = slide.notes_slide.notes_text_frame.text.strip()
+            if notes:
+                parts.append(f"Notes: {notes}")
+
+        if parts:
+            yield f"## Slide {number}\n\n" + "\n\n".join(parts) + "\n\n"
+
+
+def pdf_pages(path: str) -> Iterator[str]:
+    """Extract the text of a PDF one page at a time.
+
+    Args:
+    path (str): The path of the PDF.
+
+    Returns:
+    Iterator[str]: The markdown text of each page with text.
+    """
+    reader = pypdf.PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        text = (page.extract_text() or "").strip()
+        if text:
+            yield f"## Page {number}\n\n{text}\n\n"
+
+
+def docx_blocks(path: str) -> Iterator[str]:
+    """Extract the paragraphs and tables of a Word document in order.
+
+    Args:
+    path (str): The path of the Word document.
+
+    Returns:
+    Iterator[str]: The markdown text of each paragraph and table.
+    """
+    document = docx.Document(path)
+    for block in document.iter_inner_content():
+        if isinstance(block, Table):
+            rows = [clean_cells(cell.text for cell in row.cells) for row in block.rows]
+            rows = [row for row in rows if row]
+            if rows:
+                yield markdown_table(rows[0], rows[1:]) + "\n\n"
+            continue
+
+        text = block.text.strip()
+        if not text:
+            continue
+        style = block.style.name if block.style is not None else ""
+        if style.startswith("Heading"):
+            level = style.removeprefix("Heading").strip()
+            level = int(level) if level.isdigit() else 1
+            text = "#" * min(level + 1, 6) + " " + text
+        elif style == "Title":
+            text = "# " + text
+        yield text + "\n\n"
+
+
+EXTRACTORS = {
+    FileType.PDF: pdf_pages,
+    FileType.DOCX: docx_blocks,
+    FileType.XLSX: spreadsheet_blocks,
+    FileType.CSV: csv_blocks,
+    FileType.PPTX: pptx_slides,
+}
+
+
+def convert_document(path: str, source: Optional[str] = None) -> str:
+    """Convert a document to a markdown file next to it.
+
+    The markdown is written to a temporary file which is moved into place
+    once complete, so a failed conversion never leaves a partial file.
+    Documents without text, such as scanned PDFs, only get the metadata
+    header, so they are not converted again until they change.
+
+    Args:
+    path (str): The path of the document.
+    source (str): The URL the document was downloaded from, if known.
+
+    Returns:
+    str: The path of the markdown file.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in DOCUMENT_TYPES:
+        raise ValueError(f"Unsupported document: {path}")
+    file_type = DOCUMENT_TYPES[extension]
+    blocks = EXTRACTORS[file_type](path)
+
+    output_path = markdown_path(path)
+    part_path = f"{output_path}.part"
+    try:
+        with open(part_path, "w", encoding="utf-8") as f:
+            f.write(
+                Metadata(
+                    title=os.path.basename(path),
+                    source=source or path,
+                    file_type=file_type,
+                    retrieved_date=datetime.date.fromtimestamp(
+                        os.path.getmtime(path),
+                    ).strftime("%Y-%m-%d"),
+                ).to_markdown(),
+            )
+            for block in blocks:
+                f.write(block)
+    except BaseException:
+        os.remove(part_path)
+        raise
+
+    os.replace(part_path, output_path)
+    return output_path
+
+
+def read_metadata(path: str) -> dict[str, str]:
+    """Read the metadata header of a markdown file, without reading all its text."""
+    metadata: dict[str, str] = {}
+    with open(path, encoding="utf-8", errors="replace") as f:
+        # The header is parsed by the time the first block is read
+        next(read_blocks(f, metadata), None)
+    return metadata
+
+
+def is_converted(path: str) -> bool:
+    """Check whether a markdown file was converted from a document.
+
+    Scraped web pages can end with a document extension too, such as a
+    data.csv URL served as HTML, so the file type of the header is checked.
+    """
+    file_type = read_metadata(path).get("file_type")
+    return file_type in {str(value) for value in DOCUMENT_TYPES.values()}
+
+
+def source_of(path: str, sources: dict[str, str]) -> Optional[str]:
+    """Find the URL a document was downloaded from, if known.
+
+    Args:
+    path (str): The path of the document.
+    sources (dict): Known URLs by normalized path.
+
+    Returns:
+    str: The URL from sources or from the header of the previous conversion.
+    """
+    source = sources.get(os.path.normpath(path))
+    if source is None and os.path.exists(markdown_path(path)):
+        source = read_metadata(markdown_path(path)).get("source")
+    return source if source and source.startswith("http") else None
+
+
+def is_stale(path: str) -> bool:
+    """Check whether a document changed since it was last converted."""
+    output_path = markdown_path(path)
+    return not os.path.exists(output_path) or os.path.getmtime(
+        output_path,
+    ) < os.path.getmtime(path)
+
+
+class DocumentExtractor:
+    """Converts documents to markdown on a pool of processes."""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """Initialize the DocumentExtractor class.
+
+        Args:
+            max_workers (int): The number of processes, by default one per core.
+        """
+        # Spawned rather than forked, the callers hold locks in other threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def submit(self, path: str, source: Optional[str] = None) -> Future:
+        """Queue a document, returning a future for its markdown path."""
+        return self._executor.submit(convert_document, path, source)
+
+    def extract_directory(
+        self,
+        directory: str,
+        sources: Optional[dict[str, str]] = None,
+    ) -> Iterator[str]:
+        """Convert the new and changed documents of a directory.
+
+        Markdown converted from documents which were removed is deleted.
+        Documents keep the URL of their previous conversion when it is not
+        in sources.
+
+        Args:
+            directory (str): The directory to convert.
+            sources (dict): Optional URLs the documents were downloaded from,
+                by normalized path.
+
+        Returns:
+            Iterator[str]: The markdown paths, in the order they complete.
+        """
+        futures = []
+        for root, _, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if name.lower().endswith(tuple(DOCUMENT_TYPES)):
+                    if is_stale(path):
+                        futures.append(
+                            self.submit(path, source=source_of(path, sources or {})),
+                        )
+                    continue
+
+                document = path.removesuffix(MARKDOWN_EXTENSION)
+                if (
+                    document != path
+                    and document.lower().endswith(tuple(DOCUMENT_TYPES))
+                    and not os.path.exists(document)
+                    and is_converted(path)
+                ):
+                    os.remove(path)
+
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                print(f"Failed to convert document: {e}")
+
+    def close(self):
+        """Stop the worker processes."""
+        self._executor.shutdown(wait=True)
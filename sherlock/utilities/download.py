@@ -0,0 +1,77 @@
+"""Streaming download helpers.
+
+Responses are fetched with stream=True so the headers can be inspected
+before any of the body is read, and bodies are consumed in chunks with
+a hard limit on their size."""
+
+from collections.abc import Iterator
+from typing import Any
+
+import requests
+
+
+# Size of each chunk read from the network
+CHUNK_SIZE = 64 * 1024
+
+# Default limit for a single response body
+MAX_BODY_SIZE = 50 * 1024 * 1024
+
+
+class BodyTooLargeError(ValueError):
+    """Raised when a response body is larger than the allowed size."""
+
+
+def check_length(response: requests.Response, max_bytes: int):
+    """Reject a response up front when its declared length is too large.
+
+    Args:
+    response (requests.Response): The streamed response.
+    max_bytes (int): The maximum allowed body size.
+    """
+    length = response.headers.get("content-length", "")
+    if length.isdigit() and int(length) > max_bytes:
+        raise BodyTooLargeError(
+            f"Body of {response.url} is {length} bytes (limit: {max_bytes}).",
+        )
+
+
+def iter_body(
+    response: requests.Response,
+    max_bytes: int,
+    hasher: Any = None,
+) -> Iterator[bytes]:
+    """Iterate over the body of a streamed response in chunks.
+
+    Args:
+    response (requests.Response): The streamed response.
+    max_bytes (int): The maximum allowed body size.
+    hasher (object): Optional hashlib object updated with every chunk.
+
+    Returns:
+    Iterator[bytes]: The chunks of the body.
+    """
+    check_length(response=response, max_bytes=max_bytes)
+
+    total = 0
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        total += len(chunk)
+        if total > max_bytes:
+            raise BodyTooLargeError(
+                f"Body of {response.url} exceeds {max_bytes} bytes.",
+            )
+        if hasher is not None:
+            hasher.update(chunk)
+        yield chunk
+
+
+def read_body(response: requests.Response, max_bytes: int) -> bytes:
+    """Read the whole body of a streamed response into memory.
+
+    Args:
+    response (requests.Response): The streamed response.
+    max_bytes (int): The maximum allowed body size.
+
+    Returns:
+    bytes: The body of the response.
+    """
+    return b"".join(iter_body(response=response, max_bytes=max_bytes))
@@ -0,0 +1,197 @@
+"""Persistent cache of embeddings keyed by model and content hash.
+
+Vectors are stored as packed float32 (or float16) blobs in SQLite, and
+the least recently used entries are evicted once the cache grows past
+its size limit."""
+
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import time
+from typing import Optional
+
+
+CACHE_PATH = "embedding_cache"
+
+# struct format characters for the supported storage types
+DTYPES = {"float32": "f", "float16": "e"}
+
+
+def text_hash(text: str) -> str:
+    """Hash a text to the key used by the cache."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk embedding cache with size based LRU eviction."""
+
+    def __init__(
+        self,
+        path: str = f"{CACHE_PATH}{os.sep}embeddings.sqlite",
+        max_bytes: int = 512 * 1024 * 1024,
+        dtype: str = "float32",
+    ):
+        """Initialize the EmbeddingCache class.
+
+        Args:
+            path (str): The SQLite file holding the cache.
+            max_bytes (int): The size of stored vectors before eviction starts.
+            dtype (str): Store vectors as "float32" or the smaller "float16".
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Invalid dtype: {dtype}")
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.dtype = dtype
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                dtype TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, hash)
+            )
+            """,
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)",
+        )
+        self._connection.commit()
+        self._size = self._connection.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings",
+        ).fetchone()[0]
+
+    @property
+    def hit_rate(self) -> float:
+        """The share of lookups answered by the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict[str, float]:
+        """Get the hits, misses and hit rate of the lookups so far."""
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate}
+
+    def _pack(self, embedding: list[float]) -> bytes:
+        """Pack an embedding into a blob."""
+        return struct.pack(f"<{len(embedding)}{DTYPES[self.dtype]}", *embedding)
+
+    @staticmethod
+    def _unpack(dtype: str, vector: bytes) -> list[float]:
+        """Unpack a blob into an embedding."""
+        fmt = DTYPES[dtype]
+        return list(
+            struct.unpack(f"<{len(vector) // struct.calcsize(fmt)}{fmt}", vector),
+        )
+
+    def get_many(self, model: str, texts: list[str]) -> list[Optional[list[float]]]:
+        """Look up the embeddings of many texts.
+
+        Args:
+            model (str): The embedding model.
+            texts (list[str]): The texts to look up.
+
+        Returns:
+            list: The embedding of each text, or None where it is not cached.
+        """
+        hashes = [text_hash(text) for text in texts]
+        found: dict[str, list[float]] = {}
+
+        with self._lock:
+            # Stay well below the SQLite limit on query parameters
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:][:500]
+                rows = self._connection.execute(
+                    "SELECT hash, dtype, vector FROM embeddings WHERE model = ? "
+                    f"AND hash IN ({', '.join('?' * len(chunk))})",
+                    (model, *chunk),
+                ).fetchall()
+                for key, dtype, vector in rows:
+                    found[key] = EmbeddingCache._unpack(dtype, vector)
+
+            if found:
+                now = time.time()
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(now, model, key) for key in found],
+                )
+                self._connection.commit()
+
+            results = [found.get(key) for key in hashes]
+            self.hits += sum(result is not None for result in results)
+            self.misses += sum(result is None for result in results)
+
+        return results
+
+    def get(self, model: str, text: str) -> Optional[list[float]]:
+        """Look up the embedding of a text, or None if it is not cached."""
+        return self.get_many(model=model, texts=[text])[0]
+
+    def put_many(self, model: str, texts: list[str], embeddings: list[list[float]]):
+        """Store the embeddings of many texts, evicting old entries if needed.
+
+        Args:
+            model (str): The embedding model.
+            texts (list[str]): The texts which were embedded.
+            embeddings (list[list[float]]): The embedding of each text.
+        """
+        now = time.time()
+        rows = [
+            (model, text_hash(text), self.dtype, self._pack(embedding), now)
+            for text, embedding in zip(texts, embeddings)
+            if len(embedding) > 0
+        ]
+        if not rows:
+            return
+
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._size += sum(len(row[3]) for row in rows)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._connection.commit()
+
+    def put(self, model: str, text: str, embedding: list[float]):
+        """Store the embedding of a text."""
+        self.put_many(model=model, texts=[text], embeddings=[embedding])
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is below 90% of its limit."""
+        target = int(self.max_bytes * 0.9)
+        rows = self._connection.execute(
+            "SELECT model, hash, LENGTH(vector) FROM embeddings ORDER BY last_used, rowid",
+        )
+
+        evicted = []
+        for model, key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((model, key))
+            self._size -= size
+
+        self._connection.executemany(
+            "DELETE FROM embeddings WHERE model = ? AND hash = ?",
+            evicted,
+        )
+
+    def close(self):
+        """Close the underlying database."""
+        with self._lock:
+            self._connection.close()
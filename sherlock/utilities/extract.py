@@ -0,0 +1,204 @@
+"""Single pass extraction of markdown text and links from HTML pages.
+
+The page is walked once: text inside the main content is written out as
+markdown while every link on the page is collected for the crawler, and
+boilerplate such as navigation, footers and scripts is left out of the
+text."""
+
+from typing import Optional
+
+from bs4 import BeautifulSoup
+from bs4 import NavigableString
+from bs4 import Tag
+from bs4.element import PreformattedString
+
+
+# Tags which are never walked, they hold no text or links worth keeping
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "canvas", "head"}
+
+# Tags whose links are kept but whose text is boilerplate
+BOILERPLATE_TAGS = {"nav", "aside", "form", "button", "select"}
+
+# Site headers and footers are boilerplate, but inside the content they hold
+# its title or byline, such as <article><header><h1>
+PAGE_BOILERPLATE_TAGS = {"header", "footer"}
+
+CONTENT_TAGS = {"article", "main"}
+
+# Tags which start a new line of text
+BLOCK_TAGS = {
+    "address",
+    "article",
+    "blockquote",
+    "br",
+    "caption",
+    "dd",
+    "div",
+    "dl",
+    "dt",
+    "fieldset",
+    "figcaption",
+    "figure",
+    "hr",
+    "main",
+    "ol",
+    "p",
+    "section",
+    "table",
+    "tbody",
+    "thead",
+    "tfoot",
+    "ul",
+}
+
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+
+
+class MarkdownWriter:
+    """Collects inline text and writes it out as lines of markdown."""
+
+    def __init__(self):
+        """Initialize the MarkdownWriter class."""
+        self.lines: list[str] = []
+        self.links: list[str] = []
+        self.inline: list[str] = []
+        self.prefix = ""
+        self.lists: list[Optional[int]] = []
+
+    def flush(self):
+        """Write the pending inline text as a line, if it is not blank."""
+        text = " ".join("".join(self.inline).split())
+        if text:
+            self.lines.append(self.prefix + text)
+            self.prefix = ""
+        self.inline = []
+
+    def walk(self, node: Tag, emit: bool, main: Optional[Tag]):
+        """Walk the children of a node.
+
+        Args:
+        node (Tag): The node to walk.
+        emit (bool): Whether text found under the node is written out.
+        main (Tag): The main content of the page, if it has one.
+        """
+        for child in node.children:
+            if isinstance(child, NavigableString):
+                if emit and not isinstance(child, PreformattedString):
+                    self.inline.append(child)
+                continue
+
+            name = child.name
+            if name in SKIPPED_TAGS:
+                continue
+
+            if name == "a":
+                href = child.get("href")
+                if href:
+                    self.links.append(href)
+
+            child_emit = (emit or child is main) and name not in BOILERPLATE_TAGS
+            if child_emit and name in PAGE_BOILERPLATE_TAGS:
+                child_emit = in_content(child, main=main)
+
+            if not child_emit:
+                self.walk(child, emit=False, main=main)
+            elif name in HEADING_TAGS:
+                self.flush()
+                self.prefix = "#" * HEADING_TAGS[name] + " "
+                self.walk(child, emit=True, main=main)
+                self.flush()
+            elif name == "li":
+                self.write_list_item(child, main=main)
+            elif name == "pre":
+                self.write_preformatted(child)
+            elif name == "tr":
+                self.write_table_row(child, main=main)
+            elif name in ["ul", "ol"]:
+                self.flush()
+                self.lists.append(0 if name == "ol" else None)
+                self.walk(child, emit=True, main=main)
+                self.lists.pop()
+                self.flush()
+            elif name in BLOCK_TAGS:
+                self.flush()
+                self.walk(child, emit=True, main=main)
+                self.flush()
+            else:
+                self.walk(child, emit=True, main=main)
+
+    def write_list_item(self, item: Tag, main: Optional[Tag]):
+        """Write a list item, indented by how deeply its list is nested."""
+        self.flush()
+
+        indent = "  " * max(len(self.lists) - 1, 0)
+        if self.lists and self.lists[-1] is not None:
+            self.lists[-1] += 1
+            self.prefix = f"{indent}{self.lists[-1]}. "
+        else:
+            self.prefix = f"{indent}* "
+
+        self.walk(item, emit=True, main=main)
+        self.flush()
+
+    def write_preformatted(self, pre: Tag):
+        """Write preformatted text verbatim inside a code fence."""
+        self.flush()
+        text = pre.get_text().strip("\n")
+        if text.strip():
+            self.lines.append("```")
+            self.lines.extend(line for line in text.split("\n") if line.strip())
+            self.lines.append("```")
+        self.links.extend(a["href"] for a in pre.find_all("a", href=True))
+
+    def write_table_row(self, row: Tag, main: Optional[Tag]):
+        """Write a table row as a line of cells separated by pipes."""
+        self.flush()
+        first = True
+        for cell in row.children:
+            if not isinstance(cell, Tag):
+                continue
+            if not first:
+                self.inline.append(" | ")
+            first = False
+            self.walk(cell, emit=True, main=main)
+
+        if self.inline:
+            self.prefix = "| "
+            self.inline.append(" |")
+        self.flush()
+
+
+def in_content(tag: Tag, main: Optional[Tag]) -> bool:
+    """Check whether a tag is inside an article or the main content."""
+    return any(parent is main or parent.name in CONTENT_TAGS for parent in tag.parents)
+
+
+def find_main(page: BeautifulSoup) -> Optional[Tag]:
+    """Find the element holding the main content of a page.
+
+    Args:
+    page (BeautifulSoup): The parsed page.
+
+    Returns:
+    Tag: The main element, or None to use the whole body.
+    """
+    return page.find(
+        lambda tag: tag.name == "main" or tag.get("role") == "main",
+    )
+
+
+def extract_page(page: BeautifulSoup) -> tuple[str, list[str]]:
+    """Extract the markdown text and links of a page in one pass.
+
+    Args:
+    page (BeautifulSoup): The parsed page.
+
+    Returns:
+    tuple: The markdown text without blank lines, and every href on the page.
+    """
+    writer = MarkdownWriter()
+    main = find_main(page)
+    writer.walk(page, emit=main is None, main=main)
+    writer.flush()
+
+    return "\n".join(writer.lines), writer.links
@@ -23,6 +23,16 @@ class FileType(Enum):
         return self.value
 
 
+# Types downloaded as they are and converted to markdown before ingestion
+DOCUMENT_FILE_TYPES = [
+    FileType.PDF,
+    FileType.DOCX,
+    FileType.XLSX,
+    FileType.CSV,
+    FileType.PPTX,
+]
+
+
 def print_from_stream(
     stream: Union[Iterator[Mapping[str, Any]], list[Mapping[str, Any]]],
     key: Optional[str] = None,
@@ -40,3 +50,51 @@ def print_from_stream(
             result += message
 
     return result
+
+
+def get_file_type(content_type: str) -> FileType:
+    """Get the file type from the content-type header of a response.
+
+    Args:
+    content_type (str): The content-type header.
+
+    Returns:
+    FileType: The matching file type, or Unsupported.
+    """
+    # HTML parsing
+    if "text/html" in content_type:
+        return FileType.HTML
+
+    # PDF parsing
+    elif "application/pdf" in content_type:
+        return FileType.PDF
+
+    # Word Document parsing
+    elif (
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        in content_type
+    ):
+        return FileType.DOCX
+
+    # Excel Document parsing
+    elif (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        in content_type
+        or "application/vnd.ms-excel" in content_type
+    ):
+        return FileType.XLSX
+
+    # CSV Document parsing
+    elif "text/csv" in content_type:
+        return FileType.CSV
+
+    # PowerPoint Document parsing
+    elif (
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+        in content_type
+    ):
+        return FileType.PPTX
+
+    # Unsupported
+    else:
+        return FileType.Unsupported
@@ -0,0 +1,264 @@
+"""Incremental ingestion of the scraped documents in web_docs.
+
+A manifest records the path, size, mtime and content hash of every file
+ingested. A scan only embeds files which are new or whose content
+changed, replaces the vectors of changed files and deletes the vectors
+of removed ones. Scans can be repeated in a loop to watch the directory.
+With a document extractor, PDF and Word documents are converted to
+markdown first and ingested like any other page, under the URL the crawl
+manifests recorded for them.
+
+The manifest lives next to the persistent vector store. With an in-memory
+store it is kept in memory too, since it must never outlive the vectors
+it describes."""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+from pydantic import BaseModel
+
+from sherlock.utilities.chunker import chunk_file
+from sherlock.utilities.crawl_state import read_sources
+from sherlock.utilities.documents import DocumentExtractor
+from sherlock.utilities.query_service import QueryService
+
+
+MANIFEST_NAME = "ingest_manifest.sqlite"
+
+INGEST_EXTENSIONS = (".md", ".txt")
+
+
+def file_hash(path: str) -> str:
+    """Hash a file without reading it into memory at once."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+class IngestSummary(BaseModel):
+    """What a scan changed."""
+
+    added: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    chunks: int = 0
+
+
+class IncrementalIngester:
+    """Keeps a collection of vectors in sync with the files of a directory."""
+
+    def __init__(
+        self,
+        service: QueryService,
+        directory: str = "web_docs",
+        collection_name: Optional[str] = None,
+        manifest_path: Optional[str] = None,
+        extractor: Optional[DocumentExtractor] = None,
+    ):
+        """Initialize the IncrementalIngester class.
+
+        Args:
+            service (QueryService): The service embedding the files.
+            directory (str): The directory to ingest.
+            collection_name (str): The collection to use, or None to use the
+                top level folder of each file, as written by the scraper.
+            manifest_path (str): Where to keep the manifest, by default next
+                to the persistent vector store, or in memory without one.
+            extractor (DocumentExtractor): Optional extractor converting the
+                PDF and Word documents before each scan.
+        """
+        if manifest_path is None:
+            persist_directory = service.ollama.persist_directory
+            manifest_path = (
+                os.path.join(persist_directory, MANIFEST_NAME)
+                if persist_directory
+                else ":memory:"
+            )
+        if manifest_path != ":memory:":
+            os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+
+        self.service = service
+        self.directory = directory
+        self.collection_name = collection_name
+        self.extractor = extractor
+
+        # Files are ingested one at a time, from scans or as they are written
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(manifest_path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                hash TEXT NOT NULL,
+                collection TEXT NOT NULL,
+                chunks INTEGER NOT NULL
+            )
+            """,
+        )
+        self._connection.commit()
+
+    def collection_of(self, path: str) -> str:
+        """Get the collection a file belongs to."""
+        if self.collection_name:
+            return self.collection_name
+        relative = os.path.relpath(path, self.directory)
+        return relative.split(os.sep, 1)[0]
+
+    def contains(self, path: str) -> bool:
+        """Check whether a path is inside the ingested directory."""
+        return not os.path.relpath(path, self.directory).startswith(os.pardir)
+
+    def files(self) -> dict[str, os.stat_result]:
+        """List the files to ingest with their stats."""
+        files = {}
+        for root, _, names in os.walk(self.directory):
+            for name in sorted(names):
+                if name.endswith(INGEST_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    try:
+                        files[path] = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+        return files
+
+    def scan(self) -> IngestSummary:
+        """Bring the vector store in line with the directory once.
+
+        Returns:
+            IngestSummary: The number of files added, changed, unchanged and removed.
+        """
+        summary = IngestSummary()
+
+        if self.extractor is not None:
+            for _ in self.extractor.extract_directory(
+                self.directory,
+                sources=read_sources(),
+            ):
+                pass
+
+        with self._lock:
+            # The manifest can be shared with ingesters of other directories
+            known = {
+                row[0]: row[1:]
+                for row in self._connection.execute(
+                    "SELECT path, size, mtime, hash FROM files",
+                )
+                if self.contains(row[0])
+            }
+            files = self.files()
+
+            for path, stat in files.items():
+                self._ingest(path, stat, known.get(path), summary)
+
+            for path in known.keys() - files.keys():
+                self.service.remove_document(path)
+                self._connection.execute("DELETE FROM files WHERE path = ?", (path,))
+                self._connection.commit()
+                summary.removed += 1
+
+        if summary.added or summary.changed or summary.removed:
+            print(
+                "Ingested {added} new and {changed} changed files ({chunks} chunks), "
+                "removed {removed}, {unchanged} unchanged.".format(
+                    **summary.model_dump(),
+                ),
+            )
+
+        return summary
+
+    def ingest_file(self, path: str) -> IngestSummary:
+        """Ingest a single file, such as a page as soon as it is written.
+
+        Args:
+            path (str): The file to ingest.
+
+        Returns:
+            IngestSummary: Whether the file was added, changed or unchanged.
+        """
+        summary = IngestSummary()
+        with self._lock:
+            previous = self._connection.execute(
+                "SELECT size, mtime, hash FROM files WHERE path = ?",
+                (path,),
+            ).fetchone()
+            self._ingest(path, os.stat(path), previous, summary)
+        return summary
+
+    def _ingest(
+        self,
+        path: str,
+        stat: os.stat_result,
+        previous: Optional[tuple[int, float, str]],
+        summary: IngestSummary,
+    ):
+        """Embed a new or changed file, replacing the vectors of its last version.
+
+        Args:
+            path (str): The file to ingest.
+            stat (os.stat_result): The stats of the file.
+            previous (tuple): The recorded size, mtime and hash, if any.
+            summary (IngestSummary): Counts the file.
+        """
+        # Same size and mtime, the content is assumed unchanged
+        if previous is not None and previous[:2] == (stat.st_size, stat.st_mtime):
+            summary.unchanged += 1
+            return
+
+        digest = file_hash(path)
+        if previous is not None and previous[2] == digest:
+            self._connection.execute(
+                "UPDATE files SET size = ?, mtime = ? WHERE path = ?",
+                (stat.st_size, stat.st_mtime, path),
+            )
+            self._connection.commit()
+            summary.unchanged += 1
+            return
+
+        if previous is not None:
+            self.service.remove_document(path)
+            summary.changed += 1
+        else:
+            summary.added += 1
+
+        collection = self.collection_of(path)
+        chunks = self.service.add_chunks(
+            chunk_file(
+                path,
+                max_tokens=self.service.max_tokens,
+                overlap_tokens=self.service.overlap_tokens,
+            ),
+            collection_name=collection,
+        )
+        summary.chunks += chunks
+
+        # Recorded once embedded, so an interrupted scan retries the file
+        self._connection.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime, digest, collection, chunks),
+        )
+        self._connection.commit()
+
+    def watch(self, interval: float = 2.0, stop: Optional[threading.Event] = None):
+        """Scan the directory every interval seconds until stopped.
+
+        Args:
+            interval (float): Seconds between scans.
+            stop (threading.Event): Optional event which ends the watch.
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            self.scan()
+            stop.wait(interval)
+
+    def close(self):
+        """Close the manifest."""
+        with self._lock:
+            self._connection.close()
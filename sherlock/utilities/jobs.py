@@ -0,0 +1,323 @@
+"""Background crawl-and-ingest jobs.
+
+Each job crawls a site with the Scraper on a bounded pool of workers and
+streams every page into the ingestion pipeline as soon as it is written.
+Pages pass through a bounded queue, so a crawl which outpaces embedding
+slows down instead of buffering the whole site. PDF and Word documents
+are converted to markdown on a pool of processes on the way.
+
+Pages are ingested through the incremental ingester of their collection,
+so the vectors of a changed page replace its previous ones, and the
+vectors of pages the crawl removed are deleted once it is over."""
+
+import queue
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+from sherlock.utilities.browser import RenderMode
+from sherlock.utilities.documents import DOCUMENT_TYPES
+from sherlock.utilities.documents import DocumentExtractor
+from sherlock.utilities.ingester import INGEST_EXTENSIONS
+from sherlock.utilities.ingester import IncrementalIngester
+from sherlock.utilities.query_service import QueryService
+from sherlock.utilities.scraper import Scraper
+from sherlock.utilities.writer import get_collection_path
+
+
+class JobStatus(str, Enum):
+    """Lifecycle of a crawl job."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+# Statuses a job never leaves
+ENDED_STATUSES = [JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED]
+
+
+class CrawlRequest(BaseModel):
+    """What to crawl and which collection to ingest it into."""
+
+    source_url: str
+    collection_name: str
+    max_depth: int = 1
+    ignore_values: list[str] = []
+    incremental: bool = False
+    render_mode: RenderMode = RenderMode.AUTO
+
+
+class JobProgress(BaseModel):
+    """Snapshot of the progress of a crawl job."""
+
+    job_id: str
+    status: JobStatus
+    source_url: str
+    collection_name: str
+    pages: int = 0
+    characters: int = 0
+    queued_pages: int = 0
+    embed_queue: int = 0
+    pages_ingested: int = 0
+    chunks: int = 0
+    elapsed: float = 0.0
+    eta: Optional[float] = None
+    error: Optional[str] = None
+
+
+class CrawlJob:
+    """A crawl whose pages are ingested while the crawl runs."""
+
+    def __init__(
+        self,
+        request: CrawlRequest,
+        service: QueryService,
+        max_pending_pages: int = 256,
+        extractor: Optional[DocumentExtractor] = None,
+        ingester: Optional[IncrementalIngester] = None,
+    ):
+        """Initialize the CrawlJob class.
+
+        Args:
+            request (CrawlRequest): What to crawl.
+            service (QueryService): The service ingesting the pages.
+            max_pending_pages (int): The most written pages waiting to be embedded.
+            extractor (DocumentExtractor): Optional extractor converting the
+                PDF and Word documents, which are skipped without one.
+            ingester (IncrementalIngester): The ingester of the collection
+                directory, by default a new one.
+        """
+        self.job_id = uuid.uuid4().hex
+        self.request = request
+        self.service = service
+        self.extractor = extractor
+        self.ingester = ingester or IncrementalIngester(
+            service=service,
+            directory=get_collection_path(request.collection_name),
+            collection_name=request.collection_name,
+            extractor=extractor,
+        )
+        self.status = JobStatus.QUEUED
+        self.error: Optional[str] = None
+
+        self.scraper: Optional[Scraper] = None
+        self.pages_ingested = 0
+        self.chunks = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._cancelled = threading.Event()
+
+        # Documents are queued with the future of their conversion
+        self._pages: queue.Queue[Optional[tuple[str, Optional[Future]]]] = queue.Queue(
+            maxsize=max_pending_pages,
+        )
+
+    def page_written(self, url: str, output_path: str):
+        """Queue a written page for ingestion, waiting if the queue is full.
+
+        Documents start converting right away, so several convert at once
+        while the pages ahead of them are embedded.
+        """
+        if self.extractor is not None and output_path.lower().endswith(
+            tuple(DOCUMENT_TYPES),
+        ):
+            self._pages.put(
+                (output_path, self.extractor.submit(output_path, source=url)),
+            )
+        else:
+            self._pages.put((output_path, None))
+
+    def ingest(self):
+        """Chunk and embed written pages until the crawl is over.
+
+        A page which fails to ingest is reported and skipped, so the crawl
+        never blocks on a queue nobody drains. Once the crawl is over, the
+        collection directory is scanned to delete the vectors of the pages
+        it removed.
+        """
+        while True:
+            page = self._pages.get()
+            if page is None:
+                break
+            output_path, conversion = page
+            try:
+                if conversion is not None:
+                    output_path = conversion.result()
+                if output_path.endswith(INGEST_EXTENSIONS):
+                    self.chunks += self.ingester.ingest_file(output_path).chunks
+            except Exception as e:
+                print(f"Failed to ingest {output_path}: {e}")
+                self.error = f"Failed to ingest {output_path}: {e}"
+            self.pages_ingested += 1
+
+        try:
+            self.chunks += self.ingester.scan().chunks
+        except Exception as e:
+            print(f"Failed to ingest {self.ingester.directory}: {e}")
+            self.error = f"Failed to ingest {self.ingester.directory}: {e}"
+
+    def cancel(self):
+        """Stop the crawl, the pages already written are still ingested.
+
+        The crawl is left unfinished, so its pages are not removed and an
+        incremental job can pick it up again.
+        """
+        self._cancelled.set()
+        if self.scraper is not None:
+            self.scraper.stop()
+
+    def run(self):
+        """Crawl the site and ingest its pages."""
+        if self._cancelled.is_set():
+            self.status = JobStatus.CANCELLED
+            return
+
+        self.status = JobStatus.RUNNING
+        self.started = time.time()
+        ingester = threading.Thread(target=self.ingest, daemon=True)
+        ingester.start()
+
+        try:
+            self.scraper = Scraper(
+                source_url=self.request.source_url,
+                collection_name=self.request.collection_name,
+                max_depth=self.request.max_depth,
+                ignore_values=self.request.ignore_values,
+                incremental=self.request.incremental,
+                render_mode=self.request.render_mode,
+                on_page=self.page_written,
+            )
+            # Cancelled while the scraper was being created
+            if self._cancelled.is_set():
+                self.scraper.stop()
+            self.scraper.start()
+            status = (
+                JobStatus.CANCELLED if self._cancelled.is_set() else JobStatus.COMPLETED
+            )
+        except Exception as e:
+            self.error = str(e)
+            status = JobStatus.FAILED
+        finally:
+            self._pages.put(None)
+            ingester.join()
+            self.finished = time.time()
+
+        # Only done once the last page is embedded
+        self.status = status
+
+    def progress(self) -> JobProgress:
+        """Get a snapshot of the progress of the job.
+
+        The ETA assumes the pages still queued in the crawl and waiting to
+        be embedded are ingested at the rate seen so far.
+        """
+        queued_pages = self.scraper.queued if self.scraper is not None else 0
+        embed_queue = self._pages.qsize()
+        elapsed = (
+            ((self.finished or time.time()) - self.started) if self.started else 0.0
+        )
+
+        eta = None
+        if self.status in ENDED_STATUSES:
+            eta = 0.0
+        elif self.pages_ingested and elapsed:
+            eta = (queued_pages + embed_queue) / (self.pages_ingested / elapsed)
+
+        return JobProgress(
+            job_id=self.job_id,
+            status=self.status,
+            source_url=self.request.source_url,
+            collection_name=self.request.collection_name,
+            pages=self.scraper.pages if self.scraper is not None else 0,
+            characters=self.scraper.characters if self.scraper is not None else 0,
+            queued_pages=queued_pages,
+            embed_queue=embed_queue,
+            pages_ingested=self.pages_ingested,
+            chunks=self.chunks,
+            elapsed=elapsed,
+            eta=eta,
+            error=self.error,
+        )
+
+
+class JobManager:
+    """Runs crawl jobs on a bounded pool of background workers."""
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        service_factory: Callable[[], QueryService] = QueryService,
+        extractor: Optional[DocumentExtractor] = None,
+    ):
+        """Initialize the JobManager class.
+
+        Args:
+            max_workers (int): The most crawls running at once, others wait.
+            service_factory (Callable): Creates the service ingesting the pages.
+            extractor (DocumentExtractor): Converts the documents of every job,
+                by default on one process per core.
+        """
+        self.service_factory = service_factory
+        self.extractor = extractor or DocumentExtractor()
+        self.jobs: dict[str, CrawlJob] = {}
+        self.ingesters: dict[str, IncrementalIngester] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="crawl-job",
+        )
+
+    def ingester_for(
+        self,
+        collection_name: str,
+        service: QueryService,
+    ) -> IncrementalIngester:
+        """Get the ingester of a collection, shared by all of its jobs.
+
+        Its manifest outlives each job, so a job submitted again only embeds
+        the pages which changed, even when the manifest is kept in memory.
+        """
+        directory = get_collection_path(collection_name)
+        with self._lock:
+            if directory not in self.ingesters:
+                self.ingesters[directory] = IncrementalIngester(
+                    service=service,
+                    directory=directory,
+                    collection_name=collection_name,
+                    extractor=self.extractor,
+                )
+            return self.ingesters[directory]
+
+    def submit(self, request: CrawlRequest) -> CrawlJob:
+        """Queue a crawl job."""
+        service = self.service_factory()
+        job = CrawlJob(
+            request=request,
+            service=service,
+            extractor=self.extractor,
+            ingester=self.ingester_for(request.collection_name, service),
+        )
+        self.jobs[job.job_id] = job
+        self._executor.submit(job.run)
+        return job
+
+    def get(self, job_id: str) -> Optional[CrawlJob]:
+        """Get a job by id."""
+        return self.jobs.get(job_id)
+
+    def shutdown(self):
+        """Wait for the running jobs and stop the workers."""
+        self._executor.shutdown(wait=True)
+        for ingester in self.ingesters.values():
+            ingester.close()
+        self.extractor.close()
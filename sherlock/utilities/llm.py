@@ -1,14 +1,31 @@
 """Utilities to control the LLM UI related functions."""
 
+import threading
+import time
 from collections.abc import Iterator
 from collections.abc import Mapping
 from typing import Any
+from typing import Optional
 from typing import Union
 
 import chromadb as cdb
 import ollama as ollm
 from tqdm import tqdm
 
+from sherlock.utilities.batcher import MicroBatcher
+from sherlock.utilities.embedding_cache import EmbeddingCache
+from sherlock.utilities.retrieval import Candidate
+from sherlock.utilities.retrieval import deduplicate
+from sherlock.utilities.retrieval import mmr
+from sherlock.utilities.retrieval import pack_context
+
+
+# The single physical collection holding the vectors of every logical collection
+INDEX_NAME = "documents"
+
+# The logical collection name which searches across all collections
+ALL_COLLECTIONS = "default"
+
 
 class OllamaClient:
     """Singleton class to interact with the Ollama LLM server."""
@@ -17,10 +34,21 @@ class OllamaClient:
 
     host: str = "127.0.0.1"
     port: str = "11434"
+    # Directory of the persistent vector store, None keeps vectors in memory
+    persist_directory: Optional[str] = None
     ollama: ollm.Client = None
     chromadb: cdb.Client = None
-    collections: dict[str, cdb.Collection] = {}
-    last_index: dict[str, int] = {}
+    collections: dict[str, cdb.Collection] = None
+    last_index: dict[str, int] = None
+    # Bumped whenever a collection changes, "default" on any change
+    collection_versions: dict[str, int] = None
+    embedding_cache: EmbeddingCache = None
+    # Concurrent embeddings() calls are coalesced into batches, 0 disables it
+    embed_max_batch_size: int = 32
+    embed_max_wait: float = 0.005
+    batchers: dict[str, MicroBatcher] = None
+    # Guards the bookkeeping above, which is shared by every thread
+    _lock: threading.RLock = None
 
     def __new__(cls, *args, **kwargs):
         if not isinstance(cls._instance, cls):
@@ -31,11 +59,17 @@ class OllamaClient:
         if self.ollama is None:
             self.ollama = ollm.Client(host=f"{self.host}:{self.port}")
         if self.chromadb is None:
-            self.chromadb = cdb.Client()
-            self.collections["default"] = self.chromadb.create_collection(
-                name="default",
-            )
-            self.last_index["default"] = 0
+            self._lock = threading.RLock()
+            self.collections = {}
+            self.last_index = {}
+            self.collection_versions = {}
+            self.batchers = {}
+            if self.persist_directory:
+                self.chromadb = cdb.PersistentClient(path=self.persist_directory)
+            else:
+                self.chromadb = cdb.Client()
+        if self.embedding_cache is None:
+            self.embedding_cache = EmbeddingCache()
 
     def list_models(self):
         """List all the available models."""
@@ -95,67 +129,404 @@ class OllamaClient:
 
         return all_chunks
 
+    def get_collection(self, collection_name: str) -> cdb.Collection:
+        """Get a collection by name, opening or creating it on first use.
+
+        The ID counter of an existing collection is restored from its
+        metadata, so ids keep increasing across restarts.
+        """
+        with self._lock:
+            if collection_name not in self.collections:
+                collection = self.chromadb.get_or_create_collection(
+                    name=collection_name,
+                )
+                self.collections[collection_name] = collection
+                self.last_index[collection_name] = (collection.metadata or {}).get(
+                    "last_index",
+                    collection.count(),
+                )
+            return self.collections[collection_name]
+
+    def get_index(self) -> cdb.Collection:
+        """Get the index holding the vectors of every collection."""
+        return self.get_collection(INDEX_NAME)
+
+    @staticmethod
+    def collection_filter(
+        collection_name: Union[str, list[str]],
+    ) -> Optional[dict[str, Any]]:
+        """Build the metadata filter which restricts a search to collections.
+
+        Args:
+            collection_name (Union[str, list[str]]): A collection, a list of
+                collections, or "default" to search all of them.
+
+        Returns:
+            dict: The where filter, or None to search everything.
+        """
+        if isinstance(collection_name, str):
+            if collection_name == ALL_COLLECTIONS:
+                return None
+            return {"collection": collection_name}
+        if ALL_COLLECTIONS in collection_name:
+            return None
+        return {"collection": {"$in": list(collection_name)}}
+
+    def collection_version(self, collection_name: Union[str, list[str]]) -> int:
+        """Get a number which increases whenever the collections change."""
+        if isinstance(collection_name, str):
+            collection_name = [collection_name]
+        with self._lock:
+            if ALL_COLLECTIONS in collection_name:
+                return self.collection_versions.get(ALL_COLLECTIONS, 0)
+            return sum(
+                self.collection_versions.get(name, 0) for name in collection_name
+            )
+
+    def _changed(self, collection_names: set[str]):
+        """Record that collections were modified."""
+        with self._lock:
+            for name in collection_names | {ALL_COLLECTIONS}:
+                self.collection_versions[name] = (
+                    self.collection_versions.get(name, 0) + 1
+                )
+
+    @staticmethod
+    def tag_metadata(
+        collection_name: str,
+        metadata: Optional[dict[str, Any]] = None,
+    ) -> dict[str, Any]:
+        """Tag the metadata of a text with its collection, and source if missing."""
+        metadata = dict(metadata or {})
+        metadata.setdefault("source", collection_name)
+        metadata["collection"] = collection_name
+        return metadata
+
+    def _save_last_index(self, collection_name: str):
+        """Persist the ID counter of a collection in its metadata."""
+        collection = self.collections[collection_name]
+        # The distance settings cannot be modified once the collection exists
+        metadata = {
+            key: value
+            for key, value in (collection.metadata or {}).items()
+            if not key.startswith("hnsw:")
+        }
+        metadata["last_index"] = self.last_index[collection_name]
+        collection.modify(metadata=metadata)
+
     def add_context(
         self,
         context: list[str],
         model_name: str = "all-minilm",
         collection_name: str = "default",
-    ):
-        """Embed the text using the model."""
-        # store each document in a vector embedding database
-        for _, c in enumerate(context):
-            embedding = self.embeddings(model_name=model_name, prompt=c)
+        batch_size: int = 32,
+        insert_batch_size: int = 1000,
+        metadatas: Optional[list[dict[str, Any]]] = None,
+    ) -> int:
+        """Embed the text using the model.
 
-            if len(embedding) == 0:
-                continue
+        Texts are embedded batch_size at a time, and the embeddings are
+        accumulated and written to the vector database in bulk. Every
+        collection shares one index, where each text is tagged with its
+        collection and source.
 
-            if collection_name not in self.collections:
-                self.collections[collection_name] = self.chromadb.create_collection(
-                    name=collection_name,
+        Args:
+            context (list[str]): The texts to store.
+            model_name (str): The embedding model.
+            collection_name (str): The collection to store the texts in.
+            batch_size (int): How many texts to embed per request.
+            insert_batch_size (int): How many embeddings to write per insert.
+            metadatas (list[dict]): Optional metadata stored with each text,
+                a "source" defaults to the collection name.
+
+        Returns:
+            int: The number of texts stored.
+        """
+        start_time = time.time()
+        hits, misses = self.embedding_cache.hits, self.embedding_cache.misses
+        pending: dict[str, list] = {"documents": [], "embeddings": [], "metadatas": []}
+        added = 0
+
+        with tqdm(
+            total=len(context),
+            desc=f"embedding {collection_name}",
+            unit="doc",
+        ) as bar:
+            for start in range(0, len(context), batch_size):
+                end = start + batch_size
+                batch = context[start:end]
+                embeddings = self.embed_batch(prompts=batch, model_name=model_name)
+
+                for i, (document, embedding) in enumerate(zip(batch, embeddings)):
+                    if len(embedding) == 0:
+                        continue
+                    pending["documents"].append(document)
+                    pending["embeddings"].append(embedding)
+                    pending["metadatas"].append(
+                        OllamaClient.tag_metadata(
+                            collection_name,
+                            metadatas[start + i] if metadatas else None,
+                        ),
+                    )
+
+                if len(pending["documents"]) >= insert_batch_size:
+                    added += self._insert(**pending)
+                    pending = {"documents": [], "embeddings": [], "metadatas": []}
+
+                bar.update(len(batch))
+
+        if pending["documents"]:
+            added += self._insert(**pending)
+
+        elapsed = max(time.time() - start_time, 1e-9)
+        hits = self.embedding_cache.hits - hits
+        lookups = max(hits + self.embedding_cache.misses - misses, 1)
+        print(
+            f"Added {added} documents to {collection_name} ({added / elapsed:.1f} docs/sec, "
+            f"{hits / lookups:.0%} embedding cache hits).",
+        )
+
+        return added
+
+    def _insert(
+        self,
+        documents: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict[str, Any]],
+    ) -> int:
+        """Write documents and their embeddings to the vector database in bulk."""
+        index = self.get_index()
+        max_batch_size = self.chromadb.get_max_batch_size()
+
+        # Allocating ids and writing them happens under one lock so
+        # concurrent inserts never reuse an id
+        with self._lock:
+            for i in range(0, len(documents), max_batch_size):
+                end = min(i + max_batch_size, len(documents))
+                first = self.last_index[INDEX_NAME]
+                index.add(
+                    ids=[str(n) for n in range(first, first + end - i)],
+                    embeddings=embeddings[i:end],
+                    documents=documents[i:end],
+                    metadatas=metadatas[i:end],
                 )
-                self.last_index[collection_name] = 0
+                self.last_index[INDEX_NAME] += end - i
+            self._save_last_index(INDEX_NAME)
+        self._changed({metadata["collection"] for metadata in metadatas})
 
-            self.collections[collection_name].add(
-                ids=[str(self.last_index[collection_name])],
-                embeddings=[embedding],
-                documents=[c],
-            )
-            self.last_index[collection_name] += 1
-
-            # add the same document to the default collection
-            if collection_name != "default":
-                self.collections["default"].add(
-                    ids=[str(self.last_index["default"])],
-                    embeddings=[embedding],
-                    documents=[c],
+        return len(documents)
+
+    def delete_documents(self, where: dict[str, Any]) -> int:
+        """Delete the texts whose metadata matches a filter.
+
+        Args:
+            where (dict): The metadata filter, such as {"path": path}.
+
+        Returns:
+            int: The number of texts deleted.
+        """
+        index = self.get_index()
+        with self._lock:
+            matches = index.get(where=where, include=["metadatas"])
+            if not matches["ids"]:
+                return 0
+            index.delete(ids=matches["ids"])
+
+        self._changed(
+            {
+                (metadata or {}).get("collection", "")
+                for metadata in matches["metadatas"]
+            },
+        )
+        return len(matches["ids"])
+
+    def embed_batch(
+        self,
+        prompts: list[str],
+        model_name: str = "all-minilm",
+    ) -> list[list[float]]:
+        """Embed many texts at once.
+
+        Cached embeddings are reused, and only the remaining texts are sent
+        to Ollama, all in one request.
+
+        Args:
+            prompts (list[str]): The texts to embed.
+            model_name (str): The embedding model.
+
+        Returns:
+            list[list[float]]: One embedding per text, in order.
+        """
+        embeddings = self.embedding_cache.get_many(model=model_name, texts=prompts)
+        missing = [
+            prompt
+            for prompt, embedding in zip(prompts, embeddings)
+            if embedding is None
+        ]
+        if not missing:
+            return embeddings
+
+        computed_iter = iter(self._embed(prompts=missing, model_name=model_name))
+        return [
+            embedding if embedding is not None else next(computed_iter)
+            for embedding in embeddings
+        ]
+
+    def _embed(self, prompts: list[str], model_name: str) -> list[list[float]]:
+        """Embed texts in one request and cache their embeddings.
+
+        Every embedding goes through the batch embed endpoint. The older
+        single text endpoint returns vectors which are not normalized, so
+        mixing both in the cache and the index would skew the distances.
+        """
+        embeddings = self.ollama.embed(model=model_name, input=prompts)["embeddings"]
+        self.embedding_cache.put_many(
+            model=model_name,
+            texts=prompts,
+            embeddings=embeddings,
+        )
+        return embeddings
+
+    def get_batcher(self, model_name: str) -> MicroBatcher:
+        """Get the batcher coalescing the embedding requests for a model."""
+        with self._lock:
+            if model_name not in self.batchers:
+                # Callers already missed the cache, so it is not checked again
+                self.batchers[model_name] = MicroBatcher(
+                    lambda prompts: self._embed(
+                        prompts=prompts,
+                        model_name=model_name,
+                    ),
+                    max_batch_size=self.embed_max_batch_size,
+                    max_wait=self.embed_max_wait,
                 )
-                self.last_index["default"] += 1
+            return self.batchers[model_name]
 
     def embeddings(self, prompt: str, model_name: str = "all-minilm"):
-        """Embed the text using the model."""
-        response = self.ollama.embeddings(model=model_name, prompt=prompt)
-        return response["embedding"]
+        """Embed the text using the model, reusing a cached embedding if any.
+
+        Concurrent calls which miss the cache are coalesced into one batch,
+        unless embed_max_wait is 0.
+        """
+        embedding = self.embedding_cache.get(model=model_name, text=prompt)
+        if embedding is not None:
+            return embedding
+
+        if self.embed_max_wait > 0:
+            return self.get_batcher(model_name)(prompt)
+
+        return self._embed(prompts=[prompt], model_name=model_name)[0]
+
+    def retrieve(
+        self,
+        prompt: str,
+        collection_name: Union[str, list[str]] = ALL_COLLECTIONS,
+        top_k: int = 4,
+        fetch_k: Optional[int] = None,
+        use_mmr: bool = False,
+        diversity: float = 0.3,
+        model_name: str = "all-minilm",
+    ) -> list[Candidate]:
+        """Retrieve the top_k most relevant distinct chunks for a prompt.
+
+        Args:
+            prompt (str): The prompt to find context for.
+            collection_name (Union[str, list[str]]): The collections to search.
+            top_k (int): How many chunks to return.
+            fetch_k (int): How many results to fetch before de-duplicating,
+                defaults to four times top_k.
+            use_mmr (bool): Re-rank with maximal marginal relevance for diversity.
+            diversity (float): The MMR trade-off, 0 is pure relevance.
+            model_name (str): The embedding model.
+
+        Returns:
+            list[Candidate]: The chosen chunks, best first.
+        """
+        # embed the prompt (or reuse its cached embedding) and retrieve candidates
+        return self.search(
+            embedding=self.embeddings(prompt=prompt, model_name=model_name),
+            collection_name=collection_name,
+            top_k=top_k,
+            fetch_k=fetch_k,
+            use_mmr=use_mmr,
+            diversity=diversity,
+        )
+
+    def search(
+        self,
+        embedding: list[float],
+        collection_name: Union[str, list[str]] = ALL_COLLECTIONS,
+        top_k: int = 4,
+        fetch_k: Optional[int] = None,
+        use_mmr: bool = False,
+        diversity: float = 0.3,
+    ) -> list[Candidate]:
+        """Search the index with a prompt embedding, see retrieve."""
+        include = ["documents", "metadatas", "distances"]
+        if use_mmr:
+            include.append("embeddings")
+
+        results = self.get_index().query(
+            query_embeddings=[embedding],
+            n_results=fetch_k or top_k * 4,
+            where=OllamaClient.collection_filter(collection_name),
+            include=include,
+        )
+
+        candidates = [
+            Candidate(
+                text=document,
+                metadata=results["metadatas"][0][i] or {},
+                embedding=list(results["embeddings"][0][i]) if use_mmr else None,
+                distance=results["distances"][0][i],
+            )
+            for i, document in enumerate(results["documents"][0])
+        ]
+        candidates = deduplicate(candidates)
+
+        if use_mmr:
+            return mmr(embedding, candidates, k=top_k, diversity=diversity)
+        return candidates[:top_k]
 
     def prompt_from_context(
         self,
         prompt: str,
         model_name: str = "llama3",
-        collection_name: str = "default",
+        collection_name: Union[str, list[str]] = ALL_COLLECTIONS,
+        top_k: int = 4,
+        token_budget: int = 1024,
+        use_mmr: bool = False,
     ) -> Union[Mapping[str, Any], Iterator[Mapping[str, Any]]]:
-        """Prompt with context."""
+        """Prompt with context from a collection, several, or all of them.
 
-        # generate an embedding for the prompt and retrieve the most relevant doc
-        embedding = self.embeddings(
+        The top_k chunks are packed into at most token_budget tokens of
+        context, which bounds the prompt evaluation time.
+        """
+        start_time = time.time()
+        candidates = self.retrieve(
             prompt=prompt,
+            collection_name=collection_name,
+            top_k=top_k,
+            use_mmr=use_mmr,
         )
-        results = self.collections[collection_name].query(
-            query_embeddings=[embedding],
-            n_results=1,
+
+        stats = self.embedding_cache.stats()
+        print(
+            f"Retrieved {len(candidates)} chunks in {time.time() - start_time:.2f}s "
+            f"(embedding cache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['hit_rate']:.0%} hit rate).",
         )
-        data = results["documents"][0][0]
 
         return self.ollama.generate(
             model=model_name,
-            prompt=f"Using this data: {data}. Respond to the prompt: {prompt}",
+            prompt=OllamaClient.context_prompt(
+                prompt=prompt,
+                data=pack_context(candidates, token_budget=token_budget),
+            ),
             stream=True,
         )
+
+    @staticmethod
+    def context_prompt(prompt: str, data: str) -> str:
+        """Build the prompt sent to the model from the prompt and its context."""
+        return f"Using this data: {data}. Respond to the prompt: {prompt}"
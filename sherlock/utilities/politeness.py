@@ -0,0 +1,312 @@
+"""Per host scheduling which keeps the crawl polite to the sites it visits.
+
+Each host gets its own concurrency limit which grows while responses stay
+fast and is halved when the host slows down or starts throttling (AIMD).
+robots.txt rules and Crawl-delay are honored, and 429/503 responses back
+off for as long as the host asks through Retry-After, up to a limit."""
+
+import contextlib
+import email.utils
+import threading
+import time
+import urllib.robotparser
+from collections.abc import Callable
+from collections.abc import Iterator
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+
+
+ROBOTS_USER_AGENT = "sherlock"
+
+# Status codes which mean the host wants fewer requests
+THROTTLE_STATUS_CODES = [429, 503]
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header into a number of seconds.
+
+    Args:
+    value (str): The header, either delta seconds or an HTTP date.
+
+    Returns:
+    float: The seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class HostState:
+    """Scheduling state and counters for a single host."""
+
+    def __init__(self):
+        """Initialize the HostState class."""
+        self.limit = 1.0
+        self.in_flight = 0
+        self.delay = 0.0
+        self.next_request = 0.0
+        self.failures = 0
+        self.robots: Optional[urllib.robotparser.RobotFileParser] = None
+        self.robots_expires: Optional[float] = None
+        self.robots_lock = threading.Lock()
+
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.latency = 0.0
+        self.started: Optional[float] = None
+
+
+class HostScheduler:
+    """Schedules requests per host with AIMD concurrency and backoff."""
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        max_per_host: int = 4,
+        target_latency: float = 2.0,
+        max_retries: int = 3,
+        max_backoff: float = 60.0,
+        respect_robots: bool = True,
+        robots_failure_allows: bool = True,
+        robots_retry_delay: float = 600.0,
+    ):
+        """Initialize the HostScheduler class.
+
+        Args:
+        session (requests.Session): Optional session used to fetch robots.txt.
+        max_per_host (int): The most concurrent requests a host can reach.
+        target_latency (float): Seconds a response may take and still count as healthy.
+        max_retries (int): How often a throttled request is retried.
+        max_backoff (float): The longest backoff in seconds, Retry-After included.
+        respect_robots (bool): Whether robots.txt rules and Crawl-delay apply.
+        robots_failure_allows (bool): Whether a host whose robots.txt cannot be
+            fetched is crawled freely (True) or not at all (False).
+        robots_retry_delay (float): Seconds before robots.txt is fetched again
+            after a failure.
+        """
+        self.session = session
+        self.max_per_host = max_per_host
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.respect_robots = respect_robots
+        self.robots_failure_allows = robots_failure_allows
+        self.robots_retry_delay = robots_retry_delay
+
+        self._hosts: dict[str, HostState] = {}
+        self._condition = threading.Condition()
+
+    def _host(self, url: str) -> tuple[str, HostState]:
+        """Get the state of the host of a URL, creating it on first use."""
+        host = urlsplit(url).netloc.lower()
+        with self._condition:
+            if host not in self._hosts:
+                self._hosts[host] = HostState()
+            return host, self._hosts[host]
+
+    def robots(self, url: str) -> urllib.robotparser.RobotFileParser:
+        """Get the robots.txt rules for the host of a URL, fetching them once.
+
+        When robots.txt cannot be fetched, the host is allowed or disallowed
+        as a whole per robots_failure_allows, until robots_retry_delay passes.
+
+        Args:
+        url (str): Any URL on the host.
+
+        Returns:
+        RobotFileParser: The parsed rules, or the ones standing in for them.
+        """
+        host, state = self._host(url)
+
+        with state.robots_lock:
+            if state.robots is not None and (
+                state.robots_expires is None or time.monotonic() < state.robots_expires
+            ):
+                return state.robots
+
+            robots_url = f"{urlsplit(url).scheme}://{host}/robots.txt"
+            robots = urllib.robotparser.RobotFileParser(robots_url)
+            try:
+                r = (self.session or requests).get(robots_url, timeout=10)
+            except requests.RequestException as e:
+                print(f"Failed to fetch {robots_url}: {e}")
+                return self._robots_failure(state, robots)
+
+            # Same semantics as RobotFileParser.read
+            if r.status_code in [401, 403]:
+                robots.disallow_all = True
+            elif 400 <= r.status_code < 500:
+                robots.allow_all = True
+            elif r.status_code < 400:
+                robots.parse(r.text.splitlines())
+            else:
+                print(f"Failed to fetch {robots_url}: status {r.status_code}")
+                return self._robots_failure(state, robots)
+
+            delay = robots.crawl_delay(ROBOTS_USER_AGENT)
+            rate = robots.request_rate(ROBOTS_USER_AGENT)
+            if rate is not None and rate.requests:
+                delay = max(delay or 0, rate.seconds / rate.requests)
+            with self._condition:
+                state.delay = float(delay or 0)
+
+            state.robots = robots
+            state.robots_expires = None
+            return robots
+
+    def _robots_failure(
+        self,
+        state: HostState,
+        robots: urllib.robotparser.RobotFileParser,
+    ) -> urllib.robotparser.RobotFileParser:
+        """Stand in for robots.txt which could not be fetched, for a while."""
+        if self.robots_failure_allows:
+            robots.allow_all = True
+        else:
+            robots.disallow_all = True
+
+        state.robots = robots
+        state.robots_expires = time.monotonic() + self.robots_retry_delay
+        return robots
+
+    def allowed(self, url: str) -> bool:
+        """Check whether robots.txt allows a URL to be fetched."""
+        if not self.respect_robots:
+            return True
+
+        return self.robots(url).can_fetch(ROBOTS_USER_AGENT, url)
+
+    def _acquire(self, state: HostState):
+        """Wait for a free slot on the host and for its delay to pass."""
+        with self._condition:
+            while True:
+                wait = state.next_request - time.monotonic()
+                if state.in_flight < int(state.limit) and wait <= 0:
+                    break
+                self._condition.wait(timeout=wait if wait > 0 else None)
+
+            state.in_flight += 1
+            state.next_request = time.monotonic() + state.delay
+            if state.started is None:
+                state.started = time.monotonic()
+
+    def _release(
+        self,
+        state: HostState,
+        latency: float,
+        response: Optional[requests.Response],
+    ):
+        """Free the slot and adapt the host limit to how the request went."""
+        with self._condition:
+            state.in_flight -= 1
+            state.requests += 1
+            state.latency += (latency - state.latency) / state.requests
+
+            status = response.status_code if response is not None else None
+
+            if status in THROTTLE_STATUS_CODES:
+                # Multiplicative decrease, then wait as long as the host asks
+                state.throttled += 1
+                state.failures += 1
+                state.limit = max(1.0, state.limit / 2)
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+                if retry_after is None:
+                    retry_after = 2.0**state.failures
+                # A host asking for hours would stall every worker on it
+                retry_after = min(retry_after, self.max_backoff)
+                state.next_request = max(
+                    state.next_request,
+                    time.monotonic() + retry_after,
+                )
+            elif status is None or status >= 500:
+                state.errors += 1
+                state.failures += 1
+                state.limit = max(1.0, state.limit / 2)
+            elif latency > self.target_latency:
+                state.failures = 0
+                state.limit = max(1.0, state.limit / 2)
+            else:
+                # Additive increase, roughly one slot per window of requests
+                state.failures = 0
+                state.limit = min(
+                    float(self.max_per_host),
+                    state.limit + 1 / state.limit,
+                )
+
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def request(
+        self,
+        url: str,
+        fetch: Callable[[], requests.Response],
+    ) -> Iterator[requests.Response]:
+        """Run a request against the host of a URL once the host allows it.
+
+        Throttled requests are retried after backing off, up to max_retries.
+        The slot on the host is held, and the latency measured, until the
+        with block exits, so streamed bodies count until they are read.
+
+        Args:
+        url (str): The URL being requested.
+        fetch (Callable): Performs the request and returns the response.
+
+        Returns:
+        Iterator: The last response of the host, closed on exit.
+        """
+        _, state = self._host(url)
+
+        for attempt in range(self.max_retries + 1):
+            self._acquire(state)
+            start_time = time.monotonic()
+            response = None
+            try:
+                response = fetch()
+                if (
+                    response.status_code in THROTTLE_STATUS_CODES
+                    and attempt < self.max_retries
+                ):
+                    response.close()
+                    continue
+
+                try:
+                    yield response
+                finally:
+                    response.close()
+                return
+            finally:
+                self._release(state, time.monotonic() - start_time, response)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Get the request rate and counters of every host.
+
+        Returns:
+        dict: Per host requests, requests/sec, errors, throttled, latency and limit.
+        """
+        with self._condition:
+            now = time.monotonic()
+            return {
+                host: {
+                    "requests": state.requests,
+                    "requests_per_second": state.requests
+                    / max(now - (state.started or now), 1e-9),
+                    "errors": state.errors,
+                    "throttled": state.throttled,
+                    "latency": state.latency,
+                    "limit": state.limit,
+                }
+                for host, state in self._hosts.items()
+            }
@@ -1,11 +1,21 @@
 """Class which ingests file text into an LLM for query."""
 
 import os
+import time
+from collections.abc import AsyncIterator
+from collections.abc import Iterable
 from collections.abc import Iterator
 from collections.abc import Mapping
 from typing import Any
+from typing import Optional
 from typing import Union
 
+from sherlock.utilities.answer_cache import AnswerCache
+from sherlock.utilities.async_llm import AsyncOllamaClient
+from sherlock.utilities.chunker import Chunk
+from sherlock.utilities.chunker import chunk_file
+from sherlock.utilities.chunker import chunk_lines
+from sherlock.utilities.corpus import ShardedCorpus
 from sherlock.utilities.file_type import print_from_stream
 from sherlock.utilities.llm import OllamaClient
 
@@ -14,51 +24,282 @@ class QueryService:
     """Class for ingesting text data into an LLM for query."""
 
     ollama: OllamaClient = None
+    # Serves queries from the event loop, sharing the index of ollama
+    async_ollama: AsyncOllamaClient = None
     embedding_model: str = "all-minilm"
     llm_model: str = "llama3"
+    max_tokens: int = 200
+    overlap_tokens: int = 40
+    ingest_batch_size: int = 1000
+    top_k: int = 4
+    token_budget: int = 1024
+    use_mmr: bool = False
+    answer_cache: AnswerCache = None
+    answer_cache_size: int = 256
+    answer_cache_ttl: float = 3600.0
+    # Reuse answers to prompts whose embeddings are at least this similar
+    answer_similarity_threshold: Optional[float] = None
 
     def __init__(self):
         """Initialize the Ingestion class."""
         self.ollama = OllamaClient()
+        self.async_ollama = AsyncOllamaClient()
+        self.answer_cache = AnswerCache(
+            max_entries=self.answer_cache_size,
+            ttl=self.answer_cache_ttl,
+            similarity_threshold=self.answer_similarity_threshold,
+        )
+
+    def add_chunks(self, chunks: Iterable[Chunk], collection_name: str) -> int:
+        """Embed chunks into a collection, ingest_batch_size chunks at a time.
+
+        Args:
+            chunks (Iterable[Chunk]): The chunks to add, possibly a stream.
+            collection_name (str): The collection to add them to.
+
+        Returns:
+            int: The number of chunks added.
+        """
+        added = 0
+        batch: list[Chunk] = []
+
+        def flush() -> int:
+            return self.ollama.add_context(
+                context=[chunk.text for chunk in batch],
+                model_name=self.embedding_model,
+                collection_name=collection_name,
+                metadatas=[
+                    chunk.model_dump(exclude={"text"}, exclude_none=True)
+                    for chunk in batch
+                ],
+            )
+
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= self.ingest_batch_size:
+                added += flush()
+                batch = []
+
+        if batch:
+            added += flush()
+
+        return added
 
     def add_document(self, document: str, document_name: str):
-        """Add a document to the LLM."""
-        self.ollama.add_context(
-            context=[document],
-            model_name=self.embedding_model,
+        """Add a document to the LLM, split into overlapping chunks."""
+        self.add_chunks(
+            chunk_lines(
+                document.splitlines(keepends=True),
+                path=document_name,
+                max_tokens=self.max_tokens,
+                overlap_tokens=self.overlap_tokens,
+            ),
             collection_name=document_name,
         )
 
+    def add_corpus(self, corpus: ShardedCorpus, collection_name: str) -> int:
+        """Add every page of a sharded corpus, reading the shards sequentially.
+
+        Args:
+            corpus (ShardedCorpus): The corpus written by the scraper.
+            collection_name (str): The collection to add the pages to.
+
+        Returns:
+            int: The number of chunks added.
+        """
+        return self.add_chunks(
+            (
+                chunk
+                for record in corpus.records()
+                for chunk in chunk_lines(
+                    record.to_markdown().splitlines(keepends=True),
+                    path=record.path,
+                    max_tokens=self.max_tokens,
+                    overlap_tokens=self.overlap_tokens,
+                )
+            ),
+            collection_name=collection_name,
+        )
+
+    def remove_document(self, path: str) -> int:
+        """Remove the chunks of a file from the LLM.
+
+        Args:
+            path (str): The path the chunks were read from.
+
+        Returns:
+            int: The number of chunks removed.
+        """
+        return self.ollama.delete_documents(where={"path": path})
+
+    def add_directory(
+        self,
+        directory: str = "web_docs",
+        collection_name: Optional[str] = None,
+        extensions: tuple[str, ...] = (".md", ".txt"),
+    ) -> int:
+        """Stream every document under a directory into the LLM.
+
+        Files are chunked as they are read, so the corpus is never held in
+        memory as a whole.
+
+        Args:
+            directory (str): The directory to ingest.
+            collection_name (str): The collection to use, or None to use the
+                name of each file as its collection.
+            extensions (tuple): The file extensions to ingest.
+
+        Returns:
+            int: The number of chunks added.
+        """
+        start_time = time.time()
+        size = 0
+        paths = [
+            os.path.join(root, file)
+            for root, _, files in os.walk(directory)
+            for file in sorted(files)
+            if file.endswith(extensions)
+        ]
+
+        def stream(paths: list[str]) -> Iterator[Chunk]:
+            nonlocal size
+            for path in paths:
+                size += os.path.getsize(path)
+                yield from chunk_file(
+                    path,
+                    max_tokens=self.max_tokens,
+                    overlap_tokens=self.overlap_tokens,
+                )
+
+        if collection_name:
+            # One stream, so batches span files
+            added = self.add_chunks(stream(paths), collection_name=collection_name)
+        else:
+            added = sum(
+                self.add_chunks(stream([path]), collection_name=os.path.basename(path))
+                for path in paths
+            )
+
+        elapsed = max(time.time() - start_time, 1e-9)
+        megabytes = size / 1024 / 1024
+        print(
+            f"Ingested {added} chunks from {megabytes:.2f} MB "
+            f"({megabytes / elapsed:.2f} MB/sec, {added / max(megabytes, 1e-9):.0f} chunks/MB).",
+        )
+
+        return added
+
     def query(
         self,
         prompt: str,
-        collection_name: str = "default",
+        collection_name: Union[str, list[str]] = "default",
     ) -> Union[Mapping[str, Any], Iterator[Mapping[str, Any]]]:
-        """Query the LLM."""
-        return self.ollama.prompt_from_context(
+        """Query the LLM with context from one collection, several, or "default" for all.
+
+        Answers are cached per collection and prompt until the collection
+        changes, and replayed in the same stream shape as a fresh answer.
+        """
+        collection = QueryService.collection_key(collection_name)
+        version = self.ollama.collection_version(collection_name)
+        embedding = None
+        if self.answer_cache.similarity_threshold is not None:
+            embedding = self.ollama.embeddings(
+                prompt=prompt,
+                model_name=self.embedding_model,
+            )
+
+        response = self.answer_cache.get(
+            collection=collection,
             prompt=prompt,
-            collection_name=collection_name,
-            model_name=self.llm_model,
+            version=version,
+            embedding=embedding,
+        )
+        if response is not None:
+            return AnswerCache.replay(response)
+
+        return self.answer_cache.record(
+            self.ollama.prompt_from_context(
+                prompt=prompt,
+                collection_name=collection_name,
+                model_name=self.llm_model,
+                top_k=self.top_k,
+                token_budget=self.token_budget,
+                use_mmr=self.use_mmr,
+            ),
+            collection=collection,
+            prompt=prompt,
+            version=version,
+            embedding=embedding,
+        )
+
+    async def query_async(
+        self,
+        prompt: str,
+        collection_name: Union[str, list[str]] = "default",
+    ) -> AsyncIterator[Mapping[str, Any]]:
+        """Query like query, on the async client so no thread waits on Ollama."""
+        collection = QueryService.collection_key(collection_name)
+        version = self.ollama.collection_version(collection_name)
+        embedding = None
+        if self.answer_cache.similarity_threshold is not None:
+            embedding = await self.async_ollama.embeddings(
+                prompt=prompt,
+                model_name=self.embedding_model,
+            )
+
+        response = self.answer_cache.get(
+            collection=collection,
+            prompt=prompt,
+            version=version,
+            embedding=embedding,
         )
+        if response is not None:
+            for chunk in AnswerCache.replay(response):
+                yield chunk
+            return
+
+        async for chunk in self.answer_cache.record_async(
+            self.async_ollama.prompt_from_context(
+                prompt=prompt,
+                collection_name=collection_name,
+                model_name=self.llm_model,
+                top_k=self.top_k,
+                token_budget=self.token_budget,
+                use_mmr=self.use_mmr,
+            ),
+            collection=collection,
+            prompt=prompt,
+            version=version,
+            embedding=embedding,
+        ):
+            yield chunk
+
+    @staticmethod
+    def collection_key(collection_name: Union[str, list[str]]) -> str:
+        """Name the answers about a collection, or a list of them, in the cache."""
+        if isinstance(collection_name, str):
+            return collection_name
+        return ",".join(sorted(collection_name))
 
 
 if __name__ == "__main__":
-    # Goes through all txt files in the web_docs folder (and subdirectories)
-    # and populates the documents then queries the LLM.
+    # Ingests the new and changed files in the web_docs folder (and
+    # subdirectories), removes deleted ones, then queries the LLM.
+    from sherlock.utilities.documents import DocumentExtractor
+    from sherlock.utilities.ingester import IncrementalIngester
 
     print("-- Creating Query Service --")
     client = QueryService()
 
     print("-- Adding Documents --")
-    for root, dirs, files in os.walk("web_docs"):
-        for file in files:
-            if file.endswith(".txt"):
-                with open(os.path.join(root, file), encoding="utf-8") as f:
-                    print(f"-- Adding {file} --")
-                    client.add_document(document=f.read(), document_name=file)
+    IncrementalIngester(
+        service=client,
+        directory="web_docs",
+        extractor=DocumentExtractor(),
+    ).scan()
 
     print("-- Querying LLM --")
     print_from_stream(
-        client.query(prompt="What is the Colorado ICAP?", collection_name="icap.txt"),
+        client.query(prompt="What is the Colorado ICAP?", collection_name="default"),
         key="response",
     )
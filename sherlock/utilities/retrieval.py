@@ -0,0 +1,173 @@
+"""Select and pack retrieved chunks into the context of a prompt.
+
+Search results are de-duplicated (identical text, or chunks overlapping
+the same range of a source), optionally re-ranked with maximal marginal
+relevance for diversity, and packed into a fixed token budget so the
+size of the prompt, and with it the prompt evaluation time, is bounded."""
+
+import math
+from typing import Any
+from typing import Optional
+
+from pydantic import BaseModel
+
+from sherlock.utilities.chunker import TOKEN
+from sherlock.utilities.chunker import count_tokens
+
+
+class Candidate(BaseModel):
+    """A chunk returned by the vector search."""
+
+    text: str
+    metadata: dict[str, Any] = {}
+    embedding: Optional[list[float]] = None
+    distance: float = 0.0
+
+
+def cosine_similarity(a: list[float], b: list[float]) -> float:
+    """Compute the cosine similarity of two vectors."""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def overlaps(a: Candidate, b: Candidate, min_overlap: float = 0.5) -> bool:
+    """Check whether two chunks of the same source mostly cover the same text.
+
+    Args:
+    a (Candidate): A chunk with path, start and end metadata.
+    b (Candidate): Another chunk.
+    min_overlap (float): The share of the shorter chunk which must be shared.
+
+    Returns:
+    bool: True if the chunks overlap by at least min_overlap.
+    """
+    keys = ["path", "start", "end"]
+    if any(key not in a.metadata or key not in b.metadata for key in keys):
+        return False
+    if a.metadata["path"] != b.metadata["path"]:
+        return False
+
+    shared = min(a.metadata["end"], b.metadata["end"]) - max(
+        a.metadata["start"],
+        b.metadata["start"],
+    )
+    shorter = min(
+        a.metadata["end"] - a.metadata["start"],
+        b.metadata["end"] - b.metadata["start"],
+    )
+    return shorter > 0 and shared / shorter >= min_overlap
+
+
+def deduplicate(candidates: list[Candidate]) -> list[Candidate]:
+    """Drop candidates repeating the text of a better ranked candidate.
+
+    Args:
+    candidates (list[Candidate]): The candidates, best first.
+
+    Returns:
+    list: The remaining candidates, in the same order.
+    """
+    kept: list[Candidate] = []
+    texts = set()
+
+    for candidate in candidates:
+        text = " ".join(candidate.text.split())
+        if text in texts or any(overlaps(candidate, other) for other in kept):
+            continue
+        texts.add(text)
+        kept.append(candidate)
+
+    return kept
+
+
+def mmr(
+    query_embedding: list[float],
+    candidates: list[Candidate],
+    k: int,
+    diversity: float = 0.3,
+) -> list[Candidate]:
+    """Select k candidates by maximal marginal relevance.
+
+    Each pick maximizes relevance to the query minus the similarity to the
+    candidates already picked, so near-identical chunks are not all chosen.
+
+    Args:
+    query_embedding (list[float]): The embedding of the prompt.
+    candidates (list[Candidate]): The candidates, with embeddings.
+    k (int): How many candidates to select.
+    diversity (float): 0 ranks by relevance only, 1 by diversity only.
+
+    Returns:
+    list: The selected candidates, in the order they were picked.
+    """
+    relevance = [
+        cosine_similarity(query_embedding, candidate.embedding or [])
+        for candidate in candidates
+    ]
+    remaining = list(range(len(candidates)))
+    selected: list[int] = []
+
+    while remaining and len(selected) < k:
+        best, best_score = remaining[0], -math.inf
+        for i in remaining:
+            redundancy = max(
+                (
+                    cosine_similarity(
+                        candidates[i].embedding or [],
+                        candidates[j].embedding or [],
+                    )
+                    for j in selected
+                ),
+                default=0.0,
+            )
+            score = (1 - diversity) * relevance[i] - diversity * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+        remaining.remove(best)
+
+    return [candidates[i] for i in selected]
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut a text after its first max_tokens tokens."""
+    for i, match in enumerate(TOKEN.finditer(text)):
+        if i == max_tokens:
+            end = match.start()
+            return text[:end].rstrip()
+    return text
+
+
+def pack_context(
+    candidates: list[Candidate],
+    token_budget: int,
+    separator: str = "\n\n",
+) -> str:
+    """Pack the best candidates into a context of at most token_budget tokens.
+
+    Candidates are added whole in rank order while they fit. The best
+    candidate is truncated if it alone exceeds the budget.
+
+    Args:
+    candidates (list[Candidate]): The candidates, best first.
+    token_budget (int): The most tokens the context may hold.
+    separator (str): Placed between the packed chunks.
+
+    Returns:
+    str: The packed context.
+    """
+    packed: list[str] = []
+    used = 0
+
+    for candidate in candidates:
+        tokens = count_tokens(candidate.text)
+        if used + tokens > token_budget:
+            if not packed:
+                packed.append(truncate_tokens(candidate.text, token_budget))
+                used = token_budget
+            continue
+        packed.append(candidate.text)
+        used += tokens
+
+    return separator.join(packed)
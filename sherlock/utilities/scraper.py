@@ -3,50 +3,74 @@
 This class will recursively grab all sub-links from a given URL
 and scrape them to individual text files."""
 
+import asyncio
 import datetime
+import hashlib
 import os
 import shutil
+import threading
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from typing import Union
 
-import html2text
 import requests
 from bs4 import BeautifulSoup
-from fake_useragent import UserAgent
 from pydantic import BaseModel
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
+from pydantic import PrivateAttr
+from requests.adapters import HTTPAdapter
 
+from sherlock.utilities.browser import BrowserPool
+from sherlock.utilities.browser import RenderMode
+from sherlock.utilities.browser import needs_render
+from sherlock.utilities.corpus import ShardedCorpus
+from sherlock.utilities.crawl_state import CrawlManifest
+from sherlock.utilities.crawl_state import ManifestEntry
+from sherlock.utilities.crawl_state import content_hash
+from sherlock.utilities.dedup import DuplicateIndex
+from sherlock.utilities.download import MAX_BODY_SIZE
+from sherlock.utilities.download import BodyTooLargeError
+from sherlock.utilities.download import iter_body
+from sherlock.utilities.download import read_body
+from sherlock.utilities.extract import extract_page
+from sherlock.utilities.file_type import DOCUMENT_FILE_TYPES
 from sherlock.utilities.file_type import FileType
+from sherlock.utilities.file_type import get_file_type
 from sherlock.utilities.metadata import Metadata
+from sherlock.utilities.politeness import HostScheduler
+from sherlock.utilities.sitemap import discover_sitemaps
+from sherlock.utilities.sitemap import read_sitemaps
+from sherlock.utilities.url import VisitedSet
+from sherlock.utilities.url import canonicalize_url
+from sherlock.utilities.url import in_scope
+from sherlock.utilities.writer import OutputFormat
+from sherlock.utilities.writer import get_file_path
+from sherlock.utilities.writer import stream_file
 from sherlock.utilities.writer import write_file
 
 
-html2text = html2text.HTML2Text()
-html2text.ignore_links = True
+# Answers which mean the page was removed, rather than failed to load
+GONE_STATUS_CODES = [404, 410]
 
-chrome_options = webdriver.ChromeOptions()
-ua = UserAgent()
-userAgent = ua.chrome
-chrome_options = Options()
-chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-chrome_options.add_experimental_option("useAutomationExtension", False)
-chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-chrome_options.add_argument("--headless=old")
-chrome_options.add_argument(f"user-agent={userAgent}")
-chrome_options.add_argument("--disable-blink-features")
-chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-chrome_options.add_argument("--disable-extensions")
-chrome_options.add_argument("--profile-directory=Default")
-chrome_options.add_argument("--incognito")
-chrome_options.add_argument("--disable-plugins-discovery")
-chrome_options.add_argument("--start-maximized")
-chrome_options.add_experimental_option("useAutomationExtension", False)
-chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+# Shared browsers for direct calls to Scraper.scrape, started on first use
+browser_pool = BrowserPool(size=1)
 
-# Add headers to mimic a browser visit
 
-driver = webdriver.Chrome(options=chrome_options)
+def build_session(pool_size: int) -> requests.Session:
+    """Build a requests session with a pool of keep-alive connections.
+
+    Args:
+    pool_size (int): The number of connections to keep open per host.
+
+    Returns:
+    requests.Session: The pooled session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
 class Scraper(BaseModel):
@@ -54,18 +78,63 @@ class Scraper(BaseModel):
 
     Attributes:
     base_url (str): The URL to start the scraping process.
-    links (dict): A dictionary of links and representative text.
+    aliases (dict): URLs whose content copies an earlier page, and the URL of that page.
     ignore_values (list): A list of values to ignore when scraping.
     max_depth (int): The maximum depth to scrape.
     source_url (str): The URL to start the scraping process.
+    max_concurrency (int): The maximum number of pages fetched at once.
+    max_per_host (int): The most pages fetched at once from one host, reached while
+        the host responds quickly.
+    render_mode (RenderMode): When to render HTML pages in the headless browser.
+    max_browsers (int): The maximum number of headless browsers to run at once.
+    incremental (bool): Keep the previous crawl and only rewrite changed pages.
+    resume (bool): Continue an interrupted crawl instead of starting over.
+    max_body_size (int): The maximum number of bytes to download per URL.
+    respect_robots (bool): Follow robots.txt rules and Crawl-delay.
+    use_sitemaps (bool): Seed the crawl with the pages listed in the site's sitemaps.
+    on_page (Callable): Called with the URL and output path of every new or changed
+        page as soon as it is written.
+    output_format (OutputFormat): Write pages to their own files, or append them to
+        the compressed shards of the collection corpus. Documents are always
+        written to files.
+    detect_duplicates (bool): Record pages with the same or nearly the same text as
+        an earlier page as aliases instead of writing them again.
     """
 
     source_url: str
     collection_name: str
     base_url: Optional[str]
-    links: dict[str, Optional[str]]
+    aliases: dict[str, str]
     ignore_values: list[str]
     max_depth: int
+    max_concurrency: int
+    max_per_host: int
+    render_mode: RenderMode
+    max_browsers: int
+    incremental: bool
+    resume: bool
+    max_body_size: int
+    respect_robots: bool
+    use_sitemaps: bool
+    on_page: Optional[Callable[[str, str], None]]
+    output_format: OutputFormat
+    detect_duplicates: bool
+
+    _session: requests.Session = PrivateAttr(default=None)
+    _browsers: BrowserPool = PrivateAttr(default=None)
+    _manifest: CrawlManifest = PrivateAttr(default=None)
+    _corpus: Optional[ShardedCorpus] = PrivateAttr(default=None)
+    _duplicates: Optional[DuplicateIndex] = PrivateAttr(default=None)
+    _visited: VisitedSet = PrivateAttr(default_factory=VisitedSet)
+    _scheduler: HostScheduler = PrivateAttr(default=None)
+    _lastmods: dict[str, str] = PrivateAttr(default_factory=dict)
+    _queued: int = PrivateAttr(default=0)
+    _changed: set[str] = PrivateAttr(default_factory=set)
+    _deferred: list[tuple[str, int, str]] = PrivateAttr(default_factory=list)
+    _crawled: bool = PrivateAttr(default=False)
+    _characters: int = PrivateAttr(default=0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _stopped: threading.Event = PrivateAttr(default_factory=threading.Event)
 
     def __init__(
         self,
@@ -74,209 +143,878 @@ class Scraper(BaseModel):
         base_url: Optional[str] = None,
         ignore_values: list[str] = [],
         max_depth: int = 1,
+        max_concurrency: int = 8,
+        max_per_host: int = 4,
+        render_mode: RenderMode = RenderMode.ALWAYS,
+        max_browsers: int = 2,
+        incremental: bool = False,
+        resume: bool = False,
+        max_body_size: int = MAX_BODY_SIZE,
+        respect_robots: bool = True,
+        use_sitemaps: bool = False,
+        on_page: Optional[Callable[[str, str], None]] = None,
+        output_format: OutputFormat = OutputFormat.FILES,
+        detect_duplicates: bool = True,
     ):
         """Initialize the Scraper class."""
         super().__init__(
             collection_name=collection_name,
             source_url=source_url,
             base_url=base_url,
-            links={},
+            aliases={},
             ignore_values=ignore_values,
             max_depth=max_depth,
+            max_concurrency=max_concurrency,
+            max_per_host=max_per_host,
+            render_mode=render_mode,
+            max_browsers=max_browsers,
+            incremental=incremental,
+            resume=resume,
+            max_body_size=max_body_size,
+            respect_robots=respect_robots,
+            use_sitemaps=use_sitemaps,
+            on_page=on_page,
+            output_format=output_format,
+            detect_duplicates=detect_duplicates,
         )
-        # Clear the output directory
-        output_dir = f"./web_docs/{self.collection_name}"
-        print(f"Clearing output directory: {output_dir}")
-        if os.path.exists(output_dir):
-            shutil.rmtree(output_dir)
+        self._session = build_session(pool_size=self.max_concurrency)
+        self._browsers = BrowserPool(size=self.max_browsers)
+        self._scheduler = HostScheduler(
+            session=self._session,
+            max_per_host=self.max_per_host,
+            respect_robots=self.respect_robots,
+        )
+        self._manifest = CrawlManifest(
+            collection_name=self.collection_name,
+            resume=self.resume,
+        )
+        if self.output_format == OutputFormat.SHARDS:
+            self._corpus = ShardedCorpus(collection_name=self.collection_name)
+        if self.detect_duplicates:
+            self._duplicates = DuplicateIndex()
 
-        # If no base URL is provided, use the source URL (but only get the domain)
-        if not self.base_url:
-            self.base_url = f'https://{self.source_url.split("//")[1].split("/")[0]}'
+        # Clear the output directory unless re-crawling incrementally or resuming
+        if not self.incremental and not self._manifest.resumed:
+            output_dir = f"./web_docs/{self.collection_name}"
+            print(f"Clearing output directory: {output_dir}")
+            if os.path.exists(output_dir):
+                shutil.rmtree(output_dir)
+            self._manifest.clear()
+            if self._corpus is not None:
+                self._corpus.clear()
 
         print(f"Starting scraping process for: {self.source_url}")
 
         if not self.source_url.startswith("http"):
             raise ValueError("URL must start with http or https.")
 
+        self.source_url = canonicalize_url(self.source_url)
+
+        # If no base URL is provided, use the source URL (but only get the domain)
+        if not self.base_url:
+            self.base_url = canonicalize_url("/", base=self.source_url)
+        else:
+            self.base_url = canonicalize_url(self.base_url)
+
     def start(self):
         """Start the scraping process."""
         import time
 
         start_time = time.time()
-        self.get_page_sublinks(url=self.source_url, depth=0)
-        print(f"Scraped {len(self.links)} pages.")
+        frontier = self.resume_frontier() + self.sitemap_frontier()
+        try:
+            self.crawl_from(frontier=frontier)
+            # Copies recorded by an earlier crawl are checked once it is done
+            self._crawled = True
+            if not self.stopped:
+                frontier = self.recheck_duplicates()
+                if frontier:
+                    self.crawl_from(frontier=frontier)
+        finally:
+            self._browsers.close()
+
+        # Unseen pages are kept, the stopped crawl can be resumed
+        if self.stopped:
+            print(f"Stopped after {self.pages} pages.")
+            return
+
+        self._manifest.finish()
+
+        # Remove the output of pages which no longer exist
+        for output_path in self._manifest.remove_unseen():
+            self.remove_output(output_path)
+
+        print(f"Scraped {self.pages} pages, {len(self.aliases)} duplicates.")
+        for host, stats in self._scheduler.stats().items():
+            print(
+                f"{host}: {stats['requests']} requests "
+                f"({stats['requests_per_second']:.2f}/sec), "
+                f"{stats['errors']} errors, {stats['throttled']} throttled, "
+                f"{stats['latency']:.2f}s average latency",
+            )
+        print(
+            "New: {new}, Changed: {changed}, Unchanged: {unchanged}, "
+            "Deleted: {deleted}".format(**self._manifest.summary),
+        )
         print(f"Elapsed time: {time.time() - start_time:.2f} seconds.")
 
-    def get_page_sublinks(self, url: str, depth: int = 0):
-        """Get all sub-links from a given page.
+    def resume_frontier(self) -> list[tuple[str, int]]:
+        """Restore the progress of an interrupted crawl.
+
+        Pages recorded during the interrupted run are marked as visited and
+        the sub-links found on them become the frontier to continue from.
+
+        Returns:
+        list: The URLs and depths left to visit.
+        """
+        if not self._manifest.resumed:
+            return []
+
+        frontier = []
+        for entry in self._manifest.visited():
+            self._visited.add(entry.url)
+            self.count_characters(entry.size)
+            self.remember_page(entry)
+            if entry.duplicate_of is not None:
+                self.aliases[entry.url] = entry.duplicate_of
+            frontier.extend((link, entry.depth + 1) for link in entry.sublinks)
+
+        print(f"Resuming crawl with {self.pages} pages already scraped.")
+
+        return frontier
+
+    def sitemap_frontier(self) -> list[tuple[str, int]]:
+        """Seed the frontier from the sitemaps of the site.
+
+        Pages listed in a sitemap are added at max_depth: they are scraped
+        without rendering other pages to find them, and links on them are
+        not followed further. Their lastmod values are kept so unchanged
+        pages can be skipped.
+
+        Returns:
+        list: The in scope URLs listed by the sitemaps, with their depth.
+        """
+        if not self.use_sitemaps:
+            return []
+
+        sitemap_urls = discover_sitemaps(
+            base_url=self.base_url,
+            robots=self._scheduler.robots(self.base_url),
+        )
+
+        frontier = []
+        for loc, lastmod in read_sitemaps(
+            sitemap_urls=sitemap_urls,
+            session=self._session,
+            scheduler=self._scheduler,
+            max_bytes=self.max_body_size,
+        ):
+            url = canonicalize_url(loc)
+            if url is None or not in_scope(url, base_url=self.base_url):
+                continue
+            if lastmod is not None:
+                self._lastmods[url] = lastmod
+            frontier.append((url, self.max_depth))
+
+        print(f"Seeded {len(frontier)} pages from sitemaps.")
+
+        return frontier
+
+    def crawl_from(self, frontier: list[tuple[str, int]]):
+        """Crawl from the source URL and a frontier.
+
+        Uses the concurrent crawl engine unless max_concurrency is 1.
 
         Args:
-        url (str): The URL to scrape.
-        depth (int): The depth of the URL.
+        frontier (list): URLs and depths to visit besides the source URL.
         """
+        if self.max_concurrency > 1:
+            asyncio.run(self.crawl(frontier=frontier))
+        else:
+            self.get_page_sublinks(url=self.source_url, depth=0, frontier=frontier)
 
-        if depth > self.max_depth:
+    def recheck_duplicates(self) -> list[tuple[str, int]]:
+        """Process the pages recorded as copies, now that the crawl is done.
+
+        A copy is fetched and compared again when the page it copies changed
+        or was not seen during this crawl. Otherwise it is processed like any
+        other recorded page, and stays a copy while it does not change.
+
+        Returns:
+        list: The sub-links of the copies, with their depth.
+        """
+        deferred, self._deferred = self._deferred, []
+
+        frontier = []
+        for url, depth, original in deferred:
+            recheck = original in self._changed or original not in self._visited
+            sublinks = self.process_page(url=url, depth=depth, recheck=recheck)
+            frontier.extend((link, depth + 1) for link in sublinks)
+
+        return frontier
+
+    def remove_output(self, output_path: str):
+        """Delete the file or corpus record written for a page."""
+        if self._corpus is not None and self._corpus.remove(output_path):
             return
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+    @property
+    def corpus(self) -> Optional[ShardedCorpus]:
+        """The corpus pages are appended to with the shards output format."""
+        return self._corpus
+
+    @property
+    def queued(self) -> int:
+        """The number of URLs waiting in the frontier or being fetched."""
+        return self._queued
+
+    @property
+    def links(self) -> dict[str, Optional[str]]:
+        """The pages of this crawl and their output path, or the URL they copy.
+
+        Read from the manifest, so the crawl keeps no URL strings in memory.
+        """
+        return self._manifest.links()
+
+    @property
+    def pages(self) -> int:
+        """The number of URLs visited, including the ones which failed."""
+        return len(self._visited)
+
+    @property
+    def characters(self) -> int:
+        """The number of characters written for the visited pages."""
+        return self._characters
+
+    @property
+    def stopped(self) -> bool:
+        """Whether the crawl was asked to stop."""
+        return self._stopped.is_set()
+
+    def stop(self):
+        """Stop the crawl once the pages being fetched are done."""
+        self._stopped.set()
+
+    def count_characters(self, size: int):
+        """Add the size of a page to the total, pages finish on worker threads."""
+        with self._lock:
+            self._characters += size
+
+    def should_visit(self, url: str, depth: int) -> bool:
+        """Check whether a canonical URL still needs to be scraped.
+
+        Args:
+        url (str): The canonical URL.
+        depth (int): The depth of the URL.
+
+        Returns:
+        bool: True if the URL is within depth, not ignored and not yet visited.
+        """
+        if depth > self.max_depth:
+            return False
 
         for ignore_value in self.ignore_values:
             if ignore_value in url:
-                return
+                return False
+
+        return url not in self._visited
+
+    def get_page_sublinks(
+        self,
+        url: str,
+        depth: int = 0,
+        frontier: Optional[list[tuple[str, int]]] = None,
+    ):
+        """Get all sub-links from a given page, one page at a time.
+
+        Walks the site depth first with an explicit frontier rather than
+        recursion, so deep sites are not limited by the interpreter stack.
+
+        Args:
+        url (str): The URL to scrape.
+        depth (int): The depth of the URL.
+        frontier (list): Optional URLs and depths left over from a previous run.
+        """
+        frontier = [(url, depth)] + list(frontier or [])
+
+        while frontier and not self.stopped:
+            url, depth = frontier.pop()
+
+            if not self.should_visit(url=url, depth=depth):
+                continue
+
+            self._visited.add(url)
+            sublinks = self.process_page(url=url, depth=depth)
+            # Reverse so the first link on the page is scraped first
+            frontier.extend((link, depth + 1) for link in reversed(sublinks))
+            self._queued = len(frontier)
+
+    async def crawl(self, frontier: Optional[list[tuple[str, int]]] = None):
+        """Crawl the site concurrently, starting from the source URL.
+
+        Pages are fetched breadth first on a bounded pool of workers. At most
+        max_concurrency pages are in flight at once, and the host scheduler
+        limits how many of those reach the same host. Produces the same
+        links and web_docs output as get_page_sublinks.
+
+        Args:
+        frontier (list): Optional URLs and depths left over from a previous run.
+        """
+        loop = asyncio.get_running_loop()
+        frontier = deque([(self.source_url, 0)] + list(frontier or []))
+        in_flight: set[asyncio.Task] = set()
+
+        async def visit(url: str, depth: int) -> list[tuple[str, int]]:
+            sublinks = await loop.run_in_executor(
+                executor,
+                self.process_page,
+                url,
+                depth,
+            )
+            return [(link, depth + 1) for link in sublinks]
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while frontier or in_flight:
+                if self.stopped:
+                    frontier.clear()
+
+                while frontier and len(in_flight) < self.max_concurrency:
+                    url, depth = frontier.popleft()
+
+                    if not self.should_visit(url=url, depth=depth):
+                        continue
+
+                    # Claim the URL so no other worker picks it up
+                    self._visited.add(url)
+                    in_flight.add(asyncio.create_task(visit(url, depth)))
+
+                if not in_flight:
+                    continue
+
+                done, in_flight = await asyncio.wait(
+                    in_flight,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    frontier.extend(task.result())
+                self._queued = len(frontier) + len(in_flight)
+
+        self._queued = 0
+
+    def process_page(self, url: str, depth: int, recheck: bool = False) -> list[str]:
+        """Scrape and write a single page.
+
+        Pages recorded in the crawl manifest are fetched conditionally when
+        crawling incrementally, and are not converted or written again if
+        the server reports them unchanged or their body hashes the same.
+        Pages whose sitemap lastmod matches the manifest are not fetched.
+        Pages recorded as copies are put aside until the crawl is done, see
+        recheck_duplicates.
+        The body is only downloaded once the headers show a supported type.
+        A recorded page which fails to fetch keeps its previous output, and
+        is only dropped once the server answers 404 or 410.
+
+        Args:
+        url (str): The canonical URL to scrape.
+        depth (int): The depth of the URL.
+        recheck (bool): Fetch, convert and compare the page even if unchanged.
+
+        Returns:
+        list: The in scope sub-links found on the page.
+        """
+        if not self._scheduler.allowed(url):
+            print(f"Disallowed by robots.txt: {url}")
+            return []
+
+        entry = previous = self._manifest.get(url)
+
+        # Whether a copy still is one is known once the page it copies was seen
+        if entry is not None and entry.duplicate_of is not None and not self._crawled:
+            self._deferred.append((url, depth, entry.duplicate_of))
+            return entry.sublinks
+
+        if recheck:
+            entry = None
+        headers = entry.conditional_headers() if entry is not None else None
+
+        # The sitemap says the page has not changed since it was recorded
+        lastmod = self._lastmods.get(url)
+        if entry is not None and lastmod is not None and entry.lastmod == lastmod:
+            return self.unchanged_page(url=url, depth=depth, entry=entry)
+
+        try:
+            with self._scheduler.request(
+                url=url,
+                fetch=lambda: Scraper.fetch(
+                    url=url,
+                    session=self._session,
+                    headers=headers,
+                ),
+            ) as response:
+                if entry is not None and response.status_code == 304:
+                    return self.unchanged_page(url=url, depth=depth, entry=entry)
+
+                if response.status_code in GONE_STATUS_CODES:
+                    print(f"Gone ({response.status_code}): {url}")
+                    return []
+
+                if not 200 <= response.status_code < 300:
+                    print(f"Failed to scrape {url}: status {response.status_code}")
+                    return self.failed_page(url=url, depth=depth, entry=previous)
+
+                content_type = response.headers.get("content-type", "")
+                file_type = get_file_type(content_type)
+
+                if file_type != FileType.HTML and file_type not in DOCUMENT_FILE_TYPES:
+                    print(f"Unsupported content type: {content_type}")
+                    return []
 
-        # Remove all window.hash
-        if "#" in url:
-            url = url.split("#")[0]
+                if file_type in DOCUMENT_FILE_TYPES:
+                    return self.download_document(
+                        url=url,
+                        depth=depth,
+                        response=response,
+                        file_type=file_type,
+                        entry=entry,
+                    )
 
-        # Remove trailing slash
-        if url.endswith("/"):
-            url = url[:-1]
+                content = read_body(response=response, max_bytes=self.max_body_size)
+        except (requests.RequestException, BodyTooLargeError) as e:
+            print(f"Failed to scrape {url}: {e}")
+            return self.failed_page(url=url, depth=depth, entry=previous)
 
-        if url in self.links:
+        body_hash = content_hash(content)
+
+        if entry is not None and body_hash == entry.content_hash:
+            return self.unchanged_page(url=url, depth=depth, entry=entry)
+
+        page, file_type = Scraper.parse(
+            url=url,
+            content=content,
+            file_type=file_type,
+            browsers=self._browsers,
+            render_mode=self.render_mode,
+        )
+        size, output_path, sublinks, fingerprint = self.write_page(
+            url=url,
+            depth=depth,
+            page=page,
+            file_type=file_type,
+        )
+
+        self.count_characters(size)
+        self.record(
+            entry=entry,
+            new_entry=ManifestEntry(
+                url=url,
+                etag=response.headers.get("etag"),
+                last_modified=response.headers.get("last-modified"),
+                content_hash=body_hash,
+                depth=depth,
+                output_path=output_path,
+                size=size,
+                sublinks=sublinks,
+                lastmod=self._lastmods.get(url),
+                duplicate_of=self.aliases.get(url),
+                text_hash=fingerprint[0] if fingerprint else None,
+                fingerprint=fingerprint[1] if fingerprint else None,
+            ),
+        )
+        if self.on_page is not None and output_path is not None:
+            self.on_page(url, output_path)
+
+        return sublinks
+
+    def unchanged_page(
+        self,
+        url: str,
+        depth: int,
+        entry: ManifestEntry,
+        fetched: bool = True,
+    ) -> list[str]:
+        """Keep the previous output of a page which has not changed.
+
+        Args:
+        url (str): The canonical URL of the page.
+        depth (int): The depth of the URL.
+        entry (ManifestEntry): The page recorded by the previous crawl.
+        fetched (bool): Whether the page was seen unchanged, rather than kept
+            because it failed. Only then is its sitemap lastmod remembered.
+
+        Returns:
+        list: The in scope sub-links recorded for the page.
+        """
+        self._manifest.mark_unchanged(
+            url=url,
+            depth=depth,
+            lastmod=self._lastmods.get(url) if fetched else None,
+        )
+        self.count_characters(entry.size)
+        self.remember_page(entry)
+        if entry.duplicate_of is not None:
+            self.aliases[url] = entry.duplicate_of
+        return entry.sublinks
+
+    def remember_page(self, entry: ManifestEntry):
+        """Let copies of a recorded page be found without fetching it again."""
+        if (
+            self._duplicates is None
+            or entry.duplicate_of is not None
+            or entry.output_path is None
+        ):
             return
 
-        page, file_type = Scraper.scrape(url=url)
+        # Documents, and pages recorded before text hashes, use the body hash
+        if entry.text_hash is not None:
+            self._duplicates.check_fingerprint(
+                entry.url,
+                digest=entry.text_hash,
+                fingerprint=entry.fingerprint,
+            )
+        else:
+            self._duplicates.check_hash(entry.url, entry.content_hash)
+
+    def failed_page(
+        self,
+        url: str,
+        depth: int,
+        entry: Optional[ManifestEntry],
+    ) -> list[str]:
+        """Keep the previous output of a page which could not be fetched.
+
+        A network error or server error says nothing about the page, so its
+        output and the pages only reachable through it are not removed.
+
+        Args:
+        url (str): The canonical URL of the page.
+        depth (int): The depth of the URL.
+        entry (ManifestEntry): The page recorded by the previous crawl, if any.
+
+        Returns:
+        list: The in scope sub-links recorded for the page, if any.
+        """
+        if entry is None:
+            return []
+        return self.unchanged_page(url=url, depth=depth, entry=entry, fetched=False)
+
+    def record(self, entry: Optional[ManifestEntry], new_entry: ManifestEntry):
+        """Record a new or changed page in the manifest.
+
+        Args:
+        entry (ManifestEntry): The page recorded by the previous crawl, if any.
+        new_entry (ManifestEntry): The page as fetched during this crawl.
+        """
+        if self._manifest.record(new_entry) == "changed":
+            self._changed.add(new_entry.url)
+
+        # A page which is no longer written, such as a new copy, keeps no output
+        if (
+            entry is not None
+            and entry.output_path is not None
+            and entry.output_path != new_entry.output_path
+        ):
+            self.remove_output(entry.output_path)
+
+    def download_document(
+        self,
+        url: str,
+        depth: int,
+        response: requests.Response,
+        file_type: FileType,
+        entry: Optional[ManifestEntry],
+    ) -> list[str]:
+        """Stream a document body straight to its output file.
+
+        The body is hashed while it is downloaded, and the existing file is
+        only replaced when the hash differs from the recorded one, so an
+        unchanged document keeps its file and is not converted again. The
+        same document served under another URL is not written at all.
+
+        Args:
+        url (str): The canonical URL of the document.
+        depth (int): The depth of the URL.
+        response (requests.Response): The streamed response.
+        file_type (FileType): The type of the document.
+        entry (ManifestEntry): The document recorded by the previous crawl, if any.
+
+        Returns:
+        list: Always empty, documents have no sub-links.
+        """
+        hasher = hashlib.sha256()
+        original: Optional[str] = None
+
+        def discard() -> bool:
+            nonlocal original
+            if entry is not None and hasher.hexdigest() == entry.content_hash:
+                return True
+            if self._duplicates is not None:
+                original = self._duplicates.check_hash(url, hasher.hexdigest())
+            return original is not None
+
+        size = stream_file(
+            collection_name=self.collection_name,
+            url=url,
+            chunks=iter_body(
+                response=response,
+                max_bytes=self.max_body_size,
+                hasher=hasher,
+            ),
+            file_type=file_type,
+            depth=depth,
+            discard=discard,
+        )
+
+        if size is None and original is None:
+            return self.unchanged_page(url=url, depth=depth, entry=entry)
+
+        output_path = get_file_path(self.collection_name, url, file_type)
+        if original is not None:
+            self.aliases[url] = original
+            print(f"Duplicate of {original}: {url}")
+            output_path, size = None, 0
+
+        self.count_characters(size)
+        self.record(
+            entry=entry,
+            new_entry=ManifestEntry(
+                url=url,
+                etag=response.headers.get("etag"),
+                last_modified=response.headers.get("last-modified"),
+                content_hash=hasher.hexdigest(),
+                depth=depth,
+                output_path=output_path,
+                size=size,
+                sublinks=[],
+                lastmod=self._lastmods.get(url),
+                duplicate_of=original,
+            ),
+        )
+        if self.on_page is not None and output_path is not None:
+            self.on_page(url, output_path)
+
+        return []
+
+    def write_page(
+        self,
+        url: str,
+        depth: int,
+        page: Optional[Union[bytes, BeautifulSoup]],
+        file_type: FileType,
+    ) -> tuple[int, Optional[str], list[str]]:
+        """Convert a scraped page and write it to the collection.
 
+        Args:
+        url (str): The canonical URL of the page.
+        depth (int): The depth of the URL.
+        page (Union[bytes, BeautifulSoup]): The scraped content.
+        file_type (FileType): The type of the scraped content.
+
+        Returns:
+        tuple: The characters written, the output path, the in scope sub-links,
+            and the text hash and fingerprint of the page if checked for copies.
+        """
         if page is None:
-            self.links[url] = 0
-            return
+            return 0, None, [], None
 
         if isinstance(page, BeautifulSoup):
-            page_text: str = html2text.handle(str(page))
+            # Markdown text without boilerplate, plus every link on the page
+            page_text, links = extract_page(page)
         elif isinstance(page, bytes):
-            if file_type == FileType.PDF:
-                # Write to PDF file
-                self.links[url] = write_file(
+            if file_type in DOCUMENT_FILE_TYPES:
+                # Write the document as it is, it is converted before ingestion
+                size = write_file(
                     collection_name=self.collection_name,
                     url=url,
                     content=page,
-                    file_type=FileType.PDF,
+                    file_type=file_type,
                     depth=depth,
                 )
-                return
-            elif file_type == FileType.DOCX:
-                # Write to DOCX file
-                self.links[url] = write_file(
-                    collection_name=self.collection_name,
-                    url=url,
-                    content=page,
-                    file_type=FileType.DOCX,
-                    depth=depth,
+                return (
+                    size,
+                    get_file_path(self.collection_name, url, file_type),
+                    [],
+                    None,
                 )
-                return
+            return 0, None, [], None
         else:
             raise ValueError(
                 f"Scrape result must be BeautifulSoup or bytes object (received: {type(page)}).",
             )
 
-        # Trim blank lines
-        page_text = "\n".join([line for line in page_text.split("\n") if line.strip()])
-
         if len(page_text) == 0:
-            self.links[url] = 0
-            return
+            return 0, None, [], None
 
-        page_text = (
-            Metadata(
-                title=url.split("/")[-1],
-                source=url,
-                file_type=file_type,
-                retrieved_date=datetime.datetime.now().strftime("%Y-%m-%d"),
-            ).to_markdown()
-            + page_text
-        )
+        sublinks = self.in_scope_links(url=url, links=links)
 
-        self.links[url] = write_file(
-            collection_name=self.collection_name,
-            url=url,
-            content=page_text,
-            file_type=FileType.HTML,
-            depth=depth,
+        # Copies of an earlier page are recorded but neither written nor embedded
+        fingerprint, original = None, None
+        if self._duplicates is not None:
+            fingerprint = self._duplicates.fingerprint(page_text)
+            original = self._duplicates.check_fingerprint(
+                url,
+                digest=fingerprint[0],
+                fingerprint=fingerprint[1],
+            )
+        if original is not None:
+            self.aliases[url] = original
+            print(f"Duplicate of {original}: {url}")
+            return 0, None, sublinks, fingerprint
+
+        metadata = Metadata(
+            title=url.split("/")[-1],
+            source=url,
+            file_type=file_type,
+            retrieved_date=datetime.datetime.now().strftime("%Y-%m-%d"),
         )
+        output_path = get_file_path(self.collection_name, url, FileType.HTML)
 
-        if isinstance(page, BeautifulSoup):
-            for link in page.find_all("a"):
-                link_href = link.get("href")
+        if self._corpus is not None:
+            size = self._corpus.append(
+                url=url,
+                path=output_path,
+                metadata=metadata,
+                content=page_text,
+            )
+            print(f"Scraped: {url} ({file_type} - {size} characters - Depth: {depth})")
+        else:
+            size = write_file(
+                collection_name=self.collection_name,
+                url=url,
+                content=metadata.to_markdown() + page_text,
+                file_type=FileType.HTML,
+                depth=depth,
+            )
 
-                if link_href is None:
-                    continue
+        return size, output_path, sublinks, fingerprint
+
+    def in_scope_links(self, url: str, links: list[str]) -> list[str]:
+        """Canonicalize the links of a page and keep the in scope ones.
+
+        Args:
+        url (str): The canonical URL of the page.
+        links (list): The links found on the page.
+
+        Returns:
+        list: The distinct in scope links, in the order they appear.
+        """
+        sublinks = []
+        seen = set()
 
-                if not link_href.startswith("http"):
-                    if link_href.startswith("/"):
-                        link_href = f"{self.base_url}{link_href}"
-                    else:
-                        link_href = f"{self.base_url}/{link_href}"
+        for link_href in links:
+            link_href = canonicalize_url(link_href, base=url)
 
-                if (
-                    link_href is not None
-                    and link_href not in self.links
-                    and f"{link_href}/" not in self.links
-                    and self.base_url in link_href
-                ):
-                    self.get_page_sublinks(url=link_href, depth=depth + 1)
+            # Keep every in scope link, the frontier skips visited pages
+            if (
+                link_href is not None
+                and link_href not in seen
+                and in_scope(link_href, base_url=self.base_url)
+            ):
+                seen.add(link_href)
+                sublinks.append(link_href)
+
+        return sublinks
 
     @staticmethod
-    def scrape(url: str) -> tuple[Union[bytes, BeautifulSoup], FileType]:
+    def fetch(
+        url: str,
+        session: Optional[requests.Session] = None,
+        headers: Optional[dict[str, str]] = None,
+    ) -> requests.Response:
+        """Fetch a URL.
+
+        Args:
+        url (str): The URL to fetch.
+        session (requests.Session): Optional pooled session to fetch with.
+        headers (dict): Optional extra request headers.
+
+        Returns:
+        requests.Response: The streamed response, its body is not read yet."""
+        return (session or requests).get(url, headers=headers, timeout=10, stream=True)
+
+    @staticmethod
+    def scrape(
+        url: str,
+        session: Optional[requests.Session] = None,
+        browsers: Optional[BrowserPool] = None,
+        render_mode: RenderMode = RenderMode.ALWAYS,
+        max_body_size: int = MAX_BODY_SIZE,
+    ) -> tuple[Union[bytes, BeautifulSoup], FileType]:
         """Scrape the content of a given URL.
 
         Args:
         url (str): The URL to scrape.
+        session (requests.Session): Optional pooled session to fetch with.
+        browsers (BrowserPool): Optional browser pool to render HTML with.
+        render_mode (RenderMode): When to render HTML pages in the browser.
+        max_body_size (int): The maximum number of bytes to download.
 
         Returns:
         tuple: The scraped content and file type."""
 
-        r = requests.get(url, timeout=10)
+        with Scraper.fetch(url=url, session=session) as r:
+            # if r.status_code != 200:
+            #     print(f"Failed to scrape {url} with status code {r.status_code}")
+            #     return None, FileType.Unsupported
 
-        # if r.status_code != 200:
-        #     print(f"Failed to scrape {url} with status code {r.status_code}")
-        #     return None, FileType.Unsupported
+            content_type = r.headers.get("content-type", "")
+            file_type = get_file_type(content_type)
 
-        content_type = r.headers.get("content-type")
+            # Decide from the headers before reading the body
+            if file_type != FileType.HTML and file_type not in DOCUMENT_FILE_TYPES:
+                print(f"Unsupported content type: {content_type}")
+                return None, FileType.Unsupported
 
-        # HTML parsing
-        if "text/html" in content_type:
-            # Visit the target website with Chrome web driver
-            driver.get(url)
-            # Wait for elements to load
-            driver.implicitly_wait(10)
-
-            # Parse page source to BeautifulSoup for Javascript support
-            return BeautifulSoup(driver.page_source, "html.parser"), FileType.HTML
-
-        # PDF parsing
-        elif "application/pdf" in content_type:
-            return r.content, FileType.PDF
-
-        # Word Document parsing
-        elif (
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            in content_type
-        ):
-            return r.content, FileType.DOCX
+            content = read_body(response=r, max_bytes=max_body_size)
 
-        # Excel Document parsing
-        elif (
-            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            in content_type
-            or "application/vnd.ms-excel" in content_type
-        ):
-            print(f"Unsupported content type: {content_type}")
-            return None, FileType.Unsupported
+        return Scraper.parse(
+            url=url,
+            content=content,
+            file_type=file_type,
+            browsers=browsers,
+            render_mode=render_mode,
+        )
 
-        # CSV Document parsing
-        elif "text/csv" in content_type:
-            print(f"Unsupported content type: {content_type}")
-            return None, FileType.Unsupported
+    @staticmethod
+    def parse(
+        url: str,
+        content: bytes,
+        file_type: FileType,
+        browsers: Optional[BrowserPool] = None,
+        render_mode: RenderMode = RenderMode.ALWAYS,
+    ) -> tuple[Union[bytes, BeautifulSoup], FileType]:
+        """Parse the downloaded body of a given URL.
 
-        elif (
-            "application/vnd.openxmlformats-officedocument.presentationml.presentation"
-            in content_type
-        ):
-            print(f"Unsupported content type: {content_type}")
-            return None, FileType.Unsupported
+        Args:
+        url (str): The URL the body was downloaded from.
+        content (bytes): The body of the response.
+        file_type (FileType): The type of the body.
+        browsers (BrowserPool): Optional browser pool to render HTML with.
+        render_mode (RenderMode): When to render HTML pages in the browser.
+
+        Returns:
+        tuple: The scraped content and file type."""
+
+        # HTML parsing
+        if file_type == FileType.HTML:
+            # Use the static response unless it looks like a Javascript shell
+            if render_mode != RenderMode.ALWAYS:
+                page = BeautifulSoup(content, "html.parser")
+                if render_mode == RenderMode.NEVER or not needs_render(page, content):
+                    return page, FileType.HTML
+
+            # Parse rendered page source to BeautifulSoup for Javascript support
+            html = (browsers or browser_pool).render(url)
+            return BeautifulSoup(html, "html.parser"), FileType.HTML
+
+        # Documents, spreadsheets and presentations
+        elif file_type in DOCUMENT_FILE_TYPES:
+            return content, file_type
 
         # Unsupported
         else:
-            print(f"Unsupported content type: {content_type}")
+            print(f"Unsupported file type: {file_type}")
             return None, FileType.Unsupported
 
 
@@ -285,10 +1023,11 @@ if __name__ == "__main__":
     scraper = Scraper(
         collection_name="Colorado ICAP",
         source_url="https://www.cde.state.co.us/postsecondary/icap",
+        render_mode=RenderMode.AUTO,
     )
 
     scraper.start()
 
     # Print number of links and total characters scraped
     print(f"Total links scraped: {len(scraper.links)}")
-    print(f"Total characters scraped: {sum(scraper.links.values())}")
+    print(f"Total characters scraped: {scraper.characters}")
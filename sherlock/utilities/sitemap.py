@@ -0,0 +1,203 @@
+"""Sitemap discovery and parsing used to seed the crawl frontier.
+
+Sitemaps are found through robots.txt and the well-known paths, and may
+be sitemap indexes pointing at further (possibly gzipped) sitemaps."""
+
+import io
+import urllib.robotparser
+import xml.etree.ElementTree as ElementTree
+import zlib
+from collections.abc import Iterator
+from typing import Optional
+from urllib.parse import urljoin
+
+import requests
+
+from sherlock.utilities.download import MAX_BODY_SIZE
+from sherlock.utilities.download import BodyTooLargeError
+from sherlock.utilities.download import read_body
+from sherlock.utilities.politeness import HostScheduler
+
+
+WELL_KNOWN_SITEMAPS = ["/sitemap.xml", "/sitemap_index.xml"]
+
+# Upper bound on sitemap files read for one site, nested indexes included
+MAX_SITEMAPS = 1000
+
+# The sitemap namespace, its legacy Google forms, and none for sites omitting it
+SITEMAP_NAMESPACES = [
+    "http://www.sitemaps.org/schemas/sitemap/0.9",
+    "http://www.google.com/schemas/sitemap/0.84",
+    "http://www.google.com/schemas/sitemap/0.9",
+    "",
+]
+
+
+def sitemap_tag(element: ElementTree.Element) -> Optional[str]:
+    """Get the local name of a sitemap element, None if from an extension.
+
+    Image, news and video extensions nest their own loc elements, which
+    must not be taken for the page URL.
+    """
+    namespace, _, tag = element.tag.rpartition("}")
+    return tag if namespace.lstrip("{") in SITEMAP_NAMESPACES else None
+
+
+def discover_sitemaps(
+    base_url: str,
+    robots: Optional[urllib.robotparser.RobotFileParser] = None,
+) -> list[str]:
+    """List the sitemaps a site may publish.
+
+    Args:
+    base_url (str): The URL of the site.
+    robots (RobotFileParser): Optional robots.txt rules of the site.
+
+    Returns:
+    list: The sitemap URLs from robots.txt followed by the well-known ones.
+    """
+    sitemaps = list(robots.site_maps() or []) if robots is not None else []
+
+    for path in WELL_KNOWN_SITEMAPS:
+        sitemap = urljoin(base_url, path)
+        if sitemap not in sitemaps:
+            sitemaps.append(sitemap)
+
+    return sitemaps
+
+
+def gunzip(content: bytes, max_bytes: int) -> bytes:
+    """Decompress a gzipped sitemap without exceeding max_bytes.
+
+    Args:
+    content (bytes): The gzipped content.
+    max_bytes (int): The maximum allowed size once decompressed.
+
+    Returns:
+    bytes: The decompressed content.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    content = decompressor.decompress(content, max_bytes)
+    if decompressor.unconsumed_tail:
+        raise BodyTooLargeError(f"Sitemap exceeds {max_bytes} bytes decompressed.")
+    return content
+
+
+def fetch_sitemap(
+    url: str,
+    session: Optional[requests.Session] = None,
+    scheduler: Optional[HostScheduler] = None,
+    max_bytes: int = MAX_BODY_SIZE,
+) -> Optional[bytes]:
+    """Fetch a sitemap, decompressing it if it is gzipped.
+
+    Args:
+    url (str): The URL of the sitemap.
+    session (requests.Session): Optional pooled session to fetch with.
+    scheduler (HostScheduler): Optional scheduler to keep the fetch polite.
+    max_bytes (int): The maximum size of the sitemap.
+
+    Returns:
+    bytes: The sitemap XML, or None if it could not be fetched.
+    """
+
+    def fetch() -> requests.Response:
+        return (session or requests).get(url, timeout=10, stream=True)
+
+    try:
+        request = scheduler.request(url=url, fetch=fetch) if scheduler else fetch()
+        with request as response:
+            if response.status_code != 200:
+                return None
+            content = read_body(response=response, max_bytes=max_bytes)
+
+        # Gzip magic number, whatever the extension or content type says
+        if content[:2] == b"\x1f\x8b":
+            content = gunzip(content, max_bytes=max_bytes)
+    except (requests.RequestException, zlib.error, BodyTooLargeError) as e:
+        print(f"Failed to fetch sitemap {url}: {e}")
+        return None
+
+    return content
+
+
+def parse_sitemap(
+    content: bytes,
+) -> tuple[list[str], list[tuple[str, Optional[str]]]]:
+    """Parse a sitemap or sitemap index.
+
+    Args:
+    content (bytes): The sitemap XML.
+
+    Returns:
+    tuple: The nested sitemap URLs, and the page URLs with their lastmod.
+    """
+    sitemaps, pages = [], []
+
+    try:
+        for _, element in ElementTree.iterparse(io.BytesIO(content)):
+            tag = sitemap_tag(element)
+            if tag not in ["url", "sitemap"]:
+                continue
+
+            # Only the direct children describe the page or sitemap
+            loc, lastmod = None, None
+            for child in element:
+                child_tag = sitemap_tag(child)
+                if child_tag == "loc":
+                    loc = (child.text or "").strip()
+                elif child_tag == "lastmod":
+                    lastmod = (child.text or "").strip() or None
+
+            if loc:
+                if tag == "sitemap":
+                    sitemaps.append(loc)
+                else:
+                    pages.append((loc, lastmod))
+            element.clear()
+    except ElementTree.ParseError as e:
+        print(f"Failed to parse sitemap: {e}")
+
+    return sitemaps, pages
+
+
+def read_sitemaps(
+    sitemap_urls: list[str],
+    session: Optional[requests.Session] = None,
+    scheduler: Optional[HostScheduler] = None,
+    max_bytes: int = MAX_BODY_SIZE,
+    max_sitemaps: int = MAX_SITEMAPS,
+) -> Iterator[tuple[str, Optional[str]]]:
+    """Read every page listed by a set of sitemaps, following indexes.
+
+    Args:
+    sitemap_urls (list): The sitemaps to start from.
+    session (requests.Session): Optional pooled session to fetch with.
+    scheduler (HostScheduler): Optional scheduler to keep the fetches polite.
+    max_bytes (int): The maximum size of a single sitemap.
+    max_sitemaps (int): The maximum number of sitemaps to read.
+
+    Returns:
+    Iterator: The page URLs and their lastmod values.
+    """
+    pending = list(reversed(sitemap_urls))
+    seen = set()
+
+    while pending and len(seen) < max_sitemaps:
+        sitemap_url = pending.pop()
+        if sitemap_url in seen:
+            continue
+        seen.add(sitemap_url)
+
+        content = fetch_sitemap(
+            url=sitemap_url,
+            session=session,
+            scheduler=scheduler,
+            max_bytes=max_bytes,
+        )
+        if content is None:
+            continue
+
+        sitemaps, pages = parse_sitemap(content)
+        pending.extend(reversed(sitemaps))
+        yield from pages
@@ -1,7 +1,12 @@
 """Writer utility functions."""
 
+import hashlib
 import os
 import re
+from collections.abc import Callable
+from collections.abc import Iterable
+from enum import Enum
+from typing import Optional
 from typing import Union
 
 from sherlock.utilities.file_type import FileType
@@ -53,6 +58,80 @@ def path_to_valid_name(name: str) -> str:
 
 ROOT_PATH = "web_docs"
 
+# Longest directory or file name written, well within filesystem limits
+MAX_NAME_LENGTH = 150
+
+
+class OutputFormat(str, Enum):
+    """How scraped pages are stored."""
+
+    # One markdown file per page under web_docs
+    FILES = "files"
+    # Compressed shard files with an offset index, see ShardedCorpus
+    SHARDS = "shards"
+
+
+FILE_EXTENSIONS = {
+    FileType.HTML: "md",
+    FileType.DOCX: "docx",
+    FileType.PDF: "pdf",
+    FileType.XLSX: "xlsx",
+    FileType.CSV: "csv",
+    FileType.PPTX: "pptx",
+}
+
+
+def short_name(name: str) -> str:
+    """Shorten a name too long for the filesystem, keeping it unique."""
+    if len(name) <= MAX_NAME_LENGTH:
+        return name
+    digest = hashlib.sha256(name.encode("utf-8")).hexdigest()[:8]
+    return f"{name[:MAX_NAME_LENGTH - 9]}_{digest}"
+
+
+def get_collection_path(collection_name: str) -> str:
+    """Get the directory the files of a collection are written to.
+
+    Args:
+        collection_name (str): The name of the collection.
+
+    Returns:
+        str: The path of the collection directory.
+    """
+    return ROOT_PATH + S + path_to_valid_name(remove_prefix(collection_name))
+
+
+def get_file_path(collection_name: str, url: str, file_type: FileType) -> str:
+    """Get the path a URL is written to within its collection.
+
+    Args:
+        collection_name (str): The name of the collection.
+        url (str): The URL of the website.
+        file_type (FileType): The type of file to write.
+
+    Returns:
+        str: The path of the output file.
+    """
+    if file_type not in FILE_EXTENSIONS:
+        raise ValueError(f"Invalid file type: {file_type}")
+
+    url = remove_prefix(url)
+    landing_path = get_collection_path(collection_name)
+
+    # Mirror the URL path below the host, so /a/index and /b/index differ
+    url_path, _, query = url.partition("?")
+    names = [path_to_valid_name(name) for name in url_path.split("/")[1:]]
+    names = [name for name in names if name not in ["", ".", ".."]]
+    file_name = names.pop() if names else "index"
+
+    # Pages differing only by their query string, such as ?page=2
+    if query:
+        file_name += "_" + hashlib.sha256(query.encode("utf-8")).hexdigest()[:8]
+
+    names = [short_name(name) for name in names + [file_name]]
+
+    return f"{S.join([landing_path] + names)}.{FILE_EXTENSIONS[file_type]}"
+
 
 def write_file(
     collection_name: str,
@@ -73,35 +152,83 @@ def write_file(
     Returns:
         int: The number of characters written to the file.
     """
-    if not os.path.exists(ROOT_PATH):
-        os.makedirs(ROOT_PATH)
-
-    url = remove_prefix(url)
-    collection_name = remove_prefix(collection_name)
-    collection_name = path_to_valid_name(collection_name)
-
-    landing_path = ROOT_PATH + S + collection_name
+    file_path = get_file_path(
+        collection_name=collection_name,
+        url=url,
+        file_type=file_type,
+    )
 
+    landing_path = os.path.dirname(file_path)
     if not os.path.exists(landing_path):
-        os.makedirs(landing_path)
-
-    url_split = url.split("/")
+        os.makedirs(landing_path, exist_ok=True)
 
     if file_type == FileType.HTML:
-        file_path = f"{landing_path}{S}{path_to_valid_name(url_split[-1])}.md"
         with open(file_path, "w", encoding="utf-8") as f:
             f.write(content)
-    elif file_type == FileType.DOCX:
-        file_path = f"{landing_path}{S}{path_to_valid_name(url_split[-1])}.docx"
-        with open(file_path, "wb") as f:
-            f.write(content)
-    elif file_type == FileType.PDF:
-        file_path = f"{landing_path}{S}{path_to_valid_name(url_split[-1])}.pdf"
+    else:
         with open(file_path, "wb") as f:
             f.write(content)
-    else:
-        raise ValueError(f"Invalid file type: {file_type}")
 
+    url = remove_prefix(url)
     print(f"Scraped: {url} ({file_type} - {len(content)} characters - Depth: {depth})")
 
     return len(content)
+
+
+def stream_file(
+    collection_name: str,
+    url: str,
+    chunks: Iterable[bytes],
+    file_type: FileType,
+    depth: int,
+    discard: Optional[Callable[[], bool]] = None,
+) -> Optional[int]:
+    """Stream binary content to a file chunk by chunk.
+
+    The chunks are written to a temporary file which is moved into place
+    once complete, so a failed download never leaves a partial file behind.
+
+    Args:
+        collection_name (str): The name of the collection.
+        url (str): The URL of the website.
+        chunks (Iterable[bytes]): The content to write to the file.
+        file_type (FileType): The type of file to write.
+        depth (int): The depth of the URL.
+        discard (Callable): Optional check run once every chunk is written.
+            When it returns True the download is thrown away and any
+            existing file is left untouched.
+
+    Returns:
+        int: The number of bytes written to the file, or None if discarded.
+    """
+    file_path = get_file_path(
+        collection_name=collection_name,
+        url=url,
+        file_type=file_type,
+    )
+    part_path = f"{file_path}.part"
+
+    landing_path = os.path.dirname(file_path)
+    if not os.path.exists(landing_path):
+        os.makedirs(landing_path, exist_ok=True)
+
+    size = 0
+    try:
+        with open(part_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(part_path)
+        raise
+
+    if discard is not None and discard():
+        os.remove(part_path)
+        return None
+
+    os.replace(part_path, file_path)
+
+    url = remove_prefix(url)
+    print(f"Scraped: {url} ({file_type} - {size} characters - Depth: {depth})")
+
+    return size
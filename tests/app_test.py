@@ -1,8 +1,20 @@
 """Application test for the fastapi app"""
 
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
 from fastapi.testclient import TestClient
 
 from sherlock.app import app
+from sherlock.app import get_job_manager
+from sherlock.app import get_query_service
+from sherlock.utilities import jobs as jobs_module
+from sherlock.utilities.jobs import JobManager
+from sherlock.utilities.writer import get_collection_path
 
 
 def test_home():
@@ -11,3 +23,166 @@ def test_home():
     response = client.get("/")
     assert response.status_code == 200
     assert response.json() == "Hello, World!"
+
+
+class FakeQueryService:
+    """Stands in for the QueryService, answering without an LLM."""
+
+    async def query_async(self, prompt, collection_name="default"):
+        for chunk in [{"response": "Charles "}, {"response": f"{collection_name}"}]:
+            yield chunk
+
+
+def test_query_streams_server_sent_events():
+    """The answer streams as server-sent events with latency reported."""
+    app.dependency_overrides[get_query_service] = FakeQueryService
+    try:
+        client = TestClient(app)
+        response = client.post(
+            "/query",
+            json={"prompt": "What is my dog's name?", "collection_name": "pets"},
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert float(response.headers["x-time-to-first-token"]) >= 0
+
+    events = [event for event in response.text.split("\n\n") if event]
+    assert events[0] == 'data: {"response": "Charles "}'
+    assert events[1] == 'data: {"response": "pets"}'
+    assert events[2].startswith("event: done\ndata: ")
+    assert "total_latency" in events[2]
+
+
+class FakeIngestService:
+    """Counts the chunks of ingested pages instead of embedding them."""
+
+    max_tokens = 200
+    overlap_tokens = 40
+
+    def __init__(self):
+        self.ollama = SimpleNamespace(persist_directory=None)
+
+    def add_chunks(self, chunks, collection_name: str) -> int:
+        return len(list(chunks))
+
+    def remove_document(self, path: str) -> int:
+        return 0
+
+
+class StubScraper:
+    """Writes one page, then crawls until released or stopped."""
+
+    release = threading.Event()
+
+    def __init__(self, source_url: str, collection_name: str, on_page, **kwargs):
+        self.source_url = source_url
+        self.collection_name = collection_name
+        self.on_page = on_page
+        self.pages = 0
+        self.characters = 0
+        self.queued = 1
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def start(self):
+        directory = get_collection_path(self.collection_name)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "index.md")
+        text = "# Home\n\nWelcome to the site.\n"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        self.pages, self.characters = 1, len(text)
+        self.on_page(self.source_url, path)
+
+        while not self._stopped.is_set() and not StubScraper.release.wait(0.01):
+            pass
+        self.queued = 0
+
+
+@pytest.fixture()
+def job_client(tmp_path, monkeypatch):
+    """Serve the /jobs endpoints with crawls run by the stub scraper."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(jobs_module, "Scraper", StubScraper)
+    StubScraper.release.clear()
+    manager = JobManager(max_workers=1, service_factory=FakeIngestService)
+    app.dependency_overrides[get_job_manager] = lambda: manager
+    try:
+        yield TestClient(app)
+    finally:
+        StubScraper.release.set()
+        app.dependency_overrides.clear()
+        manager.shutdown()
+
+
+def submit(client: TestClient) -> str:
+    """Submit a crawl of the stub site and return the id of its job."""
+    response = client.post(
+        "/jobs",
+        json={"source_url": "https://example.com", "collection_name": "example"},
+    )
+    assert response.status_code == 202
+    assert response.json()["status"] in ["queued", "running"]
+    return response.json()["job_id"]
+
+
+def events(client: TestClient, job_id: str) -> list[tuple[str, dict]]:
+    """Read the progress events of a job until it ends."""
+    response = client.get(f"/jobs/{job_id}/events", params={"interval": 0.01})
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    parsed = []
+    for event in response.text.split("\n\n"):
+        if event:
+            name, _, data = event.rpartition("data: ")
+            parsed.append((name.removeprefix("event: ").strip(), json.loads(data)))
+    return parsed
+
+
+def test_job_streams_its_progress_until_done(job_client):
+    """A job reports its pages while running and ends with a done event."""
+    job_id = submit(job_client)
+
+    # Running until released, with the written page ingested
+    deadline = time.monotonic() + 10
+    while job_client.get(f"/jobs/{job_id}").json()["pages_ingested"] < 1:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    progress = job_client.get(f"/jobs/{job_id}").json()
+    assert progress["status"] == "running"
+    assert progress["pages"] == 1
+    assert progress["characters"] == len("# Home\n\nWelcome to the site.\n")
+
+    StubScraper.release.set()
+    streamed = events(job_client, job_id)
+
+    assert streamed[-1][0] == "done"
+    assert streamed[-1][1]["status"] == "completed"
+    assert streamed[-1][1]["chunks"] >= 1
+    assert all(name == "" for name, _ in streamed[:-1])
+    assert [job["job_id"] for job in job_client.get("/jobs").json()] == [job_id]
+
+
+def test_job_can_be_cancelled(job_client):
+    """Cancelling stops the crawl, the stream ends with the cancelled status."""
+    job_id = submit(job_client)
+
+    response = job_client.post(f"/jobs/{job_id}/cancel")
+    assert response.status_code == 202
+
+    streamed = events(job_client, job_id)
+    assert streamed[-1][0] == "done"
+    assert streamed[-1][1]["status"] == "cancelled"
+    assert job_client.get(f"/jobs/{job_id}").json()["status"] == "cancelled"
+
+
+def test_unknown_job_is_not_found(job_client):
+    """Every job endpoint answers 404 for an unknown id."""
+    assert job_client.get("/jobs/unknown").status_code == 404
+    assert job_client.get("/jobs/unknown/events").status_code == 404
+    assert job_client.post("/jobs/unknown/cancel").status_code == 404
@@ -0,0 +1,40 @@
+"""Test the answer cache."""
+
+from sherlock.utilities.answer_cache import AnswerCache
+from sherlock.utilities.file_type import print_from_stream
+
+
+def test_answer_is_replayed_until_collection_changes():
+    """Answers are keyed by collection and prompt and tied to a version."""
+    cache = AnswerCache()
+    stream = iter([{"response": "Charles "}, {"response": "Barkley"}])
+
+    recorded = cache.record(stream, collection="pets", prompt="Dog name?", version=1)
+    assert print_from_stream(recorded, key="response") == "Charles Barkley"
+
+    cached = cache.get(collection="pets", prompt="  dog NAME? ", version=1)
+    assert print_from_stream(AnswerCache.replay(cached), key="response") == (
+        "Charles Barkley"
+    )
+    assert cache.get(collection="other", prompt="Dog name?", version=1) is None
+    assert cache.get(collection="pets", prompt="Dog name?", version=2) is None
+
+
+def test_lru_ttl_and_similarity():
+    """Old entries are evicted, expire, and similar prompts can share answers."""
+    cache = AnswerCache(max_entries=2, similarity_threshold=0.95)
+    cache.put(collection="c", prompt="a", response="A", version=0, embedding=[1, 0])
+    cache.put(collection="c", prompt="b", response="B", version=0, embedding=[0, 1])
+    cache.get(collection="c", prompt="a", version=0)
+    cache.put(collection="c", prompt="c", response="C", version=0)
+
+    assert cache.get(collection="c", prompt="b", version=0) is None
+    assert (
+        cache.get(collection="c", prompt="x", version=0, embedding=[0.99, 0.05]) == "A"
+    )
+    assert (
+        cache.get(collection="c", prompt="y", version=0, embedding=[0.5, 0.5]) is None
+    )
+
+    cache.ttl = 0
+    assert cache.get(collection="c", prompt="a", version=0) is None
@@ -0,0 +1,83 @@
+"""Test the async LLM client."""
+
+import asyncio
+
+import pytest
+
+from sherlock.utilities.async_llm import AsyncOllamaClient
+from sherlock.utilities.embedding_cache import EmbeddingCache
+from sherlock.utilities.retrieval import Candidate
+
+
+class FakeAsyncClient:
+    """Async Ollama client recording its embed batches and their concurrency."""
+
+    def __init__(self):
+        self.batches: list[list[str]] = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def embed(self, model: str, input: list[str]) -> dict:
+        self.batches.append(list(input))
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return {"embeddings": [[float(len(text)), 1.0] for text in input]}
+
+    async def generate(self, model: str, prompt: str, stream: bool):
+        async def chunks():
+            for word in ["Charles ", "Barkley"]:
+                yield {"response": word, "prompt": prompt}
+
+        return chunks()
+
+
+@pytest.fixture()
+def async_client(monkeypatch, tmp_path):
+    """An async client with a fake Ollama and a fresh embedding cache."""
+    client = AsyncOllamaClient(max_concurrency=2)
+    monkeypatch.setattr(client, "ollama", FakeAsyncClient())
+    monkeypatch.setattr(client.client, "embed_max_batch_size", 4)
+    monkeypatch.setattr(
+        client.client,
+        "embedding_cache",
+        EmbeddingCache(path=str(tmp_path / "embeddings.sqlite")),
+    )
+    yield client
+    client.client.embedding_cache.close()
+
+
+def test_embed_batch_fans_out_within_the_limit(async_client):
+    """Missing texts go out in batches, at most max_concurrency at once."""
+    prompts = [f"text {'x' * n}" for n in range(10)]
+
+    embeddings = asyncio.run(async_client.embed_batch(prompts))
+
+    assert embeddings == [[float(len(prompt)), 1.0] for prompt in prompts]
+    assert [len(batch) for batch in async_client.ollama.batches] == [4, 4, 2]
+    assert async_client.ollama.peak == 2
+
+    # Cached now, and shared with the synchronous client
+    asyncio.run(async_client.embed_batch(prompts[:5]))
+    assert len(async_client.ollama.batches) == 3
+    assert async_client.client.embedding_cache.get("all-minilm", prompts[0])
+
+
+def test_prompt_from_context_streams_the_answer(async_client, monkeypatch):
+    """The answer streams from the fake client with the retrieved context."""
+    candidate = Candidate(text="My dog is charles barkley.", distance=0.1)
+    monkeypatch.setattr(async_client.client, "search", lambda **kwargs: [candidate])
+
+    async def answer() -> list[dict]:
+        return [
+            chunk
+            async for chunk in async_client.prompt_from_context(
+                prompt="What is my dog's name?",
+            )
+        ]
+
+    chunks = asyncio.run(answer())
+
+    assert "".join(chunk["response"] for chunk in chunks) == "Charles Barkley"
+    assert "My dog is charles barkley." in chunks[0]["prompt"]
@@ -0,0 +1,37 @@
+"""Test the micro batcher."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sherlock.utilities.batcher import MicroBatcher
+
+
+def test_concurrent_calls_are_coalesced():
+    """Concurrent callers share batches and each get their own result."""
+    calls = []
+
+    def square_all(items: list[int]) -> list[int]:
+        calls.append(len(items))
+        return [item * item for item in items]
+
+    batcher = MicroBatcher(square_all, max_batch_size=8, max_wait=0.05)
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(batcher, range(32)))
+    batcher.close()
+
+    assert results == [item * item for item in range(32)]
+    assert max(calls) <= 8
+    assert len(calls) < 32
+
+
+def test_errors_reach_every_caller():
+    """A failing batch raises in the caller of each of its items."""
+
+    def fail(items: list[int]) -> list[int]:
+        raise RuntimeError("model unavailable")
+
+    batcher = MicroBatcher(fail, max_wait=0)
+    with pytest.raises(RuntimeError, match="model unavailable"):
+        batcher(1)
+    batcher.close()
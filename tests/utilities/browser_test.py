@@ -0,0 +1,38 @@
+"""Test the headless browser helpers."""
+
+from bs4 import BeautifulSoup
+
+from sherlock.utilities.browser import needs_render
+
+
+def parse(html: str) -> tuple[BeautifulSoup, str]:
+    """Parse HTML into the arguments of needs_render."""
+    return BeautifulSoup(html, "html.parser"), html
+
+
+def test_static_page_is_not_rendered():
+    """A page with plenty of visible text is used as is."""
+    html = (
+        "<html><body><h1>Title</h1><p>"
+        + "Some real content. " * 20
+        + "</p></body></html>"
+    )
+    assert not needs_render(*parse(html))
+
+
+def test_empty_body_is_rendered():
+    """A page without visible text needs the browser."""
+    html = "<html><body><script src='bundle.js'></script></body></html>"
+    assert needs_render(*parse(html))
+
+
+def test_spa_root_is_rendered():
+    """An empty single page app mount point needs the browser."""
+    html = "<html><body><p>Loading site</p><div id='root'></div></body></html>"
+    assert needs_render(*parse(html))
+
+
+def test_low_text_ratio_is_rendered():
+    """A page which is almost entirely markup needs the browser."""
+    html = "<html><body><p>Hi</p>" + "<div class='x'></div>" * 500 + "</body></html>"
+    assert needs_render(*parse(html))
@@ -0,0 +1,72 @@
+"""Test the markdown chunker."""
+
+from sherlock.utilities.chunker import chunk_lines
+from sherlock.utilities.chunker import count_tokens
+from sherlock.utilities.metadata import Metadata
+
+
+def test_chunks_are_bounded_overlapping_and_offset():
+    """Chunks respect max_tokens, overlap and point back into the source."""
+    document = "# Guide\n\n" + "\n\n".join(
+        f"Paragraph {i} " + "word " * 20 for i in range(10)
+    )
+
+    chunks = list(
+        chunk_lines(
+            document.splitlines(keepends=True),
+            path="guide.md",
+            max_tokens=50,
+            overlap_tokens=25,
+        ),
+    )
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.tokens <= 50
+        start, end = chunk.start, chunk.end
+        assert document[start:end] == chunk.text
+        assert chunk.heading == "Guide"
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.start < previous.end
+    assert chunks[-1].text.endswith("Paragraph 9 " + "word " * 19 + "word")
+
+
+def test_long_paragraphs_overlap_by_their_last_tokens():
+    """Paragraphs longer than the overlap, and their split pieces, overlap too."""
+    document = "\n\n".join(" ".join(f"p{i}w{j}" for j in range(60)) for i in range(5))
+
+    chunks = list(
+        chunk_lines(
+            document.splitlines(keepends=True),
+            max_tokens=50,
+            overlap_tokens=10,
+        ),
+    )
+
+    assert len(chunks) > 5
+    for chunk in chunks:
+        assert chunk.tokens <= 50
+        start, end = chunk.start, chunk.end
+        assert document[start:end] == chunk.text
+    for previous, chunk in zip(chunks, chunks[1:]):
+        start, end = chunk.start, previous.end
+        assert count_tokens(document[start:end]) == 10
+
+
+def test_metadata_header_sets_source():
+    """The metadata header is not chunked and provides the source URL."""
+    header = Metadata(
+        title="page",
+        source="https://example.com/page",
+        file_type="Web Page (HTML)",
+        retrieved_date="2024-01-01",
+    ).to_markdown()
+    document = header + "## Section\n\nSome text about the page.\n"
+
+    chunks = list(chunk_lines(document.splitlines(keepends=True), path="page.md"))
+
+    assert len(chunks) == 1
+    assert chunks[0].source == "https://example.com/page"
+    assert chunks[0].text == "## Section\n\nSome text about the page."
+    start, end = chunks[0].start, chunks[0].end
+    assert document[start:end] == chunks[0].text
@@ -0,0 +1,61 @@
+"""Test the sharded corpus."""
+
+import os
+
+from sherlock.utilities.corpus import ShardedCorpus
+from sherlock.utilities.file_type import FileType
+from sherlock.utilities.metadata import Metadata
+
+
+def append_page(corpus: ShardedCorpus, name: str, content: str):
+    """Append a page named after its URL."""
+    url = f"https://example.com/{name}"
+    corpus.append(
+        url=url,
+        path=f"web_docs{os.sep}example{os.sep}{name}.md",
+        metadata=Metadata(
+            title=name,
+            source=url,
+            file_type=FileType.HTML,
+            retrieved_date="2024-01-01",
+        ),
+        content=content,
+    )
+
+
+def test_records_are_replaced_removed_and_compacted(tmp_path, monkeypatch):
+    """Only the latest record of each path is read, before and after compaction."""
+    monkeypatch.chdir(tmp_path)
+    corpus = ShardedCorpus(collection_name="example", max_shard_bytes=200)
+    for page in range(10):
+        append_page(corpus, f"page-{page}", f"# Page {page}\n\nSome text {page}.\n")
+    append_page(corpus, "page-0", "# Page 0\n\nUpdated.\n")
+    corpus.remove(f"web_docs{os.sep}example{os.sep}page-1.md")
+
+    assert len(corpus.shards()) > 1
+    assert corpus.get(f"web_docs{os.sep}example{os.sep}page-0.md").content.endswith(
+        "Updated.\n",
+    )
+    before = [record.url for record in corpus.records()]
+    assert len(before) == 9
+    assert corpus.garbage_ratio() > 0
+
+    corpus.compact()
+
+    assert [record.url for record in corpus.records()] == before
+    assert corpus.garbage_ratio() == 0
+    corpus.close()
+
+
+def test_export_writes_one_file_per_page(tmp_path, monkeypatch):
+    """The export has the metadata header of files written directly."""
+    monkeypatch.chdir(tmp_path)
+    corpus = ShardedCorpus(collection_name="example")
+    append_page(corpus, "about", "# About\n\nWho we are.\n")
+
+    assert corpus.export(directory="export") == 1
+    with open(os.path.join("export", "example", "about.md"), encoding="utf-8") as f:
+        text = f.read()
+    assert text.startswith("# Metadata for this file:")
+    assert text.endswith("# About\n\nWho we are.\n")
+    corpus.close()
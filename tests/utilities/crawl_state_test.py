@@ -0,0 +1,85 @@
+"""Test the persisted crawl manifest."""
+
+import pytest
+
+from sherlock.utilities.crawl_state import CrawlManifest
+from sherlock.utilities.crawl_state import ManifestEntry
+
+
+def entry(url: str, content_hash: str = "hash", **kwargs) -> ManifestEntry:
+    """Build a manifest entry for a page written under its last path segment."""
+    fields = {
+        "url": url,
+        "etag": None,
+        "last_modified": None,
+        "content_hash": content_hash,
+        "depth": 1,
+        "output_path": f"web_docs/{url.rsplit('/', 1)[-1]}",
+        "size": 100,
+        "sublinks": [],
+    }
+    return ManifestEntry(**{**fields, **kwargs})
+
+
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    """Keep the crawl state of each test in a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+
+
+def test_record_and_incremental_rerun():
+    """A rerun keeps unchanged pages and forgets the ones it did not see."""
+    manifest = CrawlManifest("site")
+    assert manifest.record(entry("https://example.com/a", etag='"v1"')) == "new"
+    assert manifest.record(entry("https://example.com/b")) == "new"
+    assert manifest.record(entry("https://example.com/c")) == "new"
+    manifest.finish()
+    manifest.close()
+
+    manifest = CrawlManifest("site")
+    recorded = manifest.get("https://example.com/a")
+    assert recorded.conditional_headers() == {"If-None-Match": '"v1"'}
+
+    manifest.mark_unchanged("https://example.com/a", depth=0, lastmod="2024-05-01")
+    assert manifest.record(entry("https://example.com/b", "new hash")) == "changed"
+
+    assert manifest.remove_unseen() == ["web_docs/c"]
+    assert manifest.get("https://example.com/c") is None
+    assert manifest.get("https://example.com/a").depth == 0
+    assert manifest.get("https://example.com/a").lastmod == "2024-05-01"
+    assert manifest.summary == {"new": 0, "changed": 1, "unchanged": 1, "deleted": 1}
+    assert manifest.links() == {
+        "https://example.com/a": "web_docs/a",
+        "https://example.com/b": "web_docs/b",
+    }
+
+
+def test_output_shared_with_a_seen_page_is_kept():
+    """An output path still written by a page of this run is not reported."""
+    manifest = CrawlManifest("site")
+    manifest.record(entry("https://example.com/a", output_path="web_docs/a"))
+    manifest.record(entry("https://example.com/a/", output_path="web_docs/a"))
+    manifest.finish()
+
+    manifest = CrawlManifest("site")
+    manifest.mark_unchanged("https://example.com/a", depth=1)
+
+    assert manifest.remove_unseen() == []
+
+
+def test_resume_adopts_the_unfinished_run():
+    """Only an unfinished run is resumed, with the pages it recorded."""
+    manifest = CrawlManifest("site")
+    manifest.record(entry("https://example.com/a", sublinks=["https://example.com/b"]))
+    manifest.close()
+
+    resumed = CrawlManifest("site", resume=True)
+    assert resumed.resumed
+    assert resumed.run_id == manifest.run_id
+    assert [page.url for page in resumed.visited()] == ["https://example.com/a"]
+    assert resumed.visited()[0].sublinks == ["https://example.com/b"]
+    resumed.finish()
+
+    restarted = CrawlManifest("site", resume=True)
+    assert not restarted.resumed
+    assert restarted.visited() == []
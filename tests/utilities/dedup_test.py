@@ -0,0 +1,51 @@
+"""Test the duplicate detection."""
+
+import random
+
+from sherlock.utilities.dedup import DuplicateIndex
+
+
+def article(seed: int, words: int = 300) -> str:
+    """Generate a page of text drawn from a small vocabulary."""
+    rng = random.Random(seed)
+    return " ".join(f"word{rng.randrange(500)}" for _ in range(words))
+
+
+ARTICLE = article(seed=0)
+
+
+def test_exact_and_near_copies_are_found():
+    """Copies differing by whitespace, case or a word map to the first URL."""
+    index = DuplicateIndex()
+
+    assert index.check("https://example.com/article", ARTICLE) is None
+    assert (
+        index.check("https://example.com/article?print=1", f"  {ARTICLE.upper()}\n")
+        == "https://example.com/article"
+    )
+    assert (
+        index.check("https://example.com/fr/article", ARTICLE + " translated")
+        == "https://example.com/article"
+    )
+
+
+def test_different_and_short_pages_are_kept():
+    """Unrelated pages and short pages which are not exact copies are new."""
+    index = DuplicateIndex()
+
+    assert index.check("https://example.com/article", ARTICLE) is None
+    assert index.check("https://example.com/budget", article(seed=1)) is None
+    assert index.check("https://example.com/a", "Contact us") is None
+    assert index.check("https://example.com/b", "Contact them") is None
+
+
+def test_recorded_fingerprints_find_copies():
+    """A page remembered from its hash and fingerprint still catches copies."""
+    recorded = DuplicateIndex().fingerprint(ARTICLE)
+    index = DuplicateIndex()
+
+    assert index.check_fingerprint("https://example.com/article", *recorded) is None
+    assert (
+        index.check("https://example.com/fr/article", ARTICLE + " translated")
+        == "https://example.com/article"
+    )
@@ -0,0 +1,145 @@
+"""Test the document extraction."""
+
+import os
+
+import docx
+import openpyxl
+import pptx
+
+from sherlock.utilities.chunker import chunk_file
+from sherlock.utilities.chunker import read_blocks
+from sherlock.utilities.documents import DocumentExtractor
+from sherlock.utilities.documents import convert_document
+from sherlock.utilities.file_type import FileType
+from sherlock.utilities.metadata import Metadata
+
+
+def write_docx(path: str):
+    """Write a small Word document with a heading, text and a table."""
+    document = docx.Document()
+    document.add_heading("Enrollment", level=1)
+    document.add_paragraph("Students apply in the spring.")
+    table = document.add_table(rows=2, cols=2)
+    for row, values in zip(table.rows, [("Term", "Deadline"), ("Fall", "May 1")]):
+        for cell, value in zip(row.cells, values):
+            cell.text = value
+    document.save(path)
+
+
+def test_docx_is_converted_to_markdown_with_metadata(tmp_path):
+    """The markdown starts with the metadata header and keeps the structure."""
+    path = str(tmp_path / "guide.docx")
+    write_docx(path)
+
+    output_path = convert_document(path, source="https://example.com/guide.docx")
+
+    assert output_path == path + ".md"
+    with open(output_path, encoding="utf-8") as f:
+        lines = f.readlines()
+    metadata = {}
+    blocks = list(read_blocks(lines, metadata))
+    text = "".join(block.text for block in blocks)
+
+    assert metadata["source"] == "https://example.com/guide.docx"
+    assert "## Enrollment" in text
+    assert "Students apply in the spring." in text
+    assert "| Fall | May 1 |" in text
+
+
+def test_spreadsheet_is_split_into_row_ranges(tmp_path):
+    """Every chunk of a large sheet is one table with the header repeated."""
+    path = str(tmp_path / "budget.xlsx")
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Budget")
+    sheet.append(["Year", "Department", "Amount"])
+    for row in range(1000):
+        sheet.append([2000 + row % 20, f"Department {row}", row * 1.5])
+    workbook.save(path)
+
+    chunks = list(chunk_file(convert_document(path)))
+
+    assert len(chunks) > 1
+    assert chunks[0].heading.startswith("Budget (rows 2-")
+    assert chunks[-1].heading.endswith("-1001)")
+    assert all("| Year | Department | Amount |" in chunk.text for chunk in chunks)
+    assert all(chunk.tokens <= 200 for chunk in chunks)
+
+
+def test_presentation_is_converted_slide_by_slide(tmp_path):
+    """The text of each slide is kept under its own heading."""
+    path = str(tmp_path / "deck.pptx")
+    presentation = pptx.Presentation()
+    for title in ["Overview", "Timeline"]:
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = title
+    presentation.save(path)
+
+    with open(convert_document(path), encoding="utf-8") as f:
+        text = f.read()
+
+    assert "## Slide 1\n\nOverview" in text
+    assert "## Slide 2\n\nTimeline" in text
+
+
+def test_directory_converts_changed_documents_and_removes_orphans(tmp_path):
+    """Only new documents are converted, markdown of removed ones is deleted."""
+    path = str(tmp_path / "guide.docx")
+    write_docx(path)
+    orphan = str(tmp_path / "removed.pdf.md")
+    with open(orphan, "w", encoding="utf-8") as f:
+        f.write(
+            Metadata(
+                title="removed.pdf",
+                source="https://example.com/removed.pdf",
+                file_type=FileType.PDF,
+                retrieved_date="2024-01-01",
+            ).to_markdown()
+            + "stale",
+        )
+    # A web page whose URL ends in a document extension is not an orphan
+    page = str(tmp_path / "data.csv.md")
+    with open(page, "w", encoding="utf-8") as f:
+        f.write(
+            Metadata(
+                title="Data",
+                source="https://example.com/files/data.csv",
+                file_type=FileType.HTML,
+                retrieved_date="2024-01-01",
+            ).to_markdown()
+            + "A page about the data.",
+        )
+
+    extractor = DocumentExtractor(max_workers=1)
+    assert list(extractor.extract_directory(str(tmp_path))) == [path + ".md"]
+    assert list(extractor.extract_directory(str(tmp_path))) == []
+    extractor.close()
+
+    assert not os.path.exists(orphan)
+    assert os.path.exists(page)
+
+
+def test_directory_conversions_keep_the_document_url(tmp_path):
+    """Documents are tagged with their URL, also when converted again later."""
+    path = str(tmp_path / "guide.docx")
+    write_docx(path)
+    unknown = str(tmp_path / "notes.docx")
+    write_docx(unknown)
+
+    def source(path: str) -> str:
+        metadata = {}
+        with open(path + ".md", encoding="utf-8") as f:
+            list(read_blocks(f, metadata))
+        return metadata["source"]
+
+    extractor = DocumentExtractor(max_workers=1)
+    sources = {os.path.normpath(path): "https://example.com/guide.docx"}
+    list(extractor.extract_directory(str(tmp_path), sources=sources))
+    assert source(path) == "https://example.com/guide.docx"
+    assert source(unknown) == unknown
+
+    # Changed since, and converted without the crawl manifests
+    os.utime(path, (os.path.getmtime(path) + 10, os.path.getmtime(path) + 10))
+    assert list(extractor.extract_directory(str(tmp_path))) == [path + ".md"]
+    extractor.close()
+
+    assert source(path) == "https://example.com/guide.docx"
@@ -0,0 +1,54 @@
+"""Test the streaming download helpers."""
+
+import hashlib
+import io
+
+import pytest
+
+from sherlock.utilities.download import BodyTooLargeError
+from sherlock.utilities.download import iter_body
+from sherlock.utilities.download import read_body
+
+
+class FakeResponse:
+    """Streamed response with a fixed body and optional declared length."""
+
+    def __init__(self, body: bytes, headers: dict = {}):
+        self.url = "https://example.com/file"
+        self.headers = headers
+        self.body = body
+        self.read = 0
+
+    def iter_content(self, chunk_size: int):
+        body = io.BytesIO(self.body)
+        for chunk in iter(lambda: body.read(chunk_size), b""):
+            self.read += len(chunk)
+            yield chunk
+
+
+def test_read_body_within_the_limit():
+    """Bodies up to max_bytes are read whole and can be hashed on the way."""
+    body = b"x" * 200_000
+    hasher = hashlib.sha256()
+
+    assert read_body(FakeResponse(body), max_bytes=len(body)) == body
+    assert b"".join(iter_body(FakeResponse(body), len(body), hasher=hasher)) == body
+    assert hasher.hexdigest() == hashlib.sha256(body).hexdigest()
+
+
+def test_declared_length_over_the_limit_is_rejected_up_front():
+    """A Content-Length over the limit fails before any of the body is read."""
+    response = FakeResponse(b"x" * 10, headers={"content-length": "1000"})
+
+    with pytest.raises(BodyTooLargeError):
+        read_body(response, max_bytes=100)
+    assert response.read == 0
+
+
+def test_body_over_the_limit_stops_the_download():
+    """A body without Content-Length is cut off once it passes the limit."""
+    response = FakeResponse(b"x" * 1_000_000)
+
+    with pytest.raises(BodyTooLargeError):
+        read_body(response, max_bytes=100_000)
+    assert response.read < 1_000_000
@@ -0,0 +1,38 @@
+"""Test the persistent embedding cache."""
+
+import os
+
+from sherlock.utilities.embedding_cache import EmbeddingCache
+
+
+def test_cache_round_trip_and_persists(tmp_path):
+    """Embeddings are keyed by model and text and survive reopening."""
+    path = os.path.join(tmp_path, "embeddings.sqlite")
+    cache = EmbeddingCache(path=path)
+    cache.put(model="all-minilm", text="hello", embedding=[0.25, -1.5, 3.0])
+
+    assert cache.get(model="all-minilm", text="hello") == [0.25, -1.5, 3.0]
+    assert cache.get(model="other", text="hello") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+    cache.close()
+
+    reopened = EmbeddingCache(path=path)
+    assert reopened.get_many(model="all-minilm", texts=["missing", "hello"]) == [
+        None,
+        [0.25, -1.5, 3.0],
+    ]
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Old entries are dropped once the stored vectors outgrow the limit."""
+    cache = EmbeddingCache(
+        path=os.path.join(tmp_path, "embeddings.sqlite"),
+        max_bytes=100,
+        dtype="float16",
+    )
+    for i in range(10):
+        cache.put(model="all-minilm", text=str(i), embedding=[0.5] * 8)
+
+    assert cache.get(model="all-minilm", text="9") == [0.5] * 8
+    assert cache.get(model="all-minilm", text="0") is None
+    assert cache._size <= 100
@@ -0,0 +1,63 @@
+"""Test the single pass HTML extractor."""
+
+from bs4 import BeautifulSoup
+
+from sherlock.utilities.extract import extract_page
+
+
+def test_extract_drops_boilerplate_but_keeps_links():
+    """Navigation text is dropped while its links are still collected."""
+    page = BeautifulSoup(
+        "<html><head><title>T</title></head><body>"
+        "<nav><a href='/menu'>Menu</a></nav>"
+        "<h1>Title</h1><p>Some <b>bold</b> text.</p><script>var x = 1;</script>"
+        "<footer><a href='/about'>About</a></footer>"
+        "</body></html>",
+        "html.parser",
+    )
+
+    text, links = extract_page(page)
+
+    assert text == "# Title\nSome bold text."
+    assert links == ["/menu", "/about"]
+
+
+def test_extract_prefers_main_content():
+    """Only text inside the main element is written out."""
+    page = BeautifulSoup(
+        "<body><div>Sidebar</div><main><p>Content</p>"
+        "<ol><li>One</li><li>Two<ul><li>Nested</li></ul></li></ol></main></body>",
+        "html.parser",
+    )
+
+    text, _ = extract_page(page)
+
+    assert text == "Content\n1. One\n2. Two\n  * Nested"
+
+
+def test_extract_tables():
+    """Table rows are written as pipe separated cells."""
+    page = BeautifulSoup(
+        "<table><tr><th>A</th><th>B</th></tr><tr><td>1</td><td>2</td></tr></table>",
+        "html.parser",
+    )
+
+    text, _ = extract_page(page)
+
+    assert text == "| A | B |\n| 1 | 2 |"
+
+
+def test_extract_keeps_article_headers():
+    """Headers inside the content are kept, the site header is not."""
+    page = BeautifulSoup(
+        "<body><header><a href='/'>Site</a></header><main><article>"
+        "<header><h1>Title</h1><p>By Ada</p></header><p>Text</p>"
+        "<footer>Filed under news</footer></article></main>"
+        "<footer>Copyright</footer></body>",
+        "html.parser",
+    )
+
+    text, links = extract_page(page)
+
+    assert text == "# Title\nBy Ada\nText\nFiled under news"
+    assert links == ["/"]
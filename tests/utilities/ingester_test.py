@@ -0,0 +1,100 @@
+"""Test the incremental ingester."""
+
+import os
+from types import SimpleNamespace
+
+from sherlock.utilities.ingester import IncrementalIngester
+
+
+class FakeService:
+    """Records the files added and removed instead of embedding them."""
+
+    max_tokens = 200
+    overlap_tokens = 40
+
+    def __init__(self):
+        self.ollama = SimpleNamespace(persist_directory=None)
+        self.added: list[tuple[str, str]] = []
+        self.removed: list[str] = []
+
+    def add_chunks(self, chunks, collection_name: str) -> int:
+        chunks = list(chunks)
+        self.added.extend((chunk.path, collection_name) for chunk in chunks)
+        return len(chunks)
+
+    def remove_document(self, path: str) -> int:
+        self.removed.append(path)
+        return 1
+
+
+def write(path: str, text: str, mtime: float):
+    """Write a file with a given modification time."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.utime(path, (mtime, mtime))
+
+
+def test_only_new_changed_and_removed_files_are_ingested(tmp_path):
+    """Unchanged files are skipped and removed files lose their vectors."""
+    site = tmp_path / "site"
+    site.mkdir()
+    first, second = str(site / "first.md"), str(site / "second.md")
+    write(first, "# First\n\nSome text.\n", 1000)
+    write(second, "# Second\n\nMore text.\n", 1000)
+
+    service = FakeService()
+    ingester = IncrementalIngester(service=service, directory=str(tmp_path))
+
+    summary = ingester.scan()
+    assert (summary.added, summary.changed, summary.removed) == (2, 0, 0)
+    assert {collection for _, collection in service.added} == {"site"}
+
+    # Touched but identical content is not embedded again
+    write(first, "# First\n\nSome text.\n", 2000)
+    service.added.clear()
+    assert ingester.scan().unchanged == 2
+    assert service.added == []
+
+    write(first, "# First\n\nOther text.\n", 3000)
+    os.remove(second)
+    summary = ingester.scan()
+    assert (summary.added, summary.changed, summary.removed) == (0, 1, 1)
+    assert {path for path, _ in service.added} == {first}
+    assert sorted(service.removed) == sorted([first, second])
+
+    ingester.close()
+
+
+def test_written_files_share_the_manifest_of_their_directory(tmp_path):
+    """Files ingested as they are written are not embedded again by a scan."""
+    site, other = tmp_path / "site", tmp_path / "other"
+    site.mkdir()
+    other.mkdir()
+    page = str(site / "page.md")
+    write(page, "# Page\n\nSome text.\n", 1000)
+    write(str(other / "kept.md"), "# Kept\n\nMore text.\n", 1000)
+
+    service = FakeService()
+    manifest_path = str(tmp_path / "manifest.sqlite")
+    IncrementalIngester(
+        service=service,
+        directory=str(other),
+        manifest_path=manifest_path,
+    ).scan()
+    ingester = IncrementalIngester(
+        service=service,
+        directory=str(site),
+        collection_name="site",
+        manifest_path=manifest_path,
+    )
+
+    assert ingester.ingest_file(page).added == 1
+    write(page, "# Page\n\nOther text.\n", 2000)
+    assert ingester.ingest_file(page).changed == 1
+
+    # The files of the other directory are not removed by this scan
+    summary = ingester.scan()
+    assert (summary.added, summary.unchanged, summary.removed) == (0, 1, 0)
+    assert service.removed == [page]
+
+    ingester.close()
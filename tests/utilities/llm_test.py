@@ -1,7 +1,12 @@
 """Test the LLM Client."""
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import chromadb as cdb
 import pytest
 
+from sherlock.utilities.embedding_cache import EmbeddingCache
 from sherlock.utilities.file_type import print_from_stream
 from sherlock.utilities.llm import OllamaClient as client
 
@@ -31,6 +36,169 @@ def test_llm_client_list_models():
     assert len(models) >= 0
 
 
+class FakeOllama:
+    """Ollama client embedding each text as its length, recording every batch."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches: list[list[str]] = []
+
+    def embed(self, model: str, input: list[str]) -> dict:
+        self.batches.append(list(input))
+        time.sleep(self.delay)
+        return {"embeddings": [[float(len(text)), 1.0] for text in input]}
+
+
+@pytest.fixture()
+def fake_client(monkeypatch, tmp_path):
+    """The client, embedding through a fake Ollama into a fresh cache."""
+    c = client()
+    monkeypatch.setattr(c, "ollama", FakeOllama(delay=0.05))
+    monkeypatch.setattr(
+        c,
+        "embedding_cache",
+        EmbeddingCache(path=str(tmp_path / "embeddings.sqlite")),
+    )
+    monkeypatch.setattr(c, "batchers", {})
+    yield c
+    c.embedding_cache.close()
+
+
+def test_concurrent_embeddings_are_batched(fake_client):
+    """Concurrent cache misses share embed requests and are counted once."""
+    prompts = [f"prompt {'x' * n}" for n in range(16)]
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        embeddings = list(
+            executor.map(
+                lambda prompt: fake_client.embeddings(prompt, model_name="all-minilm"),
+                prompts,
+            ),
+        )
+
+    assert embeddings == [[float(len(prompt)), 1.0] for prompt in prompts]
+    assert len(fake_client.ollama.batches) < len(prompts)
+    assert sorted(sum(fake_client.ollama.batches, [])) == sorted(prompts)
+    assert fake_client.embedding_cache.stats()["misses"] == len(prompts)
+
+    assert fake_client.embeddings(prompts[0], model_name="all-minilm") == [
+        float(len(prompts[0])),
+        1.0,
+    ]
+    assert fake_client.embedding_cache.stats()["hits"] == 1
+
+
+@pytest.fixture()
+def index_client(fake_client, monkeypatch, tmp_path):
+    """The fake embedding client, storing vectors in an empty index."""
+    monkeypatch.setattr(
+        fake_client,
+        "chromadb",
+        cdb.PersistentClient(path=str(tmp_path / "chroma")),
+    )
+    monkeypatch.setattr(fake_client, "collections", {})
+    monkeypatch.setattr(fake_client, "last_index", {})
+    monkeypatch.setattr(fake_client, "collection_versions", {})
+    yield fake_client
+
+
+def test_add_context_embeds_and_inserts_in_batches(index_client, monkeypatch):
+    """Texts are embedded batch_size per request and inserted in bulk."""
+    monkeypatch.setattr(index_client.chromadb, "get_max_batch_size", lambda: 3)
+    index = index_client.get_index()
+    inserts = []
+    add = index.add
+
+    def record_add(**kwargs):
+        inserts.append(kwargs["ids"])
+        add(**kwargs)
+
+    monkeypatch.setattr(index, "add", record_add)
+
+    texts = [f"text {n}" for n in range(7)]
+    assert index_client.add_context(texts, collection_name="docs", batch_size=4) == 7
+    assert [len(batch) for batch in index_client.ollama.batches] == [4, 3]
+    assert inserts == [["0", "1", "2"], ["3", "4", "5"], ["6"]]
+
+    index_client.add_context([f"more {n}" for n in range(5)], collection_name="docs")
+    assert index_client.last_index["documents"] == 12
+    assert sorted(index.get()["ids"], key=int) == [str(n) for n in range(12)]
+
+
+def test_last_index_survives_a_restart(index_client, tmp_path, monkeypatch):
+    """A reopened store keeps its ids and allocates new ones after the last."""
+    index_client.add_context(
+        [f"text {n}" for n in range(5)],
+        collection_name="docs",
+        metadatas=[{"path": f"page{n % 2}.md"} for n in range(5)],
+    )
+    assert index_client.delete_documents({"path": "page1.md"}) == 2
+
+    # Reopen the store from disk, as after a restart
+    cdb.api.client.SharedSystemClient.clear_system_cache()
+    monkeypatch.setattr(
+        index_client,
+        "chromadb",
+        cdb.PersistentClient(path=str(tmp_path / "chroma")),
+    )
+    monkeypatch.setattr(index_client, "collections", {})
+    monkeypatch.setattr(index_client, "last_index", {})
+
+    index = index_client.get_index()
+    assert index_client.last_index["documents"] == 5
+    assert sorted(index.get()["ids"], key=int) == ["0", "2", "4"]
+
+    index_client.add_context(["text 5"], collection_name="docs")
+    assert sorted(index.get()["ids"], key=int) == ["0", "2", "4", "5"]
+
+
+def test_collection_filter():
+    """One collection, several, or all of them when "default" is asked for."""
+    assert client.collection_filter("pets") == {"collection": "pets"}
+    assert client.collection_filter(["pets", "cars"]) == {
+        "collection": {"$in": ["pets", "cars"]},
+    }
+    assert client.collection_filter("default") is None
+    assert client.collection_filter(["pets", "default"]) is None
+
+
+def test_search_is_restricted_to_collections(index_client):
+    """Searches only return texts of the collections asked for."""
+    for collection in ["pets", "cars", "food"]:
+        index_client.add_context(
+            [f"{collection} {n}" for n in range(3)],
+            collection_name=collection,
+        )
+
+    def collections(collection_name) -> set[str]:
+        candidates = index_client.search(
+            embedding=[6.0, 1.0],
+            collection_name=collection_name,
+            top_k=9,
+        )
+        return {candidate.metadata["collection"] for candidate in candidates}
+
+    assert collections("pets") == {"pets"}
+    assert collections(["pets", "cars"]) == {"pets", "cars"}
+    assert collections("default") == {"pets", "cars", "food"}
+
+
+def test_delete_documents_bumps_collection_versions(index_client):
+    """Deleting texts changes the version of their collection and of "default"."""
+    index_client.add_context(["cat"], collection_name="pets")
+    index_client.add_context(["car"], collection_name="cars")
+    pets = index_client.collection_version("pets")
+    cars = index_client.collection_version("cars")
+    everything = index_client.collection_version("default")
+
+    assert index_client.delete_documents({"collection": "pets"}) == 1
+    assert index_client.collection_version("pets") == pets + 1
+    assert index_client.collection_version("cars") == cars
+    assert index_client.collection_version("default") == everything + 1
+    assert index_client.delete_documents({"collection": "pets"}) == 0
+    assert index_client.collection_version("pets") == pets + 1
+
+
 @pytest.mark.usefixtures("add_models")
 def test_llm_prompt_with_context():
     """Prompts a query with context for the LLM."""
@@ -0,0 +1,121 @@
+"""Test the per host scheduler."""
+
+import email.utils
+import time
+from types import SimpleNamespace
+
+import requests
+
+from sherlock.utilities.politeness import HostScheduler
+from sherlock.utilities.politeness import parse_retry_after
+
+
+def response(status_code: int = 200, headers: dict = {}, text: str = ""):
+    """Build a stand-in for a requests response."""
+    return SimpleNamespace(
+        status_code=status_code,
+        headers=headers,
+        text=text,
+        close=lambda: None,
+    )
+
+
+def request(scheduler: HostScheduler, url: str, fetch) -> None:
+    """Run a request through the scheduler without reading its body."""
+    with scheduler.request(url, fetch=fetch):
+        pass
+
+
+def test_retry_after_seconds_and_dates():
+    """Retry-After is read as delta seconds or as an HTTP date."""
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+    retry_at = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= parse_retry_after(retry_at) <= 30
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_limit_grows_while_fast_and_halves_when_throttled():
+    """Fast responses add slots up to max_per_host, throttling halves them."""
+    scheduler = HostScheduler(max_per_host=4, max_retries=0, max_backoff=0.0)
+    url = "https://example.com/page"
+
+    for _ in range(20):
+        request(scheduler, url, fetch=lambda: response(200))
+    assert scheduler.stats()["example.com"]["limit"] == 4.0
+
+    request(scheduler, url, fetch=lambda: response(503))
+    stats = scheduler.stats()["example.com"]
+    assert stats["limit"] == 2.0
+    assert stats["throttled"] == 1
+
+
+def test_retry_after_is_capped_by_max_backoff():
+    """A host asking to wait an hour is retried after max_backoff."""
+    scheduler = HostScheduler(max_retries=0, max_backoff=5.0)
+    url = "https://example.com/page"
+
+    request(
+        scheduler,
+        url,
+        fetch=lambda: response(429, headers={"retry-after": "3600"}),
+    )
+
+    _, state = scheduler._host(url)
+    assert state.next_request - time.monotonic() <= 5.0
+
+
+def test_robots_rules_and_crawl_delay():
+    """Disallowed paths are refused and Crawl-delay spaces the requests."""
+    robots = "User-agent: *\nDisallow: /private\nCrawl-delay: 2\n"
+    session = SimpleNamespace(get=lambda url, timeout: response(200, text=robots))
+    scheduler = HostScheduler(session=session)
+
+    assert scheduler.allowed("https://example.com/public")
+    assert not scheduler.allowed("https://example.com/private/page")
+    assert scheduler._host("https://example.com/")[1].delay == 2.0
+
+    ignoring = HostScheduler(session=session, respect_robots=False)
+    assert ignoring.allowed("https://example.com/private/page")
+
+
+def test_slot_is_held_until_the_body_is_read():
+    """A streamed response keeps its slot, and its latency runs, until read."""
+    scheduler = HostScheduler(max_per_host=1, target_latency=0.05)
+    url = "https://example.com/file"
+
+    with scheduler.request(url, fetch=lambda: response(200)):
+        _, state = scheduler._host(url)
+        assert state.in_flight == 1
+        time.sleep(0.1)
+
+    assert state.in_flight == 0
+    assert scheduler.stats()["example.com"]["latency"] >= 0.1
+
+
+def test_robots_failures_are_cached_for_a_while():
+    """Unreachable robots.txt is not refetched until robots_retry_delay passes."""
+    fetched = []
+
+    def get(url, timeout):
+        fetched.append(url)
+        if len(fetched) == 1:
+            raise requests.ConnectionError("unreachable")
+        return response(500)
+
+    session = SimpleNamespace(get=get)
+    allowing = HostScheduler(session=session, robots_retry_delay=60.0)
+    assert allowing.allowed("https://example.com/a")
+    assert allowing.allowed("https://example.com/b")
+    assert len(fetched) == 1
+
+    denying = HostScheduler(
+        session=session,
+        robots_failure_allows=False,
+        robots_retry_delay=0.0,
+    )
+    assert not denying.allowed("https://example.com/a")
+    assert not denying.allowed("https://example.com/b")
+    assert len(fetched) == 3
@@ -0,0 +1,42 @@
+"""Test the selection and packing of retrieved chunks."""
+
+from sherlock.utilities.chunker import count_tokens
+from sherlock.utilities.retrieval import Candidate
+from sherlock.utilities.retrieval import deduplicate
+from sherlock.utilities.retrieval import mmr
+from sherlock.utilities.retrieval import pack_context
+
+
+def test_deduplicate_drops_repeats_and_overlapping_windows():
+    """Identical text and mostly overlapping windows of a file are dropped."""
+    candidates = [
+        Candidate(text="a b c", metadata={"path": "p.md", "start": 0, "end": 100}),
+        Candidate(text="a  b c"),
+        Candidate(text="b c d", metadata={"path": "p.md", "start": 40, "end": 120}),
+        Candidate(text="e f g", metadata={"path": "p.md", "start": 90, "end": 200}),
+        Candidate(text="h i j", metadata={"path": "q.md", "start": 0, "end": 100}),
+    ]
+
+    assert [c.text for c in deduplicate(candidates)] == ["a b c", "e f g", "h i j"]
+
+
+def test_mmr_prefers_diverse_candidates():
+    """A near copy of the first pick loses to a different relevant chunk."""
+    candidates = [
+        Candidate(text="first", embedding=[1.0, 0.0]),
+        Candidate(text="copy", embedding=[0.99, 0.01]),
+        Candidate(text="other", embedding=[0.7, 0.7]),
+    ]
+
+    picked = mmr([1.0, 0.0], candidates, k=2, diversity=0.7)
+
+    assert [c.text for c in picked] == ["first", "other"]
+
+
+def test_pack_context_respects_token_budget():
+    """Chunks are packed whole while they fit, the first one is truncated."""
+    candidates = [Candidate(text="one two three"), Candidate(text="four five")]
+
+    assert pack_context(candidates, token_budget=4) == "one two three"
+    assert pack_context(candidates, token_budget=10) == "one two three\n\nfour five"
+    assert count_tokens(pack_context(candidates, token_budget=2)) == 2
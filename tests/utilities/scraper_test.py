@@ -0,0 +1,224 @@
+"""Test the scraper against a local site."""
+
+import functools
+import http.server
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from sherlock.utilities.browser import RenderMode
+from sherlock.utilities.file_type import FileType
+from sherlock.utilities.scraper import Scraper
+from sherlock.utilities.writer import get_file_path
+
+
+def article(seed: int, words: int = 200) -> str:
+    """Generate a paragraph of text drawn from a small vocabulary."""
+    rng = random.Random(seed)
+    return " ".join(f"word{rng.randrange(500)}" for _ in range(words))
+
+
+def page(title: str, text: str, links: list[str] = []) -> str:
+    """Build an HTML page with a title, a paragraph and links."""
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return (
+        f"<html><body><main><h1>{title}</h1><p>{text}</p></main>"
+        f"<nav>{anchors}</nav></body></html>"
+    )
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    """Serve files without logging every request, or fail the ones in statuses."""
+
+    def __init__(self, *args, statuses: dict[str, int], **kwargs):
+        self.statuses = statuses
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        status = self.statuses.get(self.path.lstrip("/"))
+        if status is not None:
+            self.send_error(status)
+            return
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def site(tmp_path, monkeypatch):
+    """Serve a small site and crawl it from a temporary working directory."""
+    root = tmp_path / "site"
+    root.mkdir()
+    pages = {
+        "index.html": page("Home", article(0), ["a.html", "b.html", "print.html"]),
+        "a.html": page("A", article(1), ["c.html"]),
+        "b.html": page("B", article(2), ["index.html", "c.html"]),
+        "c.html": page("C", article(3)),
+        # A print view of a.html
+        "print.html": page("A", article(1)),
+    }
+    for name, html in pages.items():
+        (root / name).write_text(html, encoding="utf-8")
+
+    statuses: dict[str, int] = {}
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        functools.partial(QuietHandler, directory=str(root), statuses=statuses),
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    work = tmp_path / "work"
+    work.mkdir()
+    monkeypatch.chdir(work)
+
+    yield SimpleNamespace(
+        root=root,
+        base=f"http://127.0.0.1:{server.server_address[1]}",
+        statuses=statuses,
+        server=server,
+    )
+
+    server.shutdown()
+    server.server_close()
+
+
+def crawl(base: str, **kwargs) -> Scraper:
+    """Crawl the local site from its index page, one page at a time by default."""
+    scraper = Scraper(
+        source_url=f"{base}/index.html",
+        collection_name="site",
+        max_depth=2,
+        render_mode=RenderMode.NEVER,
+        respect_robots=False,
+        **{"max_concurrency": 1, **kwargs},
+    )
+    scraper.start()
+    return scraper
+
+
+def written_files() -> dict[str, str]:
+    """Read every file the crawls of the local site wrote."""
+    files = {}
+    for directory, _, names in os.walk("web_docs"):
+        for name in names:
+            path = os.path.join(directory, name)
+            with open(path, encoding="utf-8") as file:
+                files[path] = file.read()
+    return files
+
+
+def test_concurrent_crawl_writes_the_same_pages(site):
+    """The concurrent engine produces the output of the sequential crawl."""
+    base = site.base
+
+    # Which of two copies is written depends on which one is fetched first
+    sequential = crawl(base, detect_duplicates=False)
+    sequential_files = written_files()
+    # The next crawl of the collection replaces the pages of this run
+    sequential_links = sequential.links
+    concurrent = crawl(base, max_concurrency=8, detect_duplicates=False)
+
+    assert len(sequential_files) == 5
+    assert written_files() == sequential_files
+    assert concurrent.links == sequential_links
+    assert sorted(os.path.normpath(path) for path in sequential_links.values()) == (
+        sorted(sequential_files)
+    )
+    assert concurrent.pages == sequential.pages == 5
+    assert concurrent.characters == sequential.characters
+
+
+def test_copies_stay_aliases_until_their_original_changes(site):
+    """Incremental crawls keep copies as aliases and check them again on change."""
+    root, base = site.root, site.base
+    output = get_file_path("site", f"{base}/print.html", FileType.HTML)
+
+    scraper = crawl(base)
+    assert scraper.aliases == {f"{base}/print.html": f"{base}/a.html"}
+    assert scraper.links[f"{base}/print.html"] == f"{base}/a.html"
+    assert crawl(base, incremental=True).aliases == {
+        f"{base}/print.html": f"{base}/a.html",
+    }
+    assert not os.path.exists(output)
+
+    # Dated ahead, the server compares modification times to the second
+    (root / "a.html").write_text(page("A", article(4)), encoding="utf-8")
+    os.utime(root / "a.html", (time.time() + 10, time.time() + 10))
+
+    assert crawl(base, incremental=True).aliases == {}
+    assert os.path.exists(output)
+
+
+def test_new_copies_of_unchanged_pages_are_aliases(site):
+    """A copy added later is found although the page it copies is not fetched."""
+    root, base = site.root, site.base
+    crawl(base)
+
+    (root / "copy.html").write_text(
+        page("B", article(2), ["index.html", "c.html"]),
+        encoding="utf-8",
+    )
+    index = page("Home", article(0), ["a.html", "b.html", "print.html", "copy.html"])
+    (root / "index.html").write_text(index, encoding="utf-8")
+    os.utime(root / "index.html", (time.time() + 10, time.time() + 10))
+
+    scraper = crawl(base, incremental=True)
+    assert scraper.aliases[f"{base}/copy.html"] == f"{base}/b.html"
+    assert not os.path.exists(get_file_path("site", f"{base}/copy.html", FileType.HTML))
+
+
+def test_failed_pages_keep_their_output(site):
+    """Server errors keep a page and the pages behind it, only 404 drops it."""
+    crawl(site.base)
+    files = written_files()
+
+    site.statuses["index.html"] = 500
+    site.statuses["c.html"] = 500
+    scraper = crawl(site.base, incremental=True)
+    assert written_files() == files
+    assert scraper.pages == 5
+
+    site.statuses.clear()
+    site.statuses["b.html"] = 404
+    crawl(site.base, incremental=True)
+    b = get_file_path("site", f"{site.base}/b.html", FileType.HTML)
+    assert written_files() == {
+        path: text for path, text in files.items() if path != os.path.normpath(b)
+    }
+
+
+def test_unreachable_site_keeps_the_collection(site):
+    """A crawl while the server is down removes nothing."""
+    crawl(site.base)
+    files = written_files()
+
+    site.server.shutdown()
+    site.server.server_close()
+
+    crawl(site.base, incremental=True)
+    assert written_files() == files
+
+
+def test_stopped_crawl_can_be_resumed(site):
+    """A stopped crawl keeps what it wrote and a resumed one finishes it."""
+    scraper = Scraper(
+        source_url=f"{site.base}/index.html",
+        collection_name="site",
+        max_depth=2,
+        render_mode=RenderMode.NEVER,
+        respect_robots=False,
+        max_concurrency=1,
+    )
+    scraper.on_page = lambda url, output_path: scraper.stop()
+    scraper.start()
+
+    assert scraper.pages == 1
+    assert len(written_files()) == 1
+
+    assert crawl(site.base, resume=True).pages == 5
+    assert len(written_files()) == 4
@@ -0,0 +1,164 @@
+"""Test the sitemap discovery and parsing."""
+
+import gzip
+import io
+import urllib.robotparser
+from typing import Optional
+
+from sherlock.utilities.sitemap import discover_sitemaps
+from sherlock.utilities.sitemap import fetch_sitemap
+from sherlock.utilities.sitemap import parse_sitemap
+from sherlock.utilities.sitemap import read_sitemaps
+
+
+NAMESPACE = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+
+def urlset(*locs: str, lastmod: Optional[str] = None) -> bytes:
+    """Build a sitemap listing pages."""
+    modified = f"<lastmod>{lastmod}</lastmod>" if lastmod else ""
+    urls = "".join(f"<url><loc>{loc}</loc>{modified}</url>" for loc in locs)
+    return f"<urlset {NAMESPACE}>{urls}</urlset>".encode()
+
+
+def sitemapindex(*locs: str) -> bytes:
+    """Build a sitemap index pointing at further sitemaps."""
+    sitemaps = "".join(f"<sitemap><loc>{loc}</loc></sitemap>" for loc in locs)
+    return f"<sitemapindex {NAMESPACE}>{sitemaps}</sitemapindex>".encode()
+
+
+class FakeResponse:
+    """Streamed response with a fixed body."""
+
+    def __init__(self, url: str, body: Optional[bytes] = None):
+        self.url = url
+        self.status_code = 200 if body is not None else 404
+        self.headers = {}
+        self.body = body or b""
+
+    def iter_content(self, chunk_size: int):
+        body = io.BytesIO(self.body)
+        return iter(lambda: body.read(chunk_size), b"")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeSession:
+    """Session serving sitemaps from a dictionary and recording the requests."""
+
+    def __init__(self, files: dict[str, bytes]):
+        self.files = files
+        self.requested = []
+
+    def get(self, url: str, timeout: int, stream: bool = False):
+        self.requested.append(url)
+        return FakeResponse(url, self.files.get(url))
+
+
+def test_discover_sitemaps_from_robots_and_well_known_paths():
+    """Sitemaps listed in robots.txt come first, the well-known ones are added."""
+    robots = urllib.robotparser.RobotFileParser()
+    robots.parse(
+        [
+            "User-agent: *",
+            "Sitemap: https://example.com/news.xml",
+            "Sitemap: https://example.com/sitemap.xml",
+        ],
+    )
+
+    assert discover_sitemaps("https://example.com", robots=robots) == [
+        "https://example.com/news.xml",
+        "https://example.com/sitemap.xml",
+        "https://example.com/sitemap_index.xml",
+    ]
+    assert discover_sitemaps("https://example.com/docs") == [
+        "https://example.com/sitemap.xml",
+        "https://example.com/sitemap_index.xml",
+    ]
+
+
+def test_read_sitemaps_follows_indexes_and_gzip():
+    """Indexes are followed into plain and gzipped sitemaps, each read once."""
+    session = FakeSession(
+        {
+            "https://example.com/sitemap.xml": sitemapindex(
+                "https://example.com/pages.xml",
+                "https://example.com/docs.xml.gz",
+                # Indexes pointing back at themselves are not read again
+                "https://example.com/sitemap.xml",
+            ),
+            "https://example.com/pages.xml": urlset(
+                "https://example.com/a",
+                "https://example.com/b",
+                lastmod="2024-05-01",
+            ),
+            "https://example.com/docs.xml.gz": gzip.compress(
+                urlset("https://example.com/docs/c"),
+            ),
+        },
+    )
+
+    pages = list(
+        read_sitemaps(
+            sitemap_urls=[
+                "https://example.com/sitemap.xml",
+                "https://example.com/sitemap_index.xml",
+            ],
+            session=session,
+        ),
+    )
+
+    assert pages == [
+        ("https://example.com/a", "2024-05-01"),
+        ("https://example.com/b", "2024-05-01"),
+        ("https://example.com/docs/c", None),
+    ]
+    assert session.requested == [
+        "https://example.com/sitemap.xml",
+        "https://example.com/pages.xml",
+        "https://example.com/docs.xml.gz",
+        "https://example.com/sitemap_index.xml",
+    ]
+
+
+def test_gzipped_sitemaps_are_limited_once_decompressed():
+    """A small gzip which inflates past max_bytes is rejected."""
+    url = "https://example.com/sitemap.xml.gz"
+    body = gzip.compress(urlset(*(f"https://example.com/{n}" for n in range(1000))))
+    session = FakeSession({url: body})
+
+    assert fetch_sitemap(url, session=session, max_bytes=len(body) * 2) is None
+    assert fetch_sitemap(url, session=session) is not None
+
+
+def test_extension_locations_are_not_taken_for_the_page():
+    """The loc of an image or news entry does not replace the page loc."""
+    content = (
+        f"<urlset {NAMESPACE} "
+        'xmlns:image="http://www.google.com/schemas/sitemap-image/1.1" '
+        'xmlns:news="http://www.google.com/schemas/sitemap-news/0.9">'
+        "<url>"
+        "<loc>https://example.com/a</loc>"
+        "<image:image><image:loc>https://example.com/a.png</image:loc></image:image>"
+        "<lastmod>2024-05-01</lastmod>"
+        "</url>"
+        "<url>"
+        "<news:news><news:loc>https://example.com/news</news:loc></news:news>"
+        "<loc>https://example.com/b</loc>"
+        "</url>"
+        "<url><image:image><image:loc>https://example.com/c.png</image:loc></image:image></url>"
+        "</urlset>"
+    ).encode()
+
+    assert parse_sitemap(content) == (
+        [],
+        [("https://example.com/a", "2024-05-01"), ("https://example.com/b", None)],
+    )
+
+    # Sitemaps without a namespace are still read
+    no_namespace = b"<urlset><url><loc>https://example.com/d</loc></url></urlset>"
+    assert parse_sitemap(no_namespace) == ([], [("https://example.com/d", None)])
@@ -0,0 +1,65 @@
+"""Test the URL canonicalization helpers."""
+
+from sherlock.utilities.url import VisitedSet
+from sherlock.utilities.url import canonicalize_url
+from sherlock.utilities.url import in_scope
+
+
+def test_canonicalize_variants_compare_equal():
+    """Case, default ports, fragments, tracking and ordering are normalized."""
+    variants = [
+        "https://Example.com/docs/page/",
+        "HTTPS://example.com:443/docs/page#section",
+        "https://example.com/docs/./other/../page?utm_source=mail",
+    ]
+
+    assert {canonicalize_url(url) for url in variants} == {
+        "https://example.com/docs/page",
+    }
+    assert (
+        canonicalize_url("https://example.com/?b=2&a=1&fbclid=x")
+        == "https://example.com?a=1&b=2"
+    )
+
+
+def test_canonicalize_resolves_relative_links():
+    """Relative links resolve against the page they were found on."""
+    page = "https://example.com/docs/guide/index.html"
+
+    assert canonicalize_url("intro.html", base=page) == (
+        "https://example.com/docs/guide/intro.html"
+    )
+    assert canonicalize_url("/about", base=page) == "https://example.com/about"
+    assert canonicalize_url("mailto:help@example.com", base=page) is None
+
+
+def test_in_scope_checks_host_and_path():
+    """Scope is decided by host and path prefix, not by substring."""
+    assert in_scope("https://www.example.com/docs/a", "https://example.com/docs")
+    assert not in_scope("https://example.com/docs2", "https://example.com/docs")
+    assert not in_scope(
+        "https://evil.com/?next=https://example.com",
+        "https://example.com",
+    )
+
+
+def test_visited_set():
+    """The visited set remembers URLs by hash."""
+    visited = VisitedSet()
+    visited.add("https://example.com/a")
+
+    assert "https://example.com/a" in visited
+    assert "https://example.com/b" not in visited
+    assert len(visited) == 1
+
+
+def test_visited_set_grows():
+    """The table grows past its initial capacity without losing URLs."""
+    visited = VisitedSet(capacity=4)
+    urls = [f"https://example.com/{page}" for page in range(1000)]
+    for url in urls + urls:
+        visited.add(url)
+
+    assert len(visited) == 1000
+    assert all(url in visited for url in urls)
+    assert "https://example.com/1000" not in visited
@@ -0,0 +1,51 @@
+"""Test the writer utilities."""
+
+import os
+
+from sherlock.utilities.file_type import FileType
+from sherlock.utilities.writer import get_file_path
+from sherlock.utilities.writer import stream_file
+
+
+def test_file_paths_do_not_collide():
+    """Pages sharing their last URL segment get their own files."""
+    urls = [
+        "https://example.com/a/index",
+        "https://example.com/b/index",
+        "https://example.com/list?page=1",
+        "https://example.com/list?page=2",
+        "https://example.com/",
+        "https://example.com/" + "x" * 300,
+        "https://example.com/" + "x" * 299 + "y",
+    ]
+    paths = [get_file_path("example", url, FileType.HTML) for url in urls]
+
+    assert len(set(paths)) == len(urls)
+    assert paths[0].split(os.sep)[-2:] == ["a", "index.md"]
+    assert paths[4].endswith("index.md")
+    assert all(len(name) <= 155 for path in paths for name in path.split(os.sep))
+
+
+def test_discarded_download_keeps_the_existing_file(tmp_path, monkeypatch):
+    """A discarded download leaves the previous file and its mtime alone."""
+    monkeypatch.chdir(tmp_path)
+    url = "https://example.com/report.pdf"
+
+    assert stream_file("example", url, [b"v1"], FileType.PDF, depth=0) == 2
+    path = get_file_path("example", url, FileType.PDF)
+    os.utime(path, (0, 0))
+
+    size = stream_file(
+        "example",
+        url,
+        [b"v2"],
+        FileType.PDF,
+        depth=0,
+        discard=lambda: True,
+    )
+
+    assert size is None
+    assert os.path.getmtime(path) == 0
+    assert not os.path.exists(path + ".part")
+    with open(path, "rb") as f:
+        assert f.read() == b"v1"